@@ -1,17 +1,28 @@
+import asyncio
+import time
 import uvicorn
-from fastapi import FastAPI, status
+from fastapi import FastAPI, Request, Response, status
+from fastapi.responses import JSONResponse, PlainTextResponse
+from sqlalchemy import text
 
-from db import base
+from db import base, migrations
+from db.cache import model_cache
+from db.engine import get_pool_status, session_limiter
+from db.pagination import InvalidCursor
+from change_feed import change_hub
+from icons import icon_store
+from link_checker import LINK_CHECKER_ENABLED, LinkChecker
+from metrics import MetricsMiddleware, expose_metrics, install_sql_hooks
 from routers import (
     users,
     teams,
     labels,
     links,
     boards,
+    transfer,
+    changes,
 ) 
 
-base.Base.metadata.create_all(bind=base.engine)
-
 DEBUG = True
 DEV = 'DEV'
 PROD = 'PROD'
@@ -28,22 +39,106 @@ app = FastAPI(
 )
 
 
+app.add_middleware(MetricsMiddleware)
+install_sql_hooks(base.engine)
+if base.async_engine is not None:
+    install_sql_hooks(base.async_engine.sync_engine)
+
 app.include_router(users.router)
 app.include_router(teams.router)
 app.include_router(labels.router)
 app.include_router(links.router)
 app.include_router(boards.router)
+app.include_router(transfer.router)
+app.include_router(changes.router)
+
+
+@app.on_event("startup")
+def check_schema_version():
+    # Creating and upgrading the schema is left to `python src/cli.py migrate`
+    migrations.check_schema_version(base.engine)
+
+
+@app.on_event("startup")
+def start_link_checker():
+    if LINK_CHECKER_ENABLED:
+        app.state.link_checker = LinkChecker(base.engine)
+        app.state.link_checker_task = asyncio.ensure_future(app.state.link_checker.run())
+
+
+@app.on_event("shutdown")
+async def stop_link_checker():
+    # Before the engines are disposed, the checker saves the checks already done
+    task = getattr(app.state, "link_checker_task", None)
+    if task is not None:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        await app.state.link_checker.close()
+
+
+@app.on_event("shutdown")
+async def dispose_engines():
+    # Pooled aiosqlite connections run on non daemon threads which would keep the process alive
+    if base.async_engine is not None:
+        await base.async_engine.dispose()
+    base.engine.dispose()
+
+
+@app.on_event("shutdown")
+async def close_icon_store():
+    await icon_store.close()
+
+
+@app.on_event("shutdown")
+async def close_change_hub():
+    await change_hub.close()
+
+
+@app.exception_handler(InvalidCursor)
+def invalid_cursor_handler(request: Request, exc: InvalidCursor):
+    return JSONResponse(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        content={"detail": str(exc)},
+    )
 
 
-# TODO: routes that has created_by should get the user id from request and not as param.
 @app.get("/")
 def read_root():
     return {"status": "OK"}
 
 
+def check_database() -> dict:
+    started = time.perf_counter()
+    try:
+        with base.engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+    except Exception as e:
+        return {"reachable": False, "error": f"{e.__class__.__name__}: {e}"}
+    return {"reachable": True, "latency_ms": round((time.perf_counter() - started) * 1000, 3)}
+
+
 @app.get("/health")
-def health_check():
-    return {"status": "Ok"}
+def health_check(response: Response):
+    database = check_database()
+    if not database["reachable"]:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    pools = {"sync": get_pool_status(base.engine.pool)}
+    if base.async_engine is not None:
+        pools["async"] = get_pool_status(base.async_engine.sync_engine.pool)
+    else:
+        pools["sessions"] = session_limiter.status()
+    return {
+        "status": "Ok" if database["reachable"] else "Unavailable",
+        "database": database,
+        "cache": model_cache.stats(),
+        "pools": pools,
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    # Prometheus text exposition format
+    return PlainTextResponse(expose_metrics(), media_type="text/plain; version=0.0.4")
 
 
 def start():
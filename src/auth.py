@@ -0,0 +1,134 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import secrets
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+PASSWORD_HASH_ALGORITHM = "pbkdf2_sha256"
+PASSWORD_HASH_ITERATIONS = int(os.getenv("LINKTIOUS_PASSWORD_HASH_ITERATIONS", "260000"))
+# Passwords hashed at the same time, the hash holds a CPU for tens of milliseconds
+PASSWORD_HASH_WORKERS = int(os.getenv("LINKTIOUS_PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1)))
+
+SECRET_KEY = os.getenv("LINKTIOUS_SECRET_KEY")
+ACCESS_TOKEN_TTL = int(os.getenv("LINKTIOUS_ACCESS_TOKEN_TTL", str(12 * 3600)))
+# Verified tokens kept decoded, a request with a known token only checks its expiry
+TOKEN_CACHE_SIZE = int(os.getenv("LINKTIOUS_TOKEN_CACHE_SIZE", "10000"))
+# Comma separated ids of the users allowed to export and import the whole database
+ADMIN_USER_IDS = {int(user_id) for user_id in os.getenv("LINKTIOUS_ADMIN_USER_IDS", "").split(",") if user_id.strip()}
+
+if SECRET_KEY is None:
+    logger.warning("LINKTIOUS_SECRET_KEY isn't set, access tokens are only valid in this process")
+    SECRET_KEY = secrets.token_urlsafe(32)
+
+# pbkdf2_hmac releases the GIL, its own threads hash in parallel without taking the
+# threadpool threads which run the database sessions
+password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+
+
+def _pbkdf2(password: str, salt: str, iterations: int) -> str:
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode(), salt.encode(), iterations)
+    return base64.b64encode(digest).decode()
+
+
+def hash_password(password: str, iterations: int = PASSWORD_HASH_ITERATIONS) -> str:
+    """Hash as `algorithm$iterations$salt$hash`, the parameters are stored with the hash."""
+    salt = secrets.token_urlsafe(16)
+    return f"{PASSWORD_HASH_ALGORITHM}${iterations}${salt}${_pbkdf2(password, salt, iterations)}"
+
+
+def verify_password(password: str, hashed_password: Optional[str]) -> bool:
+    if not hashed_password:
+        return False
+    algorithm, _, parameters = hashed_password.partition("$")
+    if algorithm != PASSWORD_HASH_ALGORITHM:
+        # Stored before passwords were hashed, replaced on login, see `needs_rehash`
+        return hmac.compare_digest(password.encode(), hashed_password.encode())
+    try:
+        iterations, salt, expected = parameters.split("$")
+        return hmac.compare_digest(_pbkdf2(password, salt, int(iterations)), expected)
+    except (ValueError, TypeError):
+        # A malformed hash matches no password, a failed login rather than a server error
+        logger.warning("Malformed password hash")
+        return False
+
+
+def needs_rehash(hashed_password: str) -> bool:
+    algorithm, _, parameters = hashed_password.partition("$")
+    if algorithm != PASSWORD_HASH_ALGORITHM:
+        return True
+    try:
+        iterations, _, _ = parameters.split("$")
+        return int(iterations) != PASSWORD_HASH_ITERATIONS
+    except ValueError:
+        # Malformed, `verify_password` refuses it anyway
+        return True
+
+
+@lru_cache(maxsize=None)
+def get_dummy_password_hash() -> str:
+    # Verified when the email is unknown, so the response time doesn't tell whether it exists.
+    # Hashed on first use, not on import which would slow down every worker start
+    return hash_password(secrets.token_urlsafe(16))
+
+
+async def hash_password_async(password: str) -> str:
+    return await asyncio.get_running_loop().run_in_executor(password_executor, hash_password, password)
+
+
+async def verify_password_async(password: str, hashed_password: Optional[str]) -> bool:
+    verified = await asyncio.get_running_loop().run_in_executor(
+        password_executor, verify_password, password, hashed_password or get_dummy_password_hash()
+    )
+    return verified and hashed_password is not None
+
+
+class TokenClaims(NamedTuple):
+    user_id: int
+    expires_at: int
+
+
+def _encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _sign(payload: str) -> str:
+    return _encode(hmac.new(SECRET_KEY.encode(), payload.encode(), hashlib.sha256).digest())
+
+
+def create_access_token(user_id: int, ttl: int = ACCESS_TOKEN_TTL) -> str:
+    """Stateless token `payload.signature`, the payload is the user id and the expiry time."""
+    payload = _encode(json.dumps({"sub": user_id, "exp": int(time.time()) + ttl}, separators=(",", ":")).encode())
+    return f"{payload}.{_sign(payload)}"
+
+
+@lru_cache(maxsize=TOKEN_CACHE_SIZE)
+def _verify_signature(token: str) -> Optional[TokenClaims]:
+    payload, _, signature = token.partition(".")
+    if not hmac.compare_digest(signature.encode(), _sign(payload).encode()):
+        return None
+    try:
+        claims = json.loads(_decode(payload))
+        return TokenClaims(user_id=int(claims["sub"]), expires_at=int(claims["exp"]))
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def verify_access_token(token: str) -> Optional[TokenClaims]:
+    """Claims of a valid and unexpired token, None otherwise. No database lookup."""
+    claims = _verify_signature(token)
+    if claims is None or claims.expires_at <= time.time():
+        return None
+    return claims
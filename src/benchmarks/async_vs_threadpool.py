@@ -0,0 +1,99 @@
+"""Throughput of the async database path compared to the threadpool one.
+
+Each mode runs in its own process since the database mode is read at import time.
+The app is driven in-process through ASGI, so only the server side is measured.
+
+Usage (from src/):
+    python -m benchmarks.async_vs_threadpool --requests 2000 --concurrency 64
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+MODES = ("sync", "async")
+ENDPOINTS = ("/links/?limit=50", "/boards/1", "/links/1")
+
+
+def seed(links_count: int):
+    from db import base, migrations, models
+
+    migrations.migrate(base.engine)
+    db = base.SessionLocal()
+    user = models.User(name="bench", email="bench@email.com", hashed_password="bench")
+    db.add(user)
+    db.commit()
+    links = [
+        models.Link(icon_url="https://example.com/icon.png", url=f"https://example.com/{index}",
+                    description=f"link {index}", created_by_user_id=user.id)
+        for index in range(links_count)
+    ]
+    db.add_all(links)
+    board = models.Board(name="bench", description="bench", created_by_user_id=user.id, links=links[:50])
+    db.add(board)
+    db.commit()
+    db.close()
+
+
+async def drive(requests_count: int, concurrency: int) -> dict:
+    import httpx
+    from app import app, dispose_engines
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+        async def request(index: int):
+            async with semaphore:
+                response = await client.get(ENDPOINTS[index % len(ENDPOINTS)])
+                response.raise_for_status()
+
+        # Warm up pools and caches
+        await asyncio.gather(*(request(index) for index in range(concurrency)))
+        started = time.perf_counter()
+        await asyncio.gather(*(request(index) for index in range(requests_count)))
+        elapsed = time.perf_counter() - started
+
+    await dispose_engines()
+    return {"requests": requests_count, "seconds": round(elapsed, 3), "rps": round(requests_count / elapsed, 1)}
+
+
+def run_mode(args):
+    seed(args.links)
+    result = asyncio.run(drive(args.requests, args.concurrency))
+    print(json.dumps(result))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--links", type=int, default=1000)
+    parser.add_argument("--mode", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        return run_mode(args)
+
+    for mode in MODES:
+        with tempfile.TemporaryDirectory() as directory:
+            env = dict(
+                os.environ,
+                LINKTIOUS_DATABASE_MODE=mode,
+                LINKTIOUS_DATABASE_URL=f"sqlite:///{directory}/bench.db",
+            )
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.async_vs_threadpool", "--mode", mode,
+                 "--requests", str(args.requests), "--concurrency", str(args.concurrency),
+                 "--links", str(args.links)],
+                env=env, check=True, capture_output=True, text=True,
+            ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"{mode:>6}: {result['rps']} req/s ({result['requests']} requests in {result['seconds']}s)")
+
+
+if __name__ == "__main__":
+    main()
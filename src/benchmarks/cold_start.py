@@ -0,0 +1,70 @@
+"""Worker cold start with `create_all` compared to the schema version check.
+
+Starts the given number of worker processes at once against the same migrated SQLite
+database, each imports the app and runs its schema startup step, like a multi worker
+uvicorn or gunicorn start.
+
+Usage (from src/):
+    python -m benchmarks.cold_start --workers 8
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+STRATEGIES = ("create_all", "version_check")
+
+
+def run_worker(strategy: str):
+    started = time.perf_counter()
+    from app import app  # noqa: F401
+    from db import base, migrations
+
+    imported = time.perf_counter()
+    if strategy == "create_all":
+        base.Base.metadata.create_all(bind=base.engine)
+    else:
+        migrations.check_schema_version(base.engine)
+    finished = time.perf_counter()
+    print(json.dumps({"import": imported - started, "schema": finished - imported}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--strategy", choices=STRATEGIES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.strategy:
+        return run_worker(args.strategy)
+
+    directory = tempfile.mkdtemp()
+    env = dict(os.environ, LINKTIOUS_DATABASE_URL=f"sqlite:///{directory}/bench.db")
+    src = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run([sys.executable, "cli.py", "migrate"], cwd=src, env=env, check=True, stdout=subprocess.DEVNULL)
+
+    for strategy in STRATEGIES:
+        schema_timings, walls = [], []
+        for _ in range(args.rounds):
+            started = time.perf_counter()
+            workers = [
+                subprocess.Popen([sys.executable, "-m", "benchmarks.cold_start", "--strategy", strategy],
+                                 cwd=src, env=env, stdout=subprocess.PIPE)
+                for _ in range(args.workers)
+            ]
+            for worker in workers:
+                output, _ = worker.communicate()
+                schema_timings.append(json.loads(output)["schema"])
+            walls.append(time.perf_counter() - started)
+        print(f"{strategy:>13}: schema step p50 {statistics.median(schema_timings) * 1000:7.2f} ms, "
+              f"max {max(schema_timings) * 1000:7.2f} ms, {args.workers} workers ready in "
+              f"{statistics.median(walls):.2f}s (p50)")
+
+
+if __name__ == "__main__":
+    main()
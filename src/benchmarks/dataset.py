@@ -0,0 +1,158 @@
+"""Synthetic dataset generator for benchmarks.
+
+Fills an empty database with teams, users, links, labels and boards. Associations follow
+skewed distributions like real usage: a few labels are on most links, most boards are
+small while some are large, and users favorite a handful of boards. Rows are inserted
+with one executemany per batch, ids are assigned up front.
+
+Usage (from src/):
+    python -m benchmarks.dataset --database-url sqlite:///./bench.db --links 100000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, NamedTuple
+from sqlalchemy import bindparam
+
+BATCH_SIZE = 5000
+
+WORDS = (
+    "python docs tutorial guide redis postgres sqlite async fastapi pydantic testing deploy docker "
+    "kubernetes cache index query performance security auth api design frontend react css http "
+    "network linux git review release monitoring metrics logging tracing queue stream search"
+).split()
+
+
+class DatasetSize(NamedTuple):
+    teams: int = 10
+    users: int = 1000
+    links: int = 20000
+    labels: int = 200
+    boards: int = 2000
+    labels_per_link: int = 3
+    links_per_board: int = 20
+    favorites_per_user: int = 3
+
+
+def skewed_choices(rng: random.Random, count: int, k: int) -> List[int]:
+    """Up to `k` distinct ids in 1..count, low ids are far more popular."""
+    return sorted({min(int(rng.paretovariate(1.2)), count) for _ in range(k)})
+
+
+def batches(rows: Iterator[Dict], size: int = BATCH_SIZE) -> Iterator[List[Dict]]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def generate(engine, size: DatasetSize = DatasetSize(), seed: int = 0, log=lambda message: None):
+    """Insert the dataset, the database must be migrated and empty."""
+    from auth import hash_password
+    from db import counters, models
+
+    # Every user has the same password, hashed once
+    hashed_password = hash_password("password")
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+
+    def created_at(index: int, count: int) -> datetime:
+        # Spread over the last year in id order, like real inserts
+        return now - timedelta(days=365) + timedelta(days=365) * index / count
+
+    def sentence(words: int) -> str:
+        return " ".join(rng.choice(WORDS) for _ in range(words))
+
+    tables = [
+        (models.Team, ({"id": id, "name": f"team {id}"} for id in range(1, size.teams + 1))),
+        (models.User, ({
+            "id": id, "name": f"user {id}", "email": f"user{id}@example.com", "hashed_password": hashed_password,
+            "is_active": True, "team_id": rng.randint(1, size.teams),
+        } for id in range(1, size.users + 1))),
+        (models.Label, ({
+            "id": id, "name": f"{rng.choice(WORDS)} {id}", "created_at": created_at(id, size.labels),
+            "created_by_user_id": rng.randint(1, size.users),
+        } for id in range(1, size.labels + 1))),
+        (models.Link, ({
+            "id": id, "icon_url": f"https://example.com/icons/{id % 500}.png",
+            "url": f"https://example.com/{rng.choice(WORDS)}/{id}", "description": sentence(rng.randint(3, 12)),
+            "created_at": created_at(id, size.links), "updated_at": created_at(id, size.links),
+            "created_by_user_id": rng.randint(1, size.users),
+        } for id in range(1, size.links + 1))),
+        (models.Board, ({
+            "id": id, "name": f"board {id}", "description": sentence(rng.randint(3, 8)),
+            "created_at": created_at(id, size.boards), "updated_at": created_at(id, size.boards),
+            "created_by_user_id": rng.randint(1, size.users),
+        } for id in range(1, size.boards + 1))),
+        (models.LinkLabelAssociation, (
+            {"link_id": link_id, "lable_id": label_id}
+            for link_id in range(1, size.links + 1)
+            for label_id in skewed_choices(rng, size.labels, rng.randint(1, size.labels_per_link * 2 - 1))
+        )),
+        (models.BoardLinksAssociation, (
+            {"board_id": board_id, "link_id": link_id}
+            for board_id in range(1, size.boards + 1)
+            for link_id in rng.sample(range(1, size.links + 1),
+                                      min(size.links, int(rng.paretovariate(1.5) * size.links_per_board / 3)))
+        )),
+        (models.UserFavoriteBoardsAssociation, (
+            {"user_id": user_id, "board_id": board_id}
+            for user_id in range(1, size.users + 1)
+            for board_id in skewed_choices(rng, size.boards, rng.randint(0, size.favorites_per_user * 2))
+        )),
+    ]
+
+    with engine.begin() as connection:
+        for model, rows in tables:
+            if connection.execute(model.__table__.select().limit(1)).first() is not None:
+                raise ValueError(f"{model.__tablename__} isn't empty, the dataset needs an empty database")
+
+        for model, rows in tables:
+            started = time.perf_counter()
+            count = 0
+            for batch in batches(rows):
+                connection.execute(model.__table__.insert(), batch)
+                count += len(batch)
+            log(f"{model.__tablename__}: {count} rows in {time.perf_counter() - started:.1f}s")
+
+        # Main boards are set once the boards exist
+        users = models.User.__table__
+        set_main_board = users.update().where(users.c.id == bindparam("user_id")).values(
+            main_board_id=bindparam("board_id")
+        )
+        for batch in batches({"user_id": id, "board_id": rng.randint(1, size.boards)} for id in range(1, size.users + 1)):
+            connection.execute(set_main_board, batch)
+
+        # Association rows are inserted directly, the stored counters are computed once
+        started = time.perf_counter()
+        counters.recount(connection, models.Base.metadata)
+        log(f"counters: recounted in {time.perf_counter() - started:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    database_url = os.getenv("LINKTIOUS_DATABASE_URL")
+    parser.add_argument("--database-url", default=database_url, required=database_url is None)
+    parser.add_argument("--seed", type=int, default=0)
+    for field, default in DatasetSize._field_defaults.items():
+        parser.add_argument(f"--{field.replace('_', '-')}", type=int, default=default)
+    args = parser.parse_args()
+
+    os.environ["LINKTIOUS_DATABASE_URL"] = args.database_url
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from db import base, migrations
+
+    migrations.migrate(base.engine)
+    size = DatasetSize(**{field: getattr(args, field) for field in DatasetSize._fields})
+    generate(base.engine, size, seed=args.seed, log=print)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+"""HTTP benchmark suite over every router, driven in-process through ASGI.
+
+Generates a dataset (see `benchmarks.dataset`) in a temporary database unless one is
+given, then runs every endpoint scenario with the given concurrency and reports latency
+percentiles, throughput and SQL statements per request. Results can be written as a JSON
+baseline and compared against a previous one.
+
+Usage (from src/):
+    python -m benchmarks.http_suite --requests 500 --output baseline.json
+    python -m benchmarks.http_suite --requests 500 --compare baseline.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, NamedTuple
+
+from benchmarks.dataset import DatasetSize
+
+# Relative increase of p50 or statements per request reported as a regression
+REGRESSION_THRESHOLD = 0.2
+
+
+class Scenario(NamedTuple):
+    name: str
+    method: str
+    # Builds the path and json body of a request from a random generator
+    request: Callable[[random.Random], Any]
+
+
+def build_scenarios(size: DatasetSize) -> List[Scenario]:
+    def some(rng: random.Random, count: int) -> int:
+        return rng.randint(1, count)
+
+    def labels(rng: random.Random, count: int) -> str:
+        return ",".join(str(some(rng, min(size.labels, 10))) for _ in range(count))
+
+    counter = iter(range(10 ** 9))
+    return [
+        Scenario("GET /teams", "GET", lambda rng: ("/teams/", None)),
+        Scenario("GET /labels", "GET", lambda rng: ("/labels/?limit=50", None)),
+        Scenario("GET /labels/{id}", "GET", lambda rng: (f"/labels/{some(rng, size.labels)}", None)),
+        Scenario("GET /links", "GET", lambda rng: ("/links/?limit=50", None)),
+        Scenario("GET /links?labels (all)", "GET", lambda rng: (f"/links/?labels={labels(rng, 2)}", None)),
+        Scenario("GET /links?labels (any)", "GET", lambda rng: (f"/links/?labels={labels(rng, 3)}&mode=any", None)),
+        Scenario("GET /links?status", "GET", lambda rng: ("/links/?status=broken&limit=50", None)),
+        Scenario("GET /links/search", "GET", lambda rng: (f"/links/search?q={rng.choice(['python', 'cache doc', 'sql'])}",
+                                                          None)),
+        Scenario("GET /links/{id}", "GET", lambda rng: (f"/links/{some(rng, size.links)}", None)),
+        Scenario("GET /boards", "GET", lambda rng: ("/boards/?limit=50", None)),
+        Scenario("GET /boards/{id}", "GET", lambda rng: (f"/boards/{some(rng, size.boards)}", None)),
+        Scenario("GET /boards/{id}/links", "GET", lambda rng: (f"/boards/{some(rng, size.boards)}/links", None)),
+        Scenario("GET /boards/{id}/view", "GET", lambda rng: (f"/boards/{some(rng, size.boards)}/view", None)),
+        Scenario("GET /users/{id}", "GET", lambda rng: (f"/users/{some(rng, size.users)}", None)),
+        Scenario("GET /users/{id}/home", "GET", lambda rng: (f"/users/{some(rng, size.users)}/home", None)),
+        Scenario("POST /users/login", "POST", lambda rng: (
+            "/users/login", {"email": f"user{some(rng, size.users)}@example.com", "password": "password"}
+        )),
+        Scenario("POST /labels", "POST", lambda rng: ("/labels/", {
+            "name": f"bench label {next(counter)}", "created_at": "2021-01-01T00:00:00",
+        })),
+        Scenario("POST /links/{id}/labels/add", "POST", lambda rng: (
+            f"/links/{some(rng, size.links)}/labels/add", [some(rng, size.labels)]
+        )),
+        # Users only change their own settings, the suite is logged in as user 1
+        Scenario("PUT /users/{id}/set_main_board", "PUT", lambda rng: (
+            f"/users/1/set_main_board?board_id={some(rng, size.boards)}", None
+        )),
+        Scenario("GET /health", "GET", lambda rng: ("/health", None)),
+    ]
+
+
+def percentile(timings: List[float], fraction: float) -> float:
+    ordered = sorted(timings)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+async def run_scenario(client, scenario: Scenario, requests_count: int, concurrency: int,
+                       statements: List[int], seed: int) -> Dict[str, Any]:
+    rng = random.Random(seed)
+
+    async def request(path: str, body: Any) -> float:
+        started = time.perf_counter()
+        response = await client.request(scenario.method, path, json=body)
+        elapsed = time.perf_counter() - started
+        if response.status_code >= 400:
+            raise RuntimeError(f"{scenario.name}: {path} returned {response.status_code} {response.text[:200]}")
+        return elapsed
+
+    # Statements are counted on sequential requests, concurrent ones would mix
+    sample = 5
+    statements[0] = 0
+    for _ in range(sample):
+        await request(*scenario.request(rng))
+    statements_per_request = statements[0] / sample
+
+    semaphore = asyncio.Semaphore(concurrency)
+    requests = [scenario.request(rng) for _ in range(requests_count)]
+
+    async def limited(path: str, body: Any) -> float:
+        async with semaphore:
+            return await request(path, body)
+
+    started = time.perf_counter()
+    timings = await asyncio.gather(*(limited(path, body) for path, body in requests))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": requests_count,
+        "rps": round(requests_count / elapsed, 1),
+        "p50_ms": round(statistics.median(timings) * 1000, 2),
+        "p95_ms": round(percentile(timings, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(timings, 0.99) * 1000, 2),
+        "statements": statements_per_request,
+    }
+
+
+async def run_suite(args, size: DatasetSize) -> Dict[str, Dict[str, Any]]:
+    import httpx
+    from sqlalchemy import event
+    from app import app, dispose_engines
+    from db import base
+
+    statements = [0]
+
+    def count_statement(*args):
+        statements[0] += 1
+
+    engines = [base.engine] + ([base.async_engine.sync_engine] if base.async_engine is not None else [])
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", count_statement)
+
+    results = {}
+    async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+        login = await client.post("/users/login", json={"email": "user1@example.com", "password": "password"})
+        client.headers["Authorization"] = f"Bearer {login.json()['access_token']}"
+        for index, scenario in enumerate(build_scenarios(size)):
+            if args.only and args.only not in scenario.name:
+                continue
+            results[scenario.name] = await run_scenario(
+                client, scenario, args.requests, args.concurrency, statements, seed=args.seed + index
+            )
+            print(format_result(scenario.name, results[scenario.name]), flush=True)
+    await dispose_engines()
+    return results
+
+
+def format_result(name: str, result: Dict[str, Any]) -> str:
+    return (f"{name:<34} p50 {result['p50_ms']:8.2f}ms  p95 {result['p95_ms']:8.2f}ms  "
+            f"p99 {result['p99_ms']:8.2f}ms  {result['rps']:8.1f} req/s  {result['statements']:5.1f} sql/req")
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Any]) -> bool:
+    """Print the changes against the baseline, returns whether any endpoint regressed."""
+    regressed = False
+    print("\nCompared to baseline:")
+    for name, result in results.items():
+        previous = baseline["endpoints"].get(name)
+        if previous is None:
+            print(f"{name:<34} new")
+            continue
+
+        p50_change = result["p50_ms"] / previous["p50_ms"] - 1 if previous["p50_ms"] else 0
+        statements_change = result["statements"] - previous["statements"]
+        regression = p50_change > REGRESSION_THRESHOLD or statements_change > 0
+        regressed = regressed or regression
+        print(f"{name:<34} p50 {p50_change:+7.1%}  p99 {result['p99_ms'] - previous['p99_ms']:+8.2f}ms  "
+              f"sql/req {statements_change:+5.1f}{'  REGRESSION' if regression else ''}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=300, help="Requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--database-url", help="Already generated dataset database, generated when missing")
+    parser.add_argument("--only", help="Run only the endpoints whose name contains this")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the results as a JSON baseline")
+    parser.add_argument("--compare", help="JSON baseline to compare with, exits with 1 on regressions")
+    for field, default in DatasetSize._field_defaults.items():
+        parser.add_argument(f"--{field.replace('_', '-')}", type=int, default=default)
+    args = parser.parse_args()
+
+    size = DatasetSize(**{field: getattr(args, field) for field in DatasetSize._fields})
+    database_url = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+    os.environ["LINKTIOUS_DATABASE_URL"] = database_url
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    if not args.database_url:
+        from benchmarks.dataset import generate
+        from db import base, migrations
+
+        started = time.perf_counter()
+        migrations.migrate(base.engine)
+        generate(base.engine, size, seed=args.seed)
+        print(f"Generated dataset in {time.perf_counter() - started:.1f}s", flush=True)
+
+    results = asyncio.run(run_suite(args, size))
+
+    from db import base
+    report = {
+        "meta": {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "database_mode": base.DATABASE_MODE,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "dataset": size._asdict(),
+        },
+        "endpoints": results,
+    }
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+    if args.compare:
+        with open(args.compare) as baseline:
+            if compare(results, json.load(baseline)):
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Latency of filtering links by labels on a large association table.
+
+Seeds a temporary SQLite database (1M association rows by default) and times a
+page of `GET /links?labels=...` for both match modes, with and without the
+association reverse index.
+
+Usage (from src/):
+    python -m benchmarks.label_filter --links 200000 --labels 200 --labels-per-link 5
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+
+def seed(links_count: int, labels_count: int, labels_per_link: int):
+    from db import base, migrations, models
+
+    migrations.migrate(base.engine)
+    with base.engine.begin() as connection:
+        connection.execute(models.User.__table__.insert(), [{"id": 1, "name": "bench", "email": "bench@email.com"}])
+        connection.execute(models.Label.__table__.insert(), [
+            {"id": label_id, "name": f"label {label_id}", "created_by_user_id": 1}
+            for label_id in range(1, labels_count + 1)
+        ])
+        connection.execute(models.Link.__table__.insert(), [
+            {"id": link_id, "url": f"https://example.com/{link_id}", "description": f"link {link_id}",
+             "created_by_user_id": 1}
+            for link_id in range(1, links_count + 1)
+        ])
+        # Skewed labels popularity, like real tags
+        weights = [1 / label_id for label_id in range(1, labels_count + 1)]
+        rows = []
+        for link_id in range(1, links_count + 1):
+            for label_id in set(random.choices(range(1, labels_count + 1), weights=weights, k=labels_per_link)):
+                rows.append({"link_id": link_id, "lable_id": label_id})
+        connection.execute(models.LinkLabelAssociation.__table__.insert(), rows)
+    return len(rows)
+
+
+def measure(labels_ids, labels_match, repeat: int) -> float:
+    from db import base
+    from db.models import ModelsManager
+
+    timings = []
+    for _ in range(repeat):
+        db = base.SessionLocal()
+        started = time.perf_counter()
+        ModelsManager(db=db).links.paginate(limit=50, labels_ids=labels_ids, labels_match=labels_match)
+        timings.append(time.perf_counter() - started)
+        db.close()
+    return statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--links", type=int, default=200000)
+    parser.add_argument("--labels", type=int, default=200)
+    parser.add_argument("--labels-per-link", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    os.environ["LINKTIOUS_DATABASE_URL"] = f"sqlite:///{directory}/bench.db"
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    from db import base, schema
+
+    started = time.perf_counter()
+    rows = seed(args.links, args.labels, args.labels_per_link)
+    print(f"seeded {rows} association rows in {time.perf_counter() - started:.1f}s")
+
+    cases = [
+        ("popular label", [1], schema.LabelsMatch.all),
+        ("rare label", [args.labels], schema.LabelsMatch.all),
+        ("all of 2 popular", [1, 2], schema.LabelsMatch.all),
+        ("all of popular + rare", [1, args.labels], schema.LabelsMatch.all),
+        ("any of 3 rare", [args.labels - 2, args.labels - 1, args.labels], schema.LabelsMatch.any),
+    ]
+    for with_index in (True, False):
+        if not with_index:
+            with base.engine.begin() as connection:
+                connection.exec_driver_sql("DROP INDEX ix_links_labels_association_lable_id")
+        print("with reverse index" if with_index else "without reverse index")
+        for name, labels_ids, labels_match in cases:
+            print(f"  {name:>22}: {measure(labels_ids, labels_match, args.repeat):8.2f} ms (p50)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Throughput of the link checker and its impact on the event loop.
+
+Seeds a temporary SQLite database with links spread over hosts (a few hosts hold many
+links), answers the checks with a stub transport which sleeps like a remote server, and
+runs a pass over every link. Meanwhile a ticker measures how late the event loop wakes
+it up, which is what the API requests sharing the loop would wait.
+
+Usage (from src/):
+    python -m benchmarks.link_checker --links 20000 --hosts 2000 --latency-ms 100
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+
+def seed(links_count: int, hosts_count: int, broken_ratio: float):
+    from db import base, migrations, models
+
+    migrations.migrate(base.engine)
+    rng = random.Random(0)
+    hosts = rng.choices(range(1, hosts_count + 1), weights=[host ** -0.8 for host in range(1, hosts_count + 1)],
+                        k=links_count)
+    with base.engine.begin() as connection:
+        connection.execute(models.User.__table__.insert(), [{"id": 1, "name": "bench", "email": "bench@email.com"}])
+        # Hosts are public addresses, the checker doesn't resolve names and the stub never connects
+        connection.execute(models.Link.__table__.insert(), [
+            {"id": link_id, "description": f"link {link_id}", "created_by_user_id": 1,
+             "url": f"https://93.184.{host // 256}.{host % 256}/{'missing' if rng.random() < broken_ratio else 'page'}/{link_id}"}
+            for link_id, host in enumerate(hosts, 1)
+        ])
+
+
+async def run(args) -> dict:
+    import httpx
+    from db import base
+    from link_checker import LinkChecker
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(random.uniform(0.5, 1.5) * args.latency_ms / 1000)
+        if "/missing/" in request.url.path:
+            return httpx.Response(404)
+        # Some servers don't implement HEAD
+        return httpx.Response(405 if request.method == "HEAD" and random.random() < 0.1 else 200)
+
+    lags = []
+
+    async def ticker():
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(0.01)
+            lags.append(time.perf_counter() - started - 0.01)
+
+    checker = LinkChecker(base.engine, client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+                          concurrency=args.concurrency, per_host=args.per_host)
+    ticking = asyncio.ensure_future(ticker())
+    started = time.perf_counter()
+    await checker.run(once=True)
+    elapsed = time.perf_counter() - started
+    ticking.cancel()
+    await checker.close()
+    lags.sort()
+    return {"elapsed": elapsed, "lag_p99": lags[int(len(lags) * 0.99)], "lag_max": lags[-1]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--links", type=int, default=20000)
+    parser.add_argument("--hosts", type=int, default=2000)
+    parser.add_argument("--broken-ratio", type=float, default=0.05)
+    parser.add_argument("--latency-ms", type=float, default=100)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--per-host", type=int, default=2)
+    args = parser.parse_args()
+
+    os.environ["LINKTIOUS_DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    seed(args.links, args.hosts, args.broken_ratio)
+
+    result = asyncio.run(run(args))
+    print(f"{args.links} links in {result['elapsed']:.1f}s, {args.links / result['elapsed'] * 3600:,.0f} links/hour")
+    print(f"Event loop lag p99 {result['lag_p99'] * 1000:.1f}ms, max {result['lag_max'] * 1000:.1f}ms")
+
+    from db import base
+    with base.engine.connect() as connection:
+        for status, count in connection.exec_driver_sql("SELECT status, count(*) FROM links GROUP BY status"):
+            print(f"{status}: {count}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Serialization cost of list endpoints, ORM + pydantic compared to the fast path.
+
+Seeds a temporary SQLite database and serializes the same page of links both ways,
+from the query to the encoded response body, like `GET /links` would do with a
+10k rows page.
+
+Usage (from src/):
+    python -m benchmarks.list_serialization --rows 10000 --labels-per-link 3
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+
+def seed(rows: int, labels_per_link: int):
+    from db import base, migrations, models
+
+    migrations.migrate(base.engine)
+    with base.engine.begin() as connection:
+        connection.execute(models.User.__table__.insert(), [{"id": 1, "name": "bench", "email": "bench@email.com"}])
+        connection.execute(models.Label.__table__.insert(), [
+            {"id": label_id, "name": f"label {label_id}", "created_by_user_id": 1} for label_id in range(1, 21)
+        ])
+        connection.execute(models.Link.__table__.insert(), [
+            {"id": link_id, "icon_url": "https://example.com/icon.png", "url": f"https://example.com/{link_id}",
+             "description": f"link {link_id}", "created_by_user_id": 1}
+            for link_id in range(1, rows + 1)
+        ])
+        connection.execute(models.LinkLabelAssociation.__table__.insert(), [
+            {"link_id": link_id, "lable_id": (link_id + offset) % 20 + 1}
+            for link_id in range(1, rows + 1) for offset in range(labels_per_link)
+        ])
+
+
+def orm_path(rows: int) -> bytes:
+    from fastapi.responses import JSONResponse
+    from fastapi.routing import serialize_response
+    from fastapi.utils import create_response_field
+    from db import base, schema
+    from db.models import ModelsManager
+
+    field = create_response_field(name="response", type_=schema.Page[schema.Link])
+    db = base.SessionLocal()
+    try:
+        page = ModelsManager(db=db).links.with_load_plan(schema.Link).paginate(limit=rows)
+        content = asyncio.run(serialize_response(field=field, response_content=page))
+        return JSONResponse(content).body
+    finally:
+        db.close()
+
+
+def fast_path(rows: int) -> bytes:
+    from db import base, schema
+    from db.models import ModelsManager
+    from responses import page_response
+
+    db = base.SessionLocal()
+    try:
+        return page_response(ModelsManager(db=db).links.paginate_serialized(schema.Link, limit=rows)).body
+    finally:
+        db.close()
+
+
+def measure(path, rows: int, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        path(rows)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--labels-per-link", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    os.environ["LINKTIOUS_DATABASE_URL"] = f"sqlite:///{directory}/bench.db"
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    seed(args.rows, args.labels_per_link)
+
+    import orjson
+    assert orjson.loads(orm_path(args.rows)) == orjson.loads(fast_path(args.rows)), "Paths responses differ"
+
+    orm = measure(orm_path, args.rows, args.repeat)
+    fast = measure(fast_path, args.rows, args.repeat)
+    print(f"{args.rows} rows page, p50 of {args.repeat}")
+    print(f"   orm + pydantic: {orm:8.1f} ms")
+    print(f"        fast path: {fast:8.1f} ms ({orm / fast:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Per-request overhead of ModelsManager queryset lookups.
+
+Compares the registry and cached querysets against the previous lookup, which
+scanned `Base.__subclasses__()` and built a queryset and its query on every
+attribute access. No SQL is executed, only the Python overhead is measured.
+
+Usage (from src/):
+    python -m benchmarks.models_manager --number 20000
+"""
+import argparse
+import timeit
+
+from db import base
+from db.models import ModelsManager
+
+
+class PreviousModelsManager(ModelsManager):
+    """The models manager lookup before the registry, kept for comparison only."""
+
+    def __getattribute__(self, name):
+        model = next((model for model in base.Base.__subclasses__()
+                      if model.__tablename__ == name), None)
+        if model is None:
+            return object.__getattribute__(self, name)
+
+        queryset = model.get_objects_queryset(db=object.__getattribute__(self, "db"))
+        # The query used to be built with the queryset
+        queryset.queryset
+        return queryset
+
+
+def request_lookups(manager_class, db):
+    """Attribute accesses of a typical request: a few querysets and the session."""
+    models_manager = manager_class(db=db)
+    models_manager.db
+    models_manager.links.queryset
+    models_manager.links.model
+    models_manager.labels.queryset
+    models_manager.boards.queryset
+    models_manager.boards.model
+    models_manager.db
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    db = base.SessionLocal()
+    for manager_class in (PreviousModelsManager, ModelsManager):
+        best = min(timeit.repeat(lambda: request_lookups(manager_class, db), number=args.number, repeat=args.repeat))
+        print(f"{manager_class.__name__:>21}: {best / args.number * 1e6:.2f} us/request")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
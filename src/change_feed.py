@@ -0,0 +1,213 @@
+import asyncio
+import logging
+import os
+from collections import defaultdict
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
+from sqlalchemy import select
+from sqlalchemy.engine import Engine
+from starlette.concurrency import run_in_threadpool
+
+from db import base
+from db.cache import EntityKey
+from db.changes import PubSub, change_pubsub, select_changes
+from db.models import Change
+
+logger = logging.getLogger(__name__)
+
+# Seconds between two reads of the log without notification, changes of other workers
+# are delivered within this delay when the pubsub isn't shared
+CHANGES_POLL_INTERVAL = float(os.getenv("LINKTIOUS_CHANGES_POLL_INTERVAL", "5"))
+# Seconds between keep alive messages of idle streams
+CHANGES_HEARTBEAT = float(os.getenv("LINKTIOUS_CHANGES_HEARTBEAT", "15"))
+# Changes waiting for a slow subscriber, it's disconnected beyond and resumes from its last change
+SUBSCRIBER_QUEUE_SIZE = int(os.getenv("LINKTIOUS_CHANGES_SUBSCRIBER_QUEUE_SIZE", "1000"))
+
+# Changes read from the log at a time
+BATCH_SIZE = 500
+# Sequence numbers are taken when a transaction writes its changes, not when it commits,
+# so a slow transaction may commit changes below the last one read. The log is read again
+# from this many sequence numbers back, the changes already dispatched are skipped.
+LOOKBACK = 100
+
+
+class Subscription:
+    def __init__(self, scopes: Optional[List[EntityKey]]):
+        # None for every change
+        self.scopes = scopes
+        self.queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        # Dropped by the hub because its queue was full
+        self.closed = False
+        # Changes after this one are dispatched to the subscription
+        self.start_seq = 0
+
+
+class ChangeHub:
+    """Fans the changes of the log out to the subscriptions of the process.
+
+    A single task reads the new changes once for every subscription, when the pubsub
+    notifies a commit or every `poll_interval` seconds, and puts them in the queues of the
+    subscriptions of their entity. Subscriptions are indexed by entity, an idle
+    subscription costs its queue and no work. The task runs only while there are
+    subscriptions.
+    """
+
+    def __init__(self, engine: Engine, pubsub: PubSub = change_pubsub, poll_interval: float = CHANGES_POLL_INTERVAL):
+        self.engine = engine
+        self.pubsub = pubsub
+        self.poll_interval = poll_interval
+        self.last_seq = 0
+        self._subscriptions: Dict[Optional[EntityKey], Set[Subscription]] = defaultdict(set)
+        self._count = 0
+        self._dispatched: Set[int] = set()
+        # Bound to the event loop, created by the first subscription
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional["asyncio.Future[None]"] = None
+        self._ready: Optional["asyncio.Future[None]"] = None
+
+    async def subscribe(self, scopes: Optional[List[EntityKey]]) -> Subscription:
+        """Subscribe to the changes of the `scopes` entities, or every change, committed from now on."""
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+            self._wake = asyncio.Event()
+            self.pubsub.subscribe(self._notify)
+
+        subscription = Subscription(scopes)
+        for scope in scopes or [None]:
+            self._subscriptions[scope].add(subscription)
+        self._count += 1
+        if self._task is None:
+            self._ready = self._loop.create_future()
+            self._task = asyncio.ensure_future(self._run())
+        try:
+            # Changes up to the last one read at start are in the log for the subscriber
+            await asyncio.shield(self._ready)
+        except BaseException:
+            self.unsubscribe(subscription)
+            raise
+        subscription.start_seq = self.last_seq
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        removed = False
+        for scope in subscription.scopes or [None]:
+            subscriptions = self._subscriptions.get(scope)
+            if subscriptions is not None and subscription in subscriptions:
+                subscriptions.discard(subscription)
+                removed = True
+                if not subscriptions:
+                    del self._subscriptions[scope]
+        if removed:
+            self._count -= 1
+        if not self._count and self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def fetch(self, since: int, scopes: Optional[List[EntityKey]] = None, limit: int = BATCH_SIZE) -> List[Dict[str, Any]]:
+        """Changes after `since` from the log, blocking."""
+        with self.engine.connect() as connection:
+            return [dict(row._mapping) for row in connection.execute(
+                select_changes(Change.__table__, since, scopes, limit)
+            )]
+
+    def get_recent_seqs(self) -> List[int]:
+        """The last `LOOKBACK` sequence numbers of the log, blocking."""
+        with self.engine.connect() as connection:
+            return list(connection.execute(select(Change.seq).order_by(Change.seq.desc()).limit(LOOKBACK)).scalars())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            if self._loop is asyncio.get_running_loop():
+                await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self.pubsub.close()
+
+    def _notify(self):
+        # Called by the pubsub from any thread
+        loop, wake = self._loop, self._wake
+        if self._task is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(wake.set)
+
+    async def _run(self):
+        try:
+            # Changes already in the log are read by the subscribers, not dispatched
+            recent_seqs = await run_in_threadpool(self.get_recent_seqs)
+            self.last_seq = recent_seqs[0] if recent_seqs else 0
+            self._dispatched = set(recent_seqs)
+        except Exception as e:
+            self._ready.set_exception(e)
+            self._task = None
+            raise
+        self._ready.set_result(None)
+
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                while await self._read():
+                    pass
+            except Exception:
+                logger.exception("Reading the changes failed, retrying on the next poll")
+
+    async def _read(self) -> bool:
+        """Dispatch the new changes, returns whether more changes may be waiting."""
+        limit = LOOKBACK + BATCH_SIZE
+        changes = await run_in_threadpool(self.fetch, max(self.last_seq - LOOKBACK, 0), None, limit)
+        new = [change for change in changes if change["seq"] not in self._dispatched]
+        for change in new:
+            self._dispatch(change)
+            self._dispatched.add(change["seq"])
+        if changes:
+            self.last_seq = max(self.last_seq, changes[-1]["seq"])
+            self._dispatched = {seq for seq in self._dispatched if seq > self.last_seq - LOOKBACK}
+        return len(changes) >= limit
+
+    def _dispatch(self, change: Dict[str, Any]):
+        subscriptions = self._subscriptions.get((change["table_name"], change["entity_id"]), set()) | \
+            self._subscriptions.get(None, set())
+        for subscription in subscriptions:
+            try:
+                subscription.queue.put_nowait(change)
+            except asyncio.QueueFull:
+                logger.warning("Changes subscriber is too slow, disconnecting it")
+                subscription.closed = True
+                self.unsubscribe(subscription)
+
+
+async def iterate_changes(hub: ChangeHub, scopes: Optional[List[EntityKey]],
+                          since: Optional[int]) -> AsyncIterator[Optional[Dict[str, Any]]]:
+    """Changes of the `scopes` entities after `since`, then as they're committed.
+
+    Yields None every `CHANGES_HEARTBEAT` seconds without change, so the stream can keep
+    the connection alive. Ends when the subscriber falls behind, it resumes from the last
+    change it received.
+    """
+    subscription = await hub.subscribe(scopes)
+    try:
+        # Changes after the subscription start may be read from the log and dispatched
+        overlap: Set[int] = set()
+        while since is not None:
+            changes = await run_in_threadpool(hub.fetch, since, scopes)
+            for change in changes:
+                if change["seq"] > subscription.start_seq:
+                    overlap.add(change["seq"])
+                yield change
+            since = changes[-1]["seq"] if len(changes) >= BATCH_SIZE else None
+
+        while not (subscription.closed and subscription.queue.empty()):
+            try:
+                change = await asyncio.wait_for(subscription.queue.get(), CHANGES_HEARTBEAT)
+            except asyncio.TimeoutError:
+                yield None
+                continue
+            if change["seq"] not in overlap:
+                yield change
+    finally:
+        hub.unsubscribe(subscription)
+
+
+change_hub = ChangeHub(base.engine)
@@ -0,0 +1,132 @@
+import argparse
+import asyncio
+import logging
+import sys
+
+from db import base, migrations
+
+
+def migrate(args):
+    version = migrations.migrate(base.engine, log=print)
+    print(f"Database schema is at version {version}")
+
+
+def check(args):
+    try:
+        migrations.check_schema_version(base.engine)
+    except migrations.SchemaVersionError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+    print(f"Database schema is at version {migrations.SCHEMA_VERSION}")
+
+
+def recount(args):
+    from db import counters
+
+    fixed = counters.recount_database(base.engine, base.Base.metadata)
+    for name, count in fixed.items():
+        print(f"{name}: {count} rows fixed")
+
+
+def export(args):
+    from db import models
+    from transfer import export_database
+
+    output = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        for chunk in export_database(base.engine, models.Base.metadata):
+            output.write(chunk)
+    finally:
+        if args.output:
+            output.close()
+
+
+def import_(args):
+    from db import models
+    from transfer import IMPORT_BATCH_SIZE, Importer, InvalidImport
+
+    file = open(args.input, "rb") if args.input != "-" else sys.stdin.buffer
+    importer = Importer(base.engine, models.Base.metadata)
+    try:
+        lines = []
+        for line in file:
+            lines.append(line)
+            if len(lines) >= IMPORT_BATCH_SIZE:
+                importer.feed(lines)
+                lines = []
+        importer.feed(lines)
+        result = importer.commit()
+    except InvalidImport as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+    finally:
+        importer.close()
+        if args.input != "-":
+            file.close()
+    for name, count in result["rows"].items():
+        print(f"{name}: {count} rows imported")
+    for name, offset in result["id_offsets"].items():
+        print(f"{name}: ids shifted by {offset}")
+
+
+def prune_changes(args):
+    from datetime import datetime, timedelta
+    from db import changes, models
+
+    retention = changes.CHANGES_RETENTION if args.retention is None else args.retention
+    before = datetime.utcnow() - timedelta(seconds=retention)
+    with base.engine.begin() as connection:
+        count = changes.prune(connection, models.Change.__table__, before)
+    print(f"Deleted {count} changes older than {before.isoformat()}")
+
+
+def check_links(args):
+    from link_checker import LinkChecker
+
+    async def run():
+        checker = LinkChecker(base.engine)
+        try:
+            await checker.run(once=args.once)
+        finally:
+            await checker.close()
+
+    logging.basicConfig(format="%(asctime)s %(levelname)s %(message)s")
+    logging.getLogger("link_checker").setLevel(logging.INFO)
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        base.engine.dispose()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Linktious database and maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("migrate", help="Create or upgrade the database schema").set_defaults(handler=migrate)
+    commands.add_parser("check", help="Exit with an error if the database schema is outdated").set_defaults(
+        handler=check
+    )
+    commands.add_parser("recount", help="Recompute the stored counts of links and favorites").set_defaults(
+        handler=recount
+    )
+    export_parser = commands.add_parser("export", help="Export the database as NDJSON")
+    export_parser.add_argument("--output", help="File to write, standard output by default")
+    export_parser.set_defaults(handler=export)
+    import_parser = commands.add_parser("import", help="Import an NDJSON export as new rows")
+    import_parser.add_argument("input", help="File to read, - for standard input")
+    import_parser.set_defaults(handler=import_)
+    prune_changes_parser = commands.add_parser("prune-changes", help="Delete the changes older than the retention")
+    prune_changes_parser.add_argument("--retention", type=float, default=None,
+                                      help="Seconds changes are kept, LINKTIOUS_CHANGES_RETENTION by default")
+    prune_changes_parser.set_defaults(handler=prune_changes)
+    check_links_parser = commands.add_parser("check-links", help="Check the links URLs when they're due")
+    check_links_parser.add_argument("--once", action="store_true", help="Exit once no link is due")
+    check_links_parser.set_defaults(handler=check_links)
+
+    args = parser.parse_args(argv)
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Union
+from fastapi import Request, Response, status
+from pydantic.datetime_parse import parse_datetime
+
+
+def make_etag(table_name: str, model_id: int, updated_at: Union[datetime, str]) -> str:
+    """Entity tag of a model version, any change to the model updates `updated_at`."""
+    version = parse_datetime(updated_at).strftime("%Y%m%d%H%M%S%f")
+    return f'"{table_name}-{model_id}-{version}"'
+
+
+def format_last_modified(updated_at: Union[datetime, str]) -> str:
+    return format_datetime(parse_datetime(updated_at).replace(tzinfo=timezone.utc), usegmt=True)
+
+
+def set_validators(response: Response, etag: str, updated_at: Union[datetime, str]):
+    response.headers["ETag"] = etag
+    response.headers["Last-Modified"] = format_last_modified(updated_at)
+
+
+def is_not_modified(request: Request, etag: str, updated_at: datetime) -> bool:
+    """Check the request validators, `If-None-Match` takes precedence as in RFC 7232."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etag)
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is not None:
+        try:
+            modified_since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if modified_since.tzinfo is not None:
+            modified_since = modified_since.astimezone(timezone.utc).replace(tzinfo=None)
+        # HTTP dates have a precision of seconds
+        return updated_at.replace(microsecond=0) <= modified_since
+
+    return False
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    # Weak comparison
+    return "*" in tags or etag in (tag[2:] if tag.startswith("W/") else tag for tag in tags)
+
+
+def not_modified_response(etag: str, updated_at: datetime) -> Response:
+    response = Response(status_code=status.HTTP_304_NOT_MODIFIED)
+    set_validators(response, etag, updated_at)
+    return response
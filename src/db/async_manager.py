@@ -0,0 +1,110 @@
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Type, TypeVar
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from .base import Base
+from .models import ModelsManager
+from . import schema
+
+T_Result = TypeVar("T_Result")
+
+
+class AsyncModelQueryset:
+    """Awaitable proxy of a model queryset.
+
+    Every method call is forwarded to the model queryset and executed by the
+    models manager runner, so both database paths share the querysets code.
+
+    Usage Example:
+        link = await models_manager.links.with_load_plan(schema.Link).get(link_id)
+    """
+
+    def __init__(self, models_manager: "AsyncModelsManager", table_name: str,
+                 response_model: Type[schema.BaseModel] = None):
+        self.models_manager = models_manager
+        self.table_name = table_name
+        self.response_model = response_model
+
+    def with_load_plan(self, response_model: Type[schema.BaseModel]) -> "AsyncModelQueryset":
+        return AsyncModelQueryset(
+            models_manager=self.models_manager,
+            table_name=self.table_name,
+            response_model=response_model,
+        )
+
+    def get_queryset(self, models_manager: ModelsManager):
+        queryset = getattr(models_manager, self.table_name)
+        if self.response_model is not None:
+            queryset = queryset.with_load_plan(self.response_model)
+        return queryset
+
+    def __getattr__(self, name: str) -> Callable[..., Any]:
+        async def call(*args, **kwargs):
+            return await self.models_manager.run(
+                lambda models_manager: getattr(self.get_queryset(models_manager), name)(*args, **kwargs)
+            )
+        return call
+
+
+class AsyncModelsManager(ABC):
+    """Async models manager for routers.
+
+    Same interface as `ModelsManager` but queryset methods are awaitable. Subclasses
+    decide how the sync querysets code runs without blocking the event loop.
+
+    Usage Example:
+        teams = await models_manager.teams.all()
+        user = await models_manager.run(lambda manager: manager.users.get(user_id))
+    """
+
+    teams: AsyncModelQueryset
+    users: AsyncModelQueryset
+    links: AsyncModelQueryset
+    labels: AsyncModelQueryset
+    boards: AsyncModelQueryset
+    changes: AsyncModelQueryset
+
+    def __init__(self, models_manager: ModelsManager):
+        self.models_manager = models_manager
+
+    @abstractmethod
+    async def run(self, function: Callable[[ModelsManager], T_Result]) -> T_Result:
+        """Call `function` with the sync models manager."""
+
+    async def commit(self):
+        await self.run(lambda models_manager: models_manager.db.commit())
+
+    def __getattr__(self, name: str) -> AsyncModelQueryset:
+        if Base.get_model_by_table_name(name) is None:
+            raise AttributeError(f"{self.__class__.__name__!r} object has no attribute {name!r}")
+
+        queryset = AsyncModelQueryset(models_manager=self, table_name=name)
+        setattr(self, name, queryset)
+        return queryset
+
+
+class AsyncSessionModelsManager(AsyncModelsManager):
+    """Run querysets on an `AsyncSession`.
+
+    The sync querysets code runs in a greenlet on top of the async driver, so the
+    database I/O never blocks the event loop and no thread is held per request.
+    """
+
+    def __init__(self, db, unit_of_work: bool = False):
+        super().__init__(models_manager=ModelsManager(db=db.sync_session, unit_of_work=unit_of_work))
+        self.db = db
+
+    async def run(self, function: Callable[[ModelsManager], T_Result]) -> T_Result:
+        return await self.db.run_sync(lambda _: function(self.models_manager))
+
+
+class ThreadpoolModelsManager(AsyncModelsManager):
+    """Run querysets on a blocking `Session` in the threadpool."""
+
+    def __init__(self, db: Session, unit_of_work: bool = False):
+        super().__init__(models_manager=ModelsManager(db=db, unit_of_work=unit_of_work))
+        self.db = db
+
+    async def run(self, function: Callable[[ModelsManager], T_Result]) -> T_Result:
+        return await run_in_threadpool(function, self.models_manager)
@@ -1,31 +1,70 @@
-from typing import Union
+from typing import Dict, List, Tuple, Union
 import os
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import as_declarative
 from sqlalchemy.orm import sessionmaker, Session
 
+from .engine import configure_engine, get_engine_options
 from .querysets import ModelQueryset
 
 
-SQLALCHEMY_DATABASE_URL = os.getenv("LINKTIOUS_DATABASE_URL", "sqlite:///./linktious.db")
+SYNC_MODE = "sync"
+ASYNC_MODE = "async"
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+SQLALCHEMY_DATABASE_URL = os.getenv("LINKTIOUS_DATABASE_URL", "sqlite:///./linktious.db")
+SQLALCHEMY_ASYNC_DATABASE_URL = os.getenv(
+    "LINKTIOUS_ASYNC_DATABASE_URL",
+    SQLALCHEMY_DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://", 1),
 )
+# sync: blocking sessions run in the threadpool, async: AsyncSession on an async driver
+DATABASE_MODE = os.getenv("LINKTIOUS_DATABASE_MODE", SYNC_MODE)
+# Commit once per request when it succeeds instead of on every save
+REQUEST_TRANSACTION = os.getenv("LINKTIOUS_REQUEST_TRANSACTION", "1") == "1"
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **get_engine_options(SQLALCHEMY_DATABASE_URL))
+configure_engine(engine)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = None
+AsyncSessionLocal = None
+if DATABASE_MODE == ASYNC_MODE:
+    # Imported only when used since it requires greenlet and the async driver
+    from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+
+    async_engine = create_async_engine(
+        SQLALCHEMY_ASYNC_DATABASE_URL, **get_engine_options(SQLALCHEMY_ASYNC_DATABASE_URL, is_async=True)
+    )
+    configure_engine(async_engine.sync_engine)
+    # Models are serialized after the session work is done, expiring them would
+    # require lazy loading outside of the async session.
+    AsyncSessionLocal = sessionmaker(
+        bind=async_engine, class_=AsyncSession, autocommit=False, autoflush=False, expire_on_commit=False
+    )
+
 
 @as_declarative()
 class Base:
 
     ObjectsQueryset: ModelQueryset = NotImplemented
 
+    # Models registry by table name, filled once when the models module is imported
+    _models_by_table_name: Dict[str, "Base"] = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        table_name = cls.__dict__.get("__tablename__")
+        if table_name is not None:
+            cls._models_by_table_name[table_name] = cls
+
     @classmethod
     def get_objects_queryset(cls, db: Session) -> ModelQueryset:
         return cls.ObjectsQueryset(db=db, model=cls)
 
+    def get_cache_entities(self) -> List[Tuple[str, int]]:
+        """Cached entities, as (table name, id), affected by changes to this model."""
+        return [(self.__tablename__, self.id)]
+
     @classmethod
     def get_model_by_table_name(cls, table_name: str) -> Union["Base", None]:
-        return next((model for model in cls.__subclasses__()
-                     if model.__tablename__ == table_name), None)
+        return cls._models_by_table_name.get(table_name)
@@ -0,0 +1,240 @@
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from itertools import chain
+from typing import Dict, Iterable, Optional, Set, Tuple
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# Session info key of the entities changed by the session's transaction
+PENDING_INVALIDATIONS = "pending_cache_invalidations"
+
+CACHE_URL = os.getenv("LINKTIOUS_CACHE_URL", "memory://")
+CACHE_MAX_SIZE = int(os.getenv("LINKTIOUS_CACHE_MAX_SIZE", "10000"))
+CACHE_TTL = float(os.getenv("LINKTIOUS_CACHE_TTL", "300"))
+
+EntityKey = Tuple[str, int]
+
+
+class CacheBackend(ABC):
+    """Storage of serialized entities.
+
+    Every entity key holds the entity serialized by each response schema as a field, so
+    invalidating an entity drops all of its representations at once. An entity key can
+    also depend on other entities, deleting any of them deletes it too.
+    """
+
+    @abstractmethod
+    def get(self, key: str, field: str) -> Optional[str]:
+        pass
+
+    @abstractmethod
+    def set(self, key: str, field: str, value: str):
+        pass
+
+    @abstractmethod
+    def delete(self, keys: Iterable[str]):
+        pass
+
+    @abstractmethod
+    def add_dependencies(self, key: str, dependencies: Iterable[str]):
+        pass
+
+
+class LRUCache(CacheBackend):
+    """In process LRU cache with TTL, bounded by the number of entities."""
+
+    def __init__(self, max_size: int = CACHE_MAX_SIZE, ttl: float = CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, str]]]" = OrderedDict()
+        # Dependency key to the keys depending on it, and back to prune them with the entries
+        self._dependents: Dict[str, Set[str]] = {}
+        self._dependencies: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str, field: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            expires_at, fields = entry
+            if expires_at < time.monotonic():
+                self._remove(key)
+                return None
+
+            self._entries.move_to_end(key)
+            return fields.get(field)
+
+    def set(self, key: str, field: str, value: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                entry = (time.monotonic() + self.ttl, {})
+                self._entries[key] = entry
+            entry[1][field] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+
+    def delete(self, keys: Iterable[str]):
+        with self._lock:
+            for key in keys:
+                for dependent in self._dependents.get(key, set()).copy():
+                    self._remove(dependent)
+                self._remove(key)
+
+    def add_dependencies(self, key: str, dependencies: Iterable[str]):
+        with self._lock:
+            for dependency in dependencies:
+                self._dependents.setdefault(dependency, set()).add(key)
+                self._dependencies.setdefault(key, set()).add(dependency)
+
+    def _remove(self, key: str):
+        self._entries.pop(key, None)
+        for dependency in self._dependencies.pop(key, ()):
+            dependents = self._dependents.get(dependency)
+            if dependents is not None:
+                dependents.discard(key)
+                if not dependents:
+                    del self._dependents[dependency]
+
+
+class RedisCache(CacheBackend):
+    """Cache shared by workers on any redis compatible client, entities are hashes."""
+
+    def __init__(self, client, ttl: float = CACHE_TTL, prefix: str = "linktious:"):
+        self.client = client
+        self.ttl = int(ttl)
+        self.prefix = prefix
+
+    def get(self, key: str, field: str) -> Optional[str]:
+        value = self.client.hget(self.prefix + key, field)
+        return value.decode() if isinstance(value, bytes) else value
+
+    def set(self, key: str, field: str, value: str):
+        pipeline = self.client.pipeline()
+        pipeline.hset(self.prefix + key, field, value)
+        pipeline.expire(self.prefix + key, self.ttl)
+        pipeline.execute()
+
+    def delete(self, keys: Iterable[str]):
+        keys = list(keys)
+        if not keys:
+            return
+
+        dependents_keys = [self.prefix + "dependents:" + key for key in keys]
+        pipeline = self.client.pipeline()
+        for dependents_key in dependents_keys:
+            pipeline.smembers(dependents_key)
+        dependents = set(chain.from_iterable(pipeline.execute()))
+        self.client.delete(*(self.prefix + key for key in keys), *dependents_keys, *dependents)
+
+    def add_dependencies(self, key: str, dependencies: Iterable[str]):
+        pipeline = self.client.pipeline()
+        for dependency in dependencies:
+            # Members are full keys, deleted as is
+            pipeline.sadd(self.prefix + "dependents:" + dependency, self.prefix + key)
+            pipeline.expire(self.prefix + "dependents:" + dependency, self.ttl)
+        pipeline.execute()
+
+
+class ModelCache:
+    """Read-through cache of serialized entities with hit/miss counters.
+
+    Entries are invalidated when a transaction which changed their entity commits,
+    see `collect_invalidations` and `apply_invalidations`.
+    """
+
+    def __init__(self, backend: Optional[CacheBackend]):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        # Bumped on every invalidation, a value read before it may already be stale
+        self.generation = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    @staticmethod
+    def key(table_name: str, model_id: int) -> str:
+        return f"{table_name}:{model_id}"
+
+    def get(self, table_name: str, model_id: int, field: str) -> Optional[str]:
+        value = self.backend.get(self.key(table_name, model_id), field)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, table_name: str, model_id: int, field: str, value: str, generation: int,
+            depends_on: Iterable[EntityKey] = ()):
+        """Store a value read at `generation`, `depends_on` entities changes invalidate it as well."""
+        if generation == self.generation:
+            key = self.key(table_name, model_id)
+            dependencies = [self.key(*entity) for entity in depends_on if entity != (table_name, model_id)]
+            if dependencies:
+                self.backend.add_dependencies(key, dependencies)
+            self.backend.set(key, field, value)
+
+    def invalidate(self, entities: Iterable[EntityKey]):
+        self.generation += 1
+        self.backend.delete(self.key(table_name, model_id) for table_name, model_id in entities)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.backend.__class__.__name__ if self.enabled else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+        }
+
+
+def create_backend(url: str) -> Optional[CacheBackend]:
+    if not url or url == "none":
+        return None
+    if url.startswith("memory://"):
+        return LRUCache()
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        # Optional dependency, needed only for a shared cache
+        import redis
+
+        return RedisCache(client=redis.Redis.from_url(url))
+    raise ValueError(f"Unsupported cache url {url!r}")
+
+
+model_cache = ModelCache(backend=create_backend(CACHE_URL))
+
+
+def get_pending_invalidations(session: Session) -> Set[EntityKey]:
+    return session.info.setdefault(PENDING_INVALIDATIONS, set())
+
+
+def mark_changed(session: Session, table_name: str, models_ids: Iterable[int]):
+    """Register entities changed without the ORM, e.g. association table statements."""
+    get_pending_invalidations(session).update((table_name, model_id) for model_id in models_ids)
+
+
+@event.listens_for(Session, "after_flush")
+def collect_invalidations(session: Session, flush_context):
+    pending = get_pending_invalidations(session)
+    for instance in chain(session.new, session.dirty, session.deleted):
+        pending.update(instance.get_cache_entities())
+
+
+@event.listens_for(Session, "after_commit")
+def apply_invalidations(session: Session):
+    pending = session.info.pop(PENDING_INVALIDATIONS, None)
+    if pending and model_cache.enabled:
+        model_cache.invalidate(pending)
+
+
+@event.listens_for(Session, "after_rollback")
+def discard_invalidations(session: Session):
+    session.info.pop(PENDING_INVALIDATIONS, None)
@@ -0,0 +1,206 @@
+import logging
+import os
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+from sqlalchemy import Table, and_, event, or_, select
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+
+from . import schema
+from .cache import EntityKey
+
+logger = logging.getLogger(__name__)
+
+# Session info keys of the changes of the session's transaction, and of the changes written
+PENDING_CHANGES = "pending_changes"
+CHANGES_WRITTEN = "changes_written"
+
+CHANGES_PUBSUB_URL = os.getenv("LINKTIOUS_CHANGES_PUBSUB_URL", "memory://")
+CHANGES_CHANNEL = os.getenv("LINKTIOUS_CHANGES_CHANNEL", "linktious:changes")
+# Seconds changes are kept, `python src/cli.py prune-changes` deletes the older ones
+CHANGES_RETENTION = float(os.getenv("LINKTIOUS_CHANGES_RETENTION", str(7 * 24 * 3600)))
+
+# (table name, entity id, relationship), the relationship of association changes
+ChangeKey = Tuple[str, int, Optional[str]]
+
+
+class PubSub(ABC):
+    """Notifies the processes that changes were committed.
+
+    Messages carry no change, subscribers read the new changes from the log. A lost
+    message only delays them until the subscribers read the log again.
+    """
+
+    @abstractmethod
+    def publish(self):
+        pass
+
+    @abstractmethod
+    def subscribe(self, callback: Callable[[], None]):
+        """`callback` is called from any thread."""
+
+    def close(self):
+        pass
+
+
+class LocalPubSub(PubSub):
+    """Notifies the subscribers of the process, enough for a single worker."""
+
+    def __init__(self):
+        self._callbacks: List[Callable[[], None]] = []
+
+    def publish(self):
+        for callback in self._callbacks:
+            callback()
+
+    def subscribe(self, callback: Callable[[], None]):
+        self._callbacks.append(callback)
+
+
+class RedisPubSub(PubSub):
+    """Notifies the subscribers of every worker through a channel of any redis compatible client."""
+
+    def __init__(self, client, channel: str = CHANGES_CHANNEL):
+        self.client = client
+        self.channel = channel
+        self._callbacks: List[Callable[[], None]] = []
+        self._pubsub = None
+
+    def publish(self):
+        self.client.publish(self.channel, b"")
+
+    def subscribe(self, callback: Callable[[], None]):
+        self._callbacks.append(callback)
+        if self._pubsub is None:
+            self._pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            self._pubsub.subscribe(self.channel)
+            threading.Thread(target=self._listen, name="changes-pubsub", daemon=True).start()
+
+    def close(self):
+        if self._pubsub is not None:
+            self._pubsub.close()
+            self._pubsub = None
+
+    def _listen(self):
+        pubsub = self._pubsub
+        try:
+            for _ in pubsub.listen():
+                for callback in self._callbacks:
+                    callback()
+        except Exception:
+            if self._pubsub is not None:
+                logger.exception("Listening to %s failed, changes are delivered on the next poll", self.channel)
+
+
+def create_pubsub(url: str) -> PubSub:
+    if url.startswith("memory://"):
+        return LocalPubSub()
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        # Optional dependency, needed only for several workers
+        import redis
+
+        return RedisPubSub(client=redis.Redis.from_url(url))
+    raise ValueError(f"Unsupported changes pubsub url {url!r}")
+
+
+change_pubsub = create_pubsub(CHANGES_PUBSUB_URL)
+
+
+def get_pending_changes(session: Session) -> Dict[ChangeKey, str]:
+    return session.info.setdefault(PENDING_CHANGES, {})
+
+
+def mark_changed(session: Session, table_name: str, models_ids: Iterable[int],
+                 action: schema.ChangeAction = schema.ChangeAction.updated, relationship: str = None):
+    """Register changes made without the ORM, `relationship` for changes of the entities associations."""
+    pending = get_pending_changes(session)
+    for model_id in models_ids:
+        pending.setdefault((table_name, model_id, relationship), action.value)
+
+
+@event.listens_for(Session, "after_flush")
+def collect_changes(session: Session, flush_context):
+    pending = get_pending_changes(session)
+    for action, instances in ((schema.ChangeAction.created, session.new),
+                              (schema.ChangeAction.updated, session.dirty),
+                              (schema.ChangeAction.deleted, session.deleted)):
+        for instance in instances:
+            for table_name, model_id in instance.get_cache_entities():
+                # Association rows are changes of the entities they relate
+                is_instance = table_name == instance.__tablename__
+                pending.setdefault(
+                    (table_name, model_id, None),
+                    action.value if is_instance else schema.ChangeAction.updated.value,
+                )
+
+
+@event.listens_for(Session, "before_commit")
+def write_changes(session: Session):
+    # Flushed first, the commit's own flush comes after this event
+    session.flush()
+    pending = session.info.pop(PENDING_CHANGES, None)
+    if pending:
+        # Imported here, the models import the querysets which import this module
+        from .models import Change
+
+        record(session, Change.__table__, (key + (action,) for key, action in pending.items()))
+        session.info[CHANGES_WRITTEN] = True
+
+
+@event.listens_for(Session, "after_commit")
+def publish_changes(session: Session):
+    if session.info.pop(CHANGES_WRITTEN, False):
+        try:
+            change_pubsub.publish()
+        except Exception:
+            # Committed anyway, subscribers find the changes on their next poll
+            logger.exception("Publishing changes failed")
+
+
+@event.listens_for(Session, "after_rollback")
+def discard_changes(session: Session):
+    session.info.pop(PENDING_CHANGES, None)
+    session.info.pop(CHANGES_WRITTEN, None)
+
+
+def record(connection: Union[Connection, Session], table: Table,
+           changes: Iterable[Tuple[str, int, Optional[str], str]], now: datetime = None):
+    """Append (table name, entity id, relationship, action) changes to the log, in the caller's transaction."""
+    now = now or datetime.utcnow()
+    rows = [
+        {"table_name": table_name, "entity_id": entity_id, "relationship_name": relationship,
+         "action": action, "created_at": now}
+        for table_name, entity_id, relationship, action in sorted(changes, key=lambda change: change[:2])
+    ]
+    if rows:
+        connection.execute(table.insert(), rows)
+
+
+def select_changes(table: Table, since: int, scopes: Iterable[EntityKey] = None, limit: int = None) -> Select:
+    """Changes after the `since` sequence number, of the `scopes` entities when given, oldest first.
+
+    A scope matches the changes of its entity only: the changes of its associations
+    are, the changes of the associated entities aren't. The changes of a board include
+    the links added to it or removed from it, not the updates of these links.
+    """
+    query = select(table).where(table.c.seq > since).order_by(table.c.seq)
+    if scopes is not None:
+        query = query.where(or_(*(
+            and_(table.c.table_name == table_name, table.c.entity_id == entity_id)
+            for table_name, entity_id in scopes
+        )))
+    return query if limit is None else query.limit(limit)
+
+
+def prune(connection: Connection, table: Table, before: datetime) -> int:
+    """Delete the changes older than `before`, returns how many were deleted."""
+    return connection.execute(table.delete().where(table.c.created_at < before)).rowcount
+
+
+def get_scopes(**entities_ids: Optional[int]) -> Optional[List[EntityKey]]:
+    """Scopes of `select_changes` from ids by table name, None when no id is given."""
+    scopes = [(table_name, entity_id) for table_name, entity_id in entities_ids.items() if entity_id is not None]
+    return scopes or None
@@ -0,0 +1,100 @@
+from datetime import datetime
+from typing import Dict, Iterable, List, NamedTuple
+from sqlalchemy import MetaData, Table, func, select
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+
+from .cache import model_cache
+
+# Rows fixed per statement, below the bound parameters limit of SQLite
+RECOUNT_BATCH_SIZE = 500
+
+
+class Counter(NamedTuple):
+    """Stored count of the association rows of each row of a counted table."""
+    association_table: str
+    # Association column holding the id of the counted row
+    key: str
+    counted_table: str
+    column: str
+
+    @property
+    def name(self) -> str:
+        return f"{self.counted_table}.{self.column}"
+
+
+COUNTERS: List[Counter] = [
+    Counter("links_labels_association", "lable_id", "labels", "links_count"),
+    Counter("boards_links_association", "board_id", "boards", "links_count"),
+    Counter("users_favorite_boards_association", "board_id", "boards", "favorites_count"),
+]
+
+
+def get_counters(association_table: Table) -> List[Counter]:
+    return [counter for counter in COUNTERS if counter.association_table == association_table.name]
+
+
+def increment(db: Session, metadata: MetaData, counter: Counter, counts: Dict[int, int]):
+    """Add `counts` to the counter of each counted row id, in the session's transaction.
+
+    The counter is incremented in SQL so concurrent transactions don't lose updates. Rows
+    already loaded by the session get the new value without being reloaded.
+    """
+    table = metadata.tables[counter.counted_table]
+    column = table.c[counter.column]
+    # A new count is a new version of the row, set here to update the loaded rows alike
+    values = {"updated_at": datetime.utcnow()} if "updated_at" in table.c else {}
+    by_amount: Dict[int, List[int]] = {}
+    for id, amount in counts.items():
+        if amount:
+            by_amount.setdefault(amount, []).append(id)
+    for amount, ids in by_amount.items():
+        db.execute(table.update().where(table.c.id.in_(ids)).values({**values, column.name: column + amount}))
+
+    for instance in list(db.identity_map.values()):
+        if getattr(instance, "__tablename__", None) == counter.counted_table and counts.get(instance.id):
+            if counter.column in instance.__dict__:
+                set_committed_value(instance, counter.column, instance.__dict__[counter.column] + counts[instance.id])
+            for name, value in values.items():
+                set_committed_value(instance, name, value)
+
+
+def recount(connection: Connection, metadata: MetaData,
+            counters: Iterable[Counter] = COUNTERS) -> Dict[str, List[int]]:
+    """Recompute the counters from the association tables, returns the ids of the rows fixed per counter.
+
+    Counters are maintained with the association changes of the querysets, rows inserted
+    otherwise (bulk loads, manual fixes) need a recount. Only rows with a wrong count are
+    updated, so the versions of the other rows don't change. The cached rows are left to
+    the caller, `recount_database` invalidates them once the fixes are committed.
+    """
+    fixed = {}
+    for counter in counters:
+        table = metadata.tables[counter.counted_table]
+        association = metadata.tables[counter.association_table]
+        column = table.c[counter.column]
+        count = select(func.count()).where(association.c[counter.key] == table.c.id).scalar_subquery()
+        ids = connection.execute(select(table.c.id).where(column != count).order_by(table.c.id)).scalars().all()
+        values = {"updated_at": datetime.utcnow()} if "updated_at" in table.c else {}
+        for start in range(0, len(ids), RECOUNT_BATCH_SIZE):
+            batch = ids[start:start + RECOUNT_BATCH_SIZE]
+            # Checked again, the count may have been fixed since the ids were read
+            connection.execute(table.update().where(table.c.id.in_(batch), column != count).values(
+                {**values, counter.column: count}
+            ))
+        fixed[counter.name] = ids
+    return fixed
+
+
+def recount_database(engine: Engine, metadata: MetaData, counters: Iterable[Counter] = COUNTERS) -> Dict[str, int]:
+    """Recount in a transaction of its own, returns the number of rows fixed per counter."""
+    counters = list(counters)
+    with engine.begin() as connection:
+        fixed = recount(connection, metadata, counters)
+
+    entities = {(counter.counted_table, id) for counter in counters for id in fixed[counter.name]}
+    if entities and model_cache.enabled:
+        # Caches of other processes expire with their TTL
+        model_cache.invalidate(entities)
+    return {name: len(ids) for name, ids in fixed.items()}
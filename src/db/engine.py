@@ -0,0 +1,191 @@
+import asyncio
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool, Pool, QueuePool
+
+# Pool sizing, shared by the sync and async engines
+POOL_SIZE = int(os.getenv("LINKTIOUS_DB_POOL_SIZE", "5"))
+POOL_MAX_OVERFLOW = int(os.getenv("LINKTIOUS_DB_POOL_MAX_OVERFLOW", "10"))
+POOL_TIMEOUT = float(os.getenv("LINKTIOUS_DB_POOL_TIMEOUT", "30"))
+# Seconds after which a connection is replaced, -1 to keep connections forever
+POOL_RECYCLE = int(os.getenv("LINKTIOUS_DB_POOL_RECYCLE", "1800"))
+POOL_PRE_PING = os.getenv("LINKTIOUS_DB_POOL_PRE_PING", "1") == "1"
+# Blocking sessions open at once, a session waiting on a lock holds a threadpool worker so
+# there must be a worker left for the lock owner to commit. Defaults below the default
+# executor size.
+MAX_SESSIONS = int(os.getenv(
+    "LINKTIOUS_DB_MAX_SESSIONS",
+    str(max(1, min(POOL_SIZE + POOL_MAX_OVERFLOW, min(32, (os.cpu_count() or 1) + 4) - 1))),
+))
+
+# SQLite connection pragmas, WAL lets readers go on while a writer commits
+SQLITE_JOURNAL_MODE = os.getenv("LINKTIOUS_SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("LINKTIOUS_SQLITE_SYNCHRONOUS", "NORMAL")
+# Milliseconds a writer waits for the lock instead of failing with "database is locked"
+SQLITE_BUSY_TIMEOUT = int(os.getenv("LINKTIOUS_SQLITE_BUSY_TIMEOUT", "5000"))
+# Negative values are KiB, not pages
+SQLITE_CACHE_SIZE = int(os.getenv("LINKTIOUS_SQLITE_CACHE_SIZE", "-65536"))
+SQLITE_MMAP_SIZE = int(os.getenv("LINKTIOUS_SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+
+class PoolStats:
+    """Checkout counters of a pool, shared by the pools it's recreated into."""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, wait: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+
+
+class TimedPoolMixin:
+    """Measure how long checkouts wait for a connection of a queue pool."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.stats.record(time.perf_counter() - started, timed_out=True)
+            raise
+        self.stats.record(time.perf_counter() - started)
+        return connection
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+class TimedQueuePool(TimedPoolMixin, QueuePool):
+    pass
+
+
+class TimedAsyncAdaptedQueuePool(TimedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+class SessionLimiter:
+    """Bound the blocking sessions open at once, waiting in the event loop instead of a worker."""
+
+    def __init__(self, limit: int = MAX_SESSIONS):
+        self.limit = limit
+        self.in_use = 0
+        self.stats = PoolStats()
+        # Created on first use to be bound to the running loop
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @asynccontextmanager
+    async def slot(self):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.limit)
+
+        started = time.perf_counter()
+        async with self._semaphore:
+            self.stats.record(time.perf_counter() - started)
+            self.in_use += 1
+            try:
+                yield
+            finally:
+                self.in_use -= 1
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "in_use": self.in_use,
+            "saturation": round(self.in_use / self.limit, 4),
+            "acquired": self.stats.checkouts,
+            "wait_avg_ms": round(self.stats.wait_total / self.stats.checkouts * 1000, 3)
+            if self.stats.checkouts else None,
+            "wait_max_ms": round(self.stats.wait_max * 1000, 3),
+        }
+
+
+session_limiter = SessionLimiter()
+
+
+def is_sqlite(url: str) -> bool:
+    return make_url(url).get_backend_name() == "sqlite"
+
+
+def is_sqlite_memory(url: str) -> bool:
+    database = make_url(url).database
+    return not database or database == ":memory:" or "mode=memory" in database
+
+
+def get_engine_options(url: str, is_async: bool = False) -> Dict[str, Any]:
+    """`create_engine` arguments of the configured profile for the database url."""
+    options: Dict[str, Any] = {}
+    if is_sqlite(url):
+        options["connect_args"] = {"check_same_thread": False}
+        # Every connection of an in memory database is a new database, keep the dialect's pool
+        if is_sqlite_memory(url):
+            return options
+
+    options.update(
+        # The SQLite dialects default to NullPool for files, reopening the file on every checkout
+        poolclass=TimedAsyncAdaptedQueuePool if is_async else TimedQueuePool,
+        pool_size=POOL_SIZE,
+        max_overflow=POOL_MAX_OVERFLOW,
+        pool_timeout=POOL_TIMEOUT,
+        pool_recycle=POOL_RECYCLE,
+        pool_pre_ping=POOL_PRE_PING,
+    )
+    return options
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT:d}")
+        cursor.execute(f"PRAGMA cache_size={SQLITE_CACHE_SIZE:d}")
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE:d}")
+    finally:
+        cursor.close()
+
+
+def configure_engine(engine: Engine):
+    """Install the per connection setup of the profile, `engine` is the sync engine."""
+    if engine.dialect.name == "sqlite" and not is_sqlite_memory(str(engine.url)):
+        event.listen(engine, "connect", set_sqlite_pragmas)
+
+
+def get_pool_status(pool: Pool) -> Optional[Dict[str, Any]]:
+    """Occupancy and checkout wait times of a profile pool, None for other pools."""
+    if not isinstance(pool, TimedPoolMixin):
+        return None
+
+    stats = pool.stats
+    capacity = pool.size() + max(pool._max_overflow, 0)
+    lookups = stats.checkouts + stats.timeouts
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "overflow": max(pool.overflow(), 0),
+        "saturation": round(pool.checkedout() / capacity, 4) if capacity else None,
+        "checkouts": stats.checkouts,
+        "timeouts": stats.timeouts,
+        "wait_avg_ms": round(stats.wait_total / lookups * 1000, 3) if lookups else None,
+        "wait_max_ms": round(stats.wait_max * 1000, 3),
+    }
@@ -0,0 +1,181 @@
+from datetime import datetime
+from typing import Callable, List, NamedTuple, Optional
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, exc, inspect
+from sqlalchemy.engine import Connection, Engine
+
+from . import counters, search
+from .models import Base
+
+# Kept out of the models metadata so creating or dropping the models doesn't touch it
+version_metadata = MetaData()
+
+schema_version_table = Table(
+    "schema_version",
+    version_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String),
+    Column("applied_at", DateTime, default=datetime.utcnow),
+)
+
+
+class SchemaVersionError(RuntimeError):
+    """Raised on startup when the database schema isn't at the version of the code."""
+    pass
+
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    upgrade: Callable[[Connection], None]
+
+
+def create_indexes(*statements: str) -> Callable[[Connection], None]:
+    def upgrade(connection: Connection):
+        for statement in statements:
+            connection.exec_driver_sql(statement)
+    return upgrade
+
+
+def add_links_updated_at(connection: Connection):
+    columns = {column["name"] for column in inspect(connection).get_columns("links")}
+    if "updated_at" not in columns:
+        column_type = DateTime().compile(dialect=connection.dialect)
+        connection.exec_driver_sql(f"ALTER TABLE links ADD COLUMN updated_at {column_type}")
+    connection.exec_driver_sql("UPDATE links SET updated_at = created_at WHERE updated_at IS NULL")
+
+
+def add_links_check_columns(connection: Connection):
+    columns = {column["name"] for column in inspect(connection).get_columns("links")}
+    string, integer, datetime_type = (
+        column_type().compile(dialect=connection.dialect) for column_type in (String, Integer, DateTime)
+    )
+    for name, definition in (
+        ("status", f"{string} DEFAULT 'unchecked' NOT NULL"),
+        ("status_code", integer),
+        ("checked_at", datetime_type),
+        ("check_failures", f"{integer} DEFAULT 0 NOT NULL"),
+        ("next_check_at", datetime_type),
+    ):
+        if name not in columns:
+            connection.exec_driver_sql(f"ALTER TABLE links ADD COLUMN {name} {definition}")
+    # Existing links are due right away, oldest first
+    connection.exec_driver_sql("UPDATE links SET next_check_at = created_at WHERE next_check_at IS NULL")
+    create_indexes(
+        "CREATE INDEX IF NOT EXISTS ix_links_status_created_at_id ON links (status, created_at, id)",
+        "CREATE INDEX IF NOT EXISTS ix_links_next_check_at ON links (next_check_at)",
+    )(connection)
+
+
+def add_association_counters(connection: Connection):
+    integer = Integer().compile(dialect=connection.dialect)
+    for table, names in (("labels", ("links_count",)), ("boards", ("links_count", "favorites_count"))):
+        columns = {column["name"] for column in inspect(connection).get_columns(table)}
+        for name in names:
+            if name not in columns:
+                connection.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {name} {integer} DEFAULT 0 NOT NULL")
+    counters.recount(connection, Base.metadata)
+    create_indexes(
+        "CREATE INDEX IF NOT EXISTS ix_labels_links_count_id ON labels (links_count, id)",
+        "CREATE INDEX IF NOT EXISTS ix_boards_links_count_id ON boards (links_count, id)",
+        "CREATE INDEX IF NOT EXISTS ix_boards_favorites_count_id ON boards (favorites_count, id)",
+    )(connection)
+
+
+def create_changes_table(connection: Connection):
+    Base.metadata.tables["changes"].create(bind=connection, checkfirst=True)
+
+
+def create_links_search_index(connection: Connection):
+    if connection.dialect.name != "sqlite":
+        return
+    for statement in search.CREATE_LINKS_SEARCH_INDEX + search.REBUILD_LINKS_SEARCH_INDEX:
+        connection.exec_driver_sql(statement)
+
+
+# Statements must be idempotent, databases created with `create_all` by an older version
+# may already have part of a migration.
+MIGRATIONS: List[Migration] = [
+    Migration(1, "Initial schema", lambda connection: None),
+    Migration(2, "Keyset pagination indexes", create_indexes(
+        "CREATE INDEX IF NOT EXISTS ix_links_created_at_id ON links (created_at, id)",
+        "CREATE INDEX IF NOT EXISTS ix_labels_created_at_id ON labels (created_at, id)",
+        "CREATE INDEX IF NOT EXISTS ix_boards_created_at_id ON boards (created_at, id)",
+    )),
+    Migration(3, "Links updated_at", add_links_updated_at),
+    Migration(4, "Links search index", create_links_search_index),
+    Migration(5, "Association tables reverse indexes", create_indexes(
+        "CREATE INDEX IF NOT EXISTS ix_links_labels_association_lable_id "
+        "ON links_labels_association (lable_id, link_id)",
+        "CREATE INDEX IF NOT EXISTS ix_users_favorite_boards_association_board_id "
+        "ON users_favorite_boards_association (board_id, user_id)",
+        "CREATE INDEX IF NOT EXISTS ix_boards_links_association_link_id "
+        "ON boards_links_association (link_id, board_id)",
+    )),
+    Migration(6, "Links check status", add_links_check_columns),
+    Migration(7, "Association counters", add_association_counters),
+    Migration(8, "Change log", create_changes_table),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1].version
+
+
+def get_schema_version(connection: Connection) -> Optional[int]:
+    """Current schema version, None when the database was never migrated."""
+    try:
+        # Plain SQL, compiling a Core statement on a cold worker costs more than running it
+        return connection.exec_driver_sql(f"SELECT max(version) FROM {schema_version_table.name}").scalar()
+    except (exc.OperationalError, exc.ProgrammingError):
+        # The version table doesn't exist
+        return None
+
+
+def stamp(connection: Connection, migration: Migration):
+    connection.execute(schema_version_table.insert(), {
+        "version": migration.version, "description": migration.description,
+    })
+
+
+def migrate(engine: Engine, log: Callable[[str], None] = lambda message: None) -> int:
+    """Bring the database to `SCHEMA_VERSION`, each migration is committed on its own."""
+    with engine.begin() as connection:
+        # Inspected rather than queried, a failed statement aborts the transaction on some backends
+        version = get_schema_version(connection) if inspect(connection).has_table("schema_version") else None
+        if version is None:
+            version_metadata.create_all(bind=connection)
+            if not inspect(connection).has_table("users"):
+                # Fresh database, the models are already at the latest version
+                Base.metadata.create_all(bind=connection)
+                for migration in MIGRATIONS:
+                    stamp(connection, migration)
+                log(f"Created schema version {SCHEMA_VERSION}")
+                return SCHEMA_VERSION
+
+            # Created by `create_all` before schema versions existed
+            stamp(connection, MIGRATIONS[0])
+            version = MIGRATIONS[0].version
+            log(f"Stamped existing schema as version {version}")
+
+    for migration in MIGRATIONS:
+        if migration.version <= version:
+            continue
+        with engine.begin() as connection:
+            migration.upgrade(connection)
+            stamp(connection, migration)
+        version = migration.version
+        log(f"Migrated to version {version}: {migration.description}")
+    return version
+
+
+def check_schema_version(engine: Engine):
+    """Startup check, a single query instead of reflecting every table."""
+    with engine.connect() as connection:
+        version = get_schema_version(connection)
+    if version != SCHEMA_VERSION:
+        raise SchemaVersionError(
+            f"Database schema version is {version}, expected {SCHEMA_VERSION}. Run `python src/cli.py migrate`."
+        )
+
+
+def drop_schema(engine: Engine):
+    Base.metadata.drop_all(bind=engine)
+    version_metadata.drop_all(bind=engine)
@@ -1,9 +1,9 @@
 from datetime import datetime
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, DateTime
+from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, DateTime, Index
 from sqlalchemy.orm import relationship, Session
 
 from .base import Base
-from . import querysets
+from . import querysets, schema, search
 
 
 class Team(Base):
@@ -48,12 +48,29 @@ class User(Base):
 
 class Link(Base):
     __tablename__ = "links"
+    __table_args__ = (
+        # Keyset pagination order
+        Index("ix_links_created_at_id", "created_at", "id"),
+        # Keyset pagination of the links with a status
+        Index("ix_links_status_created_at_id", "status", "created_at", "id"),
+        # Due links of the link checker
+        Index("ix_links_next_check_at", "next_check_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     icon_url = Column(String)
     url = Column(String)
     description = Column(String)
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Maintained by the link checker, see `link_checker`
+    status = Column(String, nullable=False, default=schema.LinkStatus.unchecked.value,
+                    server_default=schema.LinkStatus.unchecked.value)
+    status_code = Column(Integer, nullable=True)
+    checked_at = Column(DateTime, nullable=True)
+    check_failures = Column(Integer, nullable=False, default=0, server_default="0")
+    next_check_at = Column(DateTime, default=datetime.utcnow)
 
     created_by_user_id = Column(Integer, ForeignKey("users.id"))
     created_by = relationship("User", back_populates="created_links")
@@ -69,10 +86,18 @@ class Link(Base):
 
 class Label(Base):
     __tablename__ = "labels"
+    __table_args__ = (
+        # Keyset pagination order
+        Index("ix_labels_created_at_id", "created_at", "id"),
+        # Sort by links count
+        Index("ix_labels_links_count_id", "links_count", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, unique=True, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Maintained with the association rows, see `db.counters`
+    links_count = Column(Integer, nullable=False, default=0, server_default="0")
 
     created_by_user_id = Column(Integer, ForeignKey("users.id"))
     created_by = relationship("User", back_populates="created_labels")
@@ -90,19 +115,36 @@ class LinkLabelAssociation(Base):
         those labels to filter links.
     """
     __tablename__ = "links_labels_association"
+    __table_args__ = (
+        # The primary key only covers lookups by link_id
+        Index("ix_links_labels_association_lable_id", "lable_id", "link_id"),
+    )
 
     link_id = Column(Integer, ForeignKey("links.id"), primary_key=True)
     lable_id = Column(Integer, ForeignKey("labels.id"), primary_key=True)
 
+    def get_cache_entities(self):
+        return [(Link.__tablename__, self.link_id), (Label.__tablename__, self.lable_id)]
+
 
 class Board(Base):
     __tablename__ = "boards"
+    __table_args__ = (
+        # Keyset pagination order
+        Index("ix_boards_created_at_id", "created_at", "id"),
+        # Sorts by counts
+        Index("ix_boards_links_count_id", "links_count", "id"),
+        Index("ix_boards_favorites_count_id", "favorites_count", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, unique=True, index=True)
     description = Column(String)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Maintained with the association rows, see `db.counters`
+    links_count = Column(Integer, nullable=False, default=0, server_default="0")
+    favorites_count = Column(Integer, nullable=False, default=0, server_default="0")
 
     created_by_user_id = Column(Integer, ForeignKey("users.id"))
     created_by = relationship("User", back_populates="created_boards", foreign_keys=[created_by_user_id])
@@ -121,20 +163,59 @@ class UserFavoriteBoardsAssociation(Base):
         for users.
     """
     __tablename__ = "users_favorite_boards_association"
+    __table_args__ = (
+        # The primary key only covers lookups by user_id
+        Index("ix_users_favorite_boards_association_board_id", "board_id", "user_id"),
+    )
 
     user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
     board_id = Column(Integer, ForeignKey("boards.id"), primary_key=True)
 
+    def get_cache_entities(self):
+        return [(User.__tablename__, self.user_id), (Board.__tablename__, self.board_id)]
+
 
 class BoardLinksAssociation(Base):
     """Many to many relationship between boards and links that will be used
         to filter links for board by links associated to board.
     """
     __tablename__ = "boards_links_association"
+    __table_args__ = (
+        # The primary key only covers lookups by board_id
+        Index("ix_boards_links_association_link_id", "link_id", "board_id"),
+    )
 
     board_id = Column(Integer, ForeignKey("boards.id"), primary_key=True)
     link_id = Column(Integer, ForeignKey("links.id"), primary_key=True)
 
+    def get_cache_entities(self):
+        return [(Board.__tablename__, self.board_id), (Link.__tablename__, self.link_id)]
+
+
+search.install_links_search_index(Base.metadata)
+
+
+class Change(Base):
+    """Log of the changes of the entities, appended by the transactions which make them, see `db.changes`."""
+    __tablename__ = "changes"
+    __table_args__ = (
+        # Changes of an entity, for feeds scoped to a board or a user
+        Index("ix_changes_table_name_entity_id_seq", "table_name", "entity_id", "seq"),
+        # Pruning
+        Index("ix_changes_created_at", "created_at"),
+        # Sequence numbers of pruned changes aren't reused
+        {"sqlite_autoincrement": True},
+    )
+
+    seq = Column(Integer, primary_key=True)
+    table_name = Column(String, nullable=False)
+    entity_id = Column(Integer, nullable=False)
+    action = Column(String, nullable=False)
+    relationship_name = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    ObjectsQueryset = querysets.ChangeQueryset
+
 
 class ModelsManager:
     """Models Manager for models.
@@ -154,19 +235,23 @@ class ModelsManager:
     links: Link.ObjectsQueryset
     labels: Label.ObjectsQueryset
     boards: Board.ObjectsQueryset
+    changes: Change.ObjectsQueryset
     
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, unit_of_work: bool = False):
         self.db = db
+        # With unit of work querysets only flush, the caller commits the transaction once
+        self.db.info[querysets.UNIT_OF_WORK] = unit_of_work
+
+    def __getattr__(self, name):
+        """Get model queryset by table name.
 
-    def __getattribute__(self, name):
-        """Get attribute
-        
-        Checks first if requested attribute is model queryset and if so initialize
-        instance of the relevant model queryset with the db session.
+        Called only when the attribute is missing, so the relevant model queryset is
+        initialized with the db session once and cached on the manager.
         """
         model = Base.get_model_by_table_name(name)
         if model is None:
-            # Default behaviour
-            return super().__getattribute__(name)
-        
-        return model.get_objects_queryset(db=self.db)
+            raise AttributeError(f"{self.__class__.__name__!r} object has no attribute {name!r}")
+
+        queryset = model.get_objects_queryset(db=self.db)
+        setattr(self, name, queryset)
+        return queryset
@@ -0,0 +1,79 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, NamedTuple, Sequence, Tuple, Union
+from sqlalchemy import and_, or_
+from sqlalchemy.sql.elements import ColumnElement
+
+DEFAULT_PAGE_LIMIT = 50
+MAX_PAGE_LIMIT = 500
+
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor can't be decoded for the requested ordering."""
+    pass
+
+
+class Page(NamedTuple):
+    items: List[Any]
+    next_cursor: Union[str, None] = None
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    if isinstance(value, float):
+        # Hex floats round-trip exactly, like the search ranks compared for equality
+        return {"f": value.hex()}
+    return value
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, dict) and "dt" in value:
+        return datetime.fromisoformat(value["dt"])
+    if isinstance(value, dict) and "f" in value:
+        return float.fromhex(value["f"])
+    return value
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Encode the keyset values of the last returned row as an opaque url safe token."""
+    payload = json.dumps([_encode_value(value) for value in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, keys_count: int) -> List[Any]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor("Invalid cursor") from e
+
+    if not isinstance(values, list) or len(values) != keys_count:
+        raise InvalidCursor("Invalid cursor")
+
+    try:
+        return [_decode_value(value) for value in values]
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor("Invalid cursor") from e
+
+
+def parse_ordering(ordering: Sequence[str]) -> List[Tuple[str, bool]]:
+    """Split ordering keys like `-links_count` into the column name and whether it's descending."""
+    return [(key[1:], True) if key.startswith("-") else (key, False) for key in ordering]
+
+
+def keyset_criterion(keys: Sequence[ColumnElement], values: Sequence[Any],
+                     descending: Sequence[bool] = ()) -> ColumnElement:
+    """Build `(k1, k2, ...) > (v1, v2, ...)` without relying on row values support.
+
+    Expands to `k1 > v1 OR (k1 = v1 AND k2 > v2) OR ...` so the leading key can
+    still use a composite index on every backend. Descending keys compare with `<`.
+    """
+    descending = list(descending) or [False] * len(keys)
+    clauses = []
+    for position, (key, value) in enumerate(zip(keys, values)):
+        equals = [previous_key == previous_value
+                  for previous_key, previous_value in zip(keys[:position], values[:position])]
+        clauses.append(and_(*equals, key < value if descending[position] else key > value))
+    return or_(*clauses)
@@ -1,9 +1,19 @@
-from typing import Generic, TypeVar, Union, List, TYPE_CHECKING
-from sqlalchemy.orm import Session, Query
+import json
+from datetime import datetime
+from typing import Any, Callable, Dict, Generic, Iterable, Iterator, Set, Type, TypeVar, Union, List, Sequence, Tuple, TYPE_CHECKING
+from pydantic import ValidationError
+from sqlalchemy import func, intersect, select, text
+from sqlalchemy.orm import Session, Query, selectinload
+from metrics import timed_serialization
+
+from . import changes, counters, schema
+from .cache import EntityKey, get_pending_invalidations, mark_changed, model_cache
+from .pagination import Page, decode_cursor, encode_cursor, keyset_criterion, parse_ordering
+from .search import LINKS_SEARCH_TABLE, to_match_query
 
 if TYPE_CHECKING:
     from .base import Base
-    from . import models, schema
+    from . import models
 
 T_Model = TypeVar("T_Model", bound='Base')
 T_SchemaCreate = TypeVar("T_SchemaCreate", bound='schema.BaseModel')
@@ -11,29 +21,470 @@ UserOrNone = Union['models.User', None]
 LinkOrNone = Union['models.Link', None]
 BoardOrNone = Union['models.Board', None]
 
+# Session info key set when the session transaction is committed by the request
+UNIT_OF_WORK = "unit_of_work"
+
+BULK_BATCH_SIZE = 1000
+# Stay below SQLite's default limit of bound parameters per statement
+IN_CLAUSE_CHUNK_SIZE = 500
+# Dialects aggregating the related ids in SQL with `group_concat`, joined with commas
+GROUP_CONCAT_DIALECTS = {"sqlite", "mysql", "mariadb"}
+
+
+def chunks(items: Sequence[Any], size: int) -> Iterator[Sequence[Any]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class Association:
+    """Association table of a many to many relationship.
+
+    Lets querysets change the relationship with INSERT/DELETE statements on the
+    association table, without loading the relationship collection.
+    """
+
+    def __init__(self, model: T_Model, relationship: str):
+        relationship_property = getattr(model, relationship).property
+        self.relationship = relationship
+        self.back_relationship = relationship_property.back_populates
+        self.table = relationship_property.secondary
+        [(self.owner_id_column, self.owner_column)] = relationship_property.synchronize_pairs
+        [(self.target_id_column, self.target_column)] = relationship_property.secondary_synchronize_pairs
+
+    def get_ids(self, db: Session, owner_id: int, among: Iterable[int] = None) -> Set[int]:
+        """Get the related ids of the owner, optionally only the ones among given ids."""
+        query = select(self.target_column).where(self.owner_column == owner_id)
+        if among is None:
+            return set(db.execute(query).scalars())
+
+        ids = set()
+        for chunk in chunks(list(among), IN_CLAUSE_CHUNK_SIZE):
+            ids.update(db.execute(query.where(self.target_column.in_(chunk))).scalars())
+        return ids
+
+    def get_existing_targets(self, db: Session, ids: Iterable[int]) -> Set[int]:
+        """Filter out ids that don't exist in the related table."""
+        existing = set()
+        for chunk in chunks(list(set(ids)), IN_CLAUSE_CHUNK_SIZE):
+            existing.update(db.execute(
+                select(self.target_id_column).where(self.target_id_column.in_(chunk))
+            ).scalars())
+        return existing
+
+    def add(self, db: Session, owner_id: int, ids: Set[int]):
+        if ids:
+            db.execute(self.table.insert(), [
+                {self.owner_column.name: owner_id, self.target_column.name: id} for id in sorted(ids)
+            ])
+            self._mark_changed(db, owner_id, ids)
+            self._update_counters(db, owner_id, ids, 1)
+
+    def remove(self, db: Session, owner_id: int, ids: Set[int]):
+        """Remove the owner's association rows with `ids`, which must exist."""
+        for chunk in chunks(sorted(ids), IN_CLAUSE_CHUNK_SIZE):
+            db.execute(self.table.delete().where(
+                self.owner_column == owner_id, self.target_column.in_(chunk)
+            ))
+        if ids:
+            self._mark_changed(db, owner_id, ids)
+            self._update_counters(db, owner_id, ids, -1)
+
+    def _update_counters(self, db: Session, owner_id: int, ids: Set[int], sign: int):
+        # Same transaction as the association rows, the counts can't drift on failures
+        for counter in counters.get_counters(self.table):
+            if counter.key == self.owner_column.name:
+                counters.increment(db, self.table.metadata, counter, {owner_id: sign * len(ids)})
+            else:
+                for chunk in chunks(sorted(ids), IN_CLAUSE_CHUNK_SIZE):
+                    counters.increment(db, self.table.metadata, counter, {id: sign for id in chunk})
+
+    def _mark_changed(self, db: Session, owner_id: int, ids: Set[int]):
+        # Statements on the association table aren't seen by the session flush
+        mark_changed(db, self.owner_id_column.table.name, [owner_id])
+        mark_changed(db, self.target_id_column.table.name, ids)
+        changes.mark_changed(db, self.owner_id_column.table.name, [owner_id], relationship=self.relationship)
+        changes.mark_changed(db, self.target_id_column.table.name, ids, relationship=self.back_relationship)
+
 
 class ModelQueryset(Generic[T_Model, T_SchemaCreate]):
     """Model queryset to extend sqlalchemy queryset functionality."""
+
+    # Columns used for keyset pagination, must be unique together and end with a unique column
+    pagination_keys: Tuple[str, ...] = ("id",)
+    # Other orders of the list endpoints by sort name, keys like `pagination_keys`, `-` descending
+    orderings: Dict[str, Tuple[str, ...]] = {}
+
+    # Relationships each response schema serializes, mapped to the relationship names that
+    # should be eager loaded (ids only) so serializing a list doesn't issue a query per row.
+    load_plans: Dict[Type[schema.BaseModel], Tuple[str, ...]] = {}
+    # Relationships of the load plan in use, also loaded on saved models
+    eager_relationships: Tuple[str, ...] = ()
+
     def __init__(self, db: Session, model: T_Model):
         self.db = db
         self.model = model
-        self.queryset = self.db.query(self.model)
+        self._queryset = None
+
+    @property
+    def queryset(self) -> Query:
+        """Model query, built on first use."""
+        if self._queryset is None:
+            self._queryset = self.db.query(self.model)
+        return self._queryset
 
     def __getattr__(self, name: str) -> Query:
         queryset = super().__getattribute__('queryset')
         return getattr(queryset, name)
 
+    def get_load_plan(self, response_model: Type[schema.BaseModel]) -> Tuple[str, ...]:
+        """Relationships serialized by `response_model`, the plan of its closest base class."""
+        return next((self.load_plans[cls] for cls in response_model.__mro__ if cls in self.load_plans), ())
+
+    def with_load_plan(self, response_model: Type[schema.BaseModel]) -> "ModelQueryset":
+        """Get a copy of the queryset that eager loads what `response_model` serializes.
+
+        Every relationship in the plan is loaded with a single `SELECT ... IN` for all the
+        rows of the query, fetching only the related ids.
+        """
+        relationships = self.get_load_plan(response_model)
+        if not relationships:
+            return self
+
+        queryset = self.__class__(db=self.db, model=self.model)
+        queryset.eager_relationships = relationships
+        queryset._queryset = self.queryset.options(
+            *(selectinload(getattr(self.model, relationship)).load_only("id")
+              for relationship in relationships)
+        )
+        return queryset
+
+    def get_cached_json(self, model_id: int, field: str,
+                        load: Callable[[], Union[Tuple[str, Iterable[EntityKey]], None]]) -> Union[str, None]:
+        """Read-through cache of a JSON representation of a model.
+
+        `load` returns the JSON and the other entities it's built from, or None when the
+        model doesn't exist. The entry is invalidated when the model or any of them change.
+        """
+        # Changes of the session's own transaction aren't committed, don't mix them with the cache.
+        # Unflushed changes count too, the queries of `load` would flush them.
+        db = self.db
+        use_cache = model_cache.enabled and not (get_pending_invalidations(db) or db.new or db.dirty or db.deleted)
+        table_name = self.model.__tablename__
+        if use_cache:
+            cached = model_cache.get(table_name, model_id, field)
+            if cached is not None:
+                return cached
+            generation = model_cache.generation
+
+        loaded = load()
+        if loaded is None:
+            return None
+
+        serialized, depends_on = loaded
+        if use_cache and not get_pending_invalidations(db):
+            model_cache.set(table_name, model_id, field, serialized, generation, depends_on=depends_on)
+        return serialized
+
+    def get_serialized(self, model_id: int, response_model: Type[schema.BaseModel]) -> Union[dict, None]:
+        """Read-through cached `get`, serialized by the response model."""
+        def load():
+            model = self.with_load_plan(response_model).get(model_id)
+            if model is None:
+                return None
+            with timed_serialization():
+                return response_model.from_orm(model).json(), ()
+
+        serialized = self.get_cached_json(model_id, response_model.__name__, load)
+        return None if serialized is None else json.loads(serialized)
+
+    def apply_filters(self, query: Query, **filters) -> Query:
+        """Apply list endpoints filters, querysets add the filters relevant to their model."""
+        raise TypeError(f"Unsupported filters for {self.model.__tablename__}: {', '.join(filters)}")
+
+    def exists(self, model_id: int) -> bool:
+        return self.db.execute(select(self.model.id).where(self.model.id == model_id)).first() is not None
+
+    def get_version(self, model_id: int) -> Union[datetime, None]:
+        """Get `updated_at` of a model which has it, without loading the model."""
+        return self.db.execute(
+            select(self.model.updated_at).where(self.model.id == model_id)
+        ).scalar()
+
     def filter_by_ids(self, ids) -> List[T_Model]:
-        return self.filter(self.model.id.in_(ids))
+        return self.filter(self.model.id.in_(ids)).all()
+
+    def get_ordering(self, sort: str = None) -> List[Tuple[str, bool]]:
+        """Pagination keys of a sort of `orderings`, `pagination_keys` by default."""
+        return parse_ordering(self.pagination_keys if sort is None else self.orderings[sort])
+
+    def paginate(self, limit: int, cursor: str = None, query: Query = None, sort: str = None, **filters) -> Page:
+        """Keyset pagination ordered by `pagination_keys`, or by the keys of `sort`.
+
+        Only `limit + 1` rows are fetched no matter how big the table is, and the
+        next cursor is built from the last returned row. Filters are passed to `apply_filters`.
+        """
+        query = self.queryset if query is None else query
+        if filters:
+            query = self.apply_filters(query, **filters)
+        ordering = self.get_ordering(sort)
+        keys = [getattr(self.model, key) for key, _ in ordering]
+        descending = [key_descending for _, key_descending in ordering]
+        if cursor is not None:
+            query = query.filter(keyset_criterion(keys, decode_cursor(cursor, len(keys)), descending))
+
+        items = query.order_by(*(
+            key.desc() if key_descending else key for key, key_descending in zip(keys, descending)
+        )).limit(limit + 1).all()
+        next_cursor = None
+        if len(items) > limit:
+            items = items[:limit]
+            next_cursor = encode_cursor([getattr(items[-1], key) for key, _ in ordering])
+        return Page(items=items, next_cursor=next_cursor)
+
+    def get_serialized_fields(self, response_model: Type[schema.BaseModel],
+                              fields: Sequence[str] = None) -> Tuple[List[str], Tuple[str, ...]]:
+        """Fields to select, all the `response_model` ones by default, and the relationships among them."""
+        table_columns = self.model.__table__.columns
+        relationships = self.get_load_plan(response_model)
+        fields = list(response_model.__fields__ if fields is None else fields)
+        unsupported = [field for field in fields if field not in table_columns and field not in relationships]
+        if unsupported:
+            raise TypeError(f"{response_model.__name__} fields {', '.join(unsupported)} aren't columns "
+                            f"of {self.model.__tablename__}")
+        return fields, tuple(relationship for relationship in relationships if relationship in fields)
+
+    def serialized_query(self, response_model: Type[schema.BaseModel], fields: Sequence[str] = None,
+                         extra_columns: Sequence[str] = ()) -> Query:
+        """Query of only the response columns, rows are turned into dicts by `serialize_rows`.
+
+        Every relationship of the load plan is aggregated in SQL into the related ids where
+        the dialect has `group_concat`, otherwise `serialize_rows` looks the ids up with a
+        query per relationship like the load plan's selectin loading.
+        """
+        table_columns = self.model.__table__.columns
+        fields, relationships = self.get_serialized_fields(response_model, fields)
+        selected = [field for field in fields if field in table_columns]
+        if relationships and not self.aggregates_ids():
+            # Rows are matched to their related ids by id
+            extra_columns = [*extra_columns, "id"]
+        selected.extend(column for column in dict.fromkeys(extra_columns) if column not in selected)
+        columns = [table_columns[column] for column in selected]
+        if self.aggregates_ids():
+            for relationship in relationships:
+                association = Association(self.model, relationship)
+                columns.append(
+                    select(func.group_concat(association.target_column))
+                    .where(association.owner_column == association.owner_id_column)
+                    .scalar_subquery()
+                    .label(relationship)
+                )
+        return self.db.query(*columns)
+
+    def aggregates_ids(self) -> bool:
+        return self.db.get_bind().dialect.name in GROUP_CONCAT_DIALECTS
 
-    def create(self, model_schema: T_SchemaCreate) -> T_Model:
-        db_model = self.model(**model_schema.dict())
+    def get_related_ids(self, ids: Sequence[int], relationships: Sequence[str]) -> Dict[str, Dict[int, List[int]]]:
+        """Related ids of the `ids` rows by relationship, rows without any are left out."""
+        related: Dict[str, Dict[int, List[int]]] = {}
+        for relationship in relationships:
+            association = Association(self.model, relationship)
+            query = select(association.owner_column, association.target_column)
+            by_owner = related[relationship] = {}
+            for chunk in chunks(list(dict.fromkeys(ids)), IN_CLAUSE_CHUNK_SIZE):
+                for owner_id, target_id in self.db.execute(query.where(association.owner_column.in_(chunk))):
+                    by_owner.setdefault(owner_id, []).append(target_id)
+        return related
+
+    def serialize_rows(self, rows: Iterable[Any], response_model: Type[schema.BaseModel],
+                       fields: Sequence[str] = None) -> List[Dict[str, Any]]:
+        fields, relationships = self.get_serialized_fields(response_model, fields)
+        # Queries run before the timing, it only covers the serialization
+        rows = list(rows)
+        related = {}
+        if relationships and not self.aggregates_ids():
+            related = self.get_related_ids([row.id for row in rows], relationships)
+        items = []
+        with timed_serialization():
+            for row in rows:
+                item = {
+                    field: related[field].get(row.id, []) if field in related else getattr(row, field)
+                    for field in fields
+                }
+                for relationship in relationships:
+                    if relationship not in related:
+                        ids = item[relationship]
+                        item[relationship] = [int(id) for id in ids.split(",")] if ids else []
+                items.append(item)
+        return items
+
+    def paginate_serialized(self, response_model: Type[schema.BaseModel], limit: int, cursor: str = None,
+                            sort: str = None, **filters) -> Page:
+        """`paginate` returning items as dicts of the `response_model` fields.
+
+        Skips models and validation for large pages, see `serialized_query`. The database
+        values are trusted to match the response model.
+        """
+        # The cursor is built from the last row
+        query = self.serialized_query(response_model, extra_columns=[key for key, _ in self.get_ordering(sort)])
+        page = self.paginate(limit=limit, cursor=cursor, query=query, sort=sort, **filters)
+        return Page(items=self.serialize_rows(page.items, response_model), next_cursor=page.next_cursor)
+
+    def get_serialized_by_ids(self, ids: Iterable[int],
+                              response_model: Type[schema.BaseModel]) -> Dict[int, Dict[str, Any]]:
+        """Items of the `response_model` fields by id, like `paginate_serialized`, missing ids are left out.
+
+        Ids are looked up `IN_CLAUSE_CHUNK_SIZE` at a time, so any number of ids fits the
+        database limit of bound parameters.
+        """
+        query = self.serialized_query(response_model, extra_columns=["id"])
+        items = {}
+        for batch in chunks(list(dict.fromkeys(ids)), IN_CLAUSE_CHUNK_SIZE):
+            rows = query.filter(self.model.id.in_(batch)).all()
+            items.update(zip((row.id for row in rows), self.serialize_rows(rows, response_model)))
+        return items
+
+    def create(self, model_schema: T_SchemaCreate, **values) -> T_Model:
+        """Create from the schema, `values` are columns set by the server, e.g. the creator."""
+        db_model = self.model(**model_schema.dict(), **values)
         return self.save(model=db_model)
 
-    def save(self, model: T_Model) -> T_Model:
+    def bulk_create(self, items: List[Dict[str, Any]], model_schema: Type[T_SchemaCreate],
+                    batch_size: int = BULK_BATCH_SIZE, **values) -> schema.BulkCreateResult:
+        """Validate and insert many rows in a single transaction.
+
+        Every item is validated on its own and checked against the unique columns, so
+        invalid items are reported by index while the valid ones are still created.
+        Rows are inserted with one executemany per batch and models aren't refreshed.
+        `values` are set on every row, like in `create`.
+        """
+        ids = [None] * len(items)
+        errors = []
+        rows = []
+        for index, item in enumerate(items):
+            try:
+                rows.append((index, {**model_schema.parse_obj(item).dict(), **values}))
+            except ValidationError as e:
+                errors.append(schema.BulkItemErrors(index=index, errors=e.errors()))
+
+        conflicts = self._unique_conflicts([values for _, values in rows])
+        errors.extend(schema.BulkItemErrors(index=rows[position][0], errors=conflict_errors)
+                      for position, conflict_errors in conflicts.items())
+        rows = [row for position, row in enumerate(rows) if position not in conflicts]
+
+        for batch in chunks(rows, batch_size):
+            for (index, _), id in zip(batch, self.insert_rows([values for _, values in batch])):
+                ids[index] = id
+        changes.mark_changed(self.db, self.model.__tablename__, (id for id in ids if id is not None),
+                             schema.ChangeAction.created)
+        self.commit()
+
+        return schema.BulkCreateResult(
+            created=len(rows),
+            ids=ids,
+            errors=sorted(errors, key=lambda error: error.index),
+        )
+
+    def insert_rows(self, rows: List[Dict[str, Any]]) -> List[int]:
+        """Insert rows and get their ids, in the same order.
+
+        A single executemany where the dialect returns the ids of its rows, otherwise one
+        statement per row: SQLite only has the `lastrowid` of the last one.
+        """
+        if not rows:
+            return []
+
+        table = self.model.__table__
+        if self.db.get_bind().dialect.insert_executemany_returning:
+            return [row.id for row in self.db.execute(table.insert().returning(table.c.id), rows)]
+
+        return [self.db.execute(table.insert(), row).inserted_primary_key[0] for row in rows]
+
+    def _unique_conflicts(self, rows: List[Dict[str, Any]]) -> Dict[int, List[dict]]:
+        """Find rows which would violate a unique column, keyed by their position."""
+        conflicts = {}
+        for column in self.model.__table__.columns:
+            if not column.unique or column.primary_key:
+                continue
+
+            values = [row.get(column.name) for row in rows]
+            existing = set()
+            for chunk in chunks(list(set(values) - {None}), IN_CLAUSE_CHUNK_SIZE):
+                existing.update(self.db.execute(select(column).where(column.in_(chunk))).scalars())
+
+            seen = set()
+            for position, value in enumerate(values):
+                if value is None:
+                    continue
+                if value in existing or value in seen:
+                    conflicts.setdefault(position, []).append({
+                        "loc": [column.name],
+                        "msg": f"{column.name} already exists",
+                        "type": "value_error.unique",
+                    })
+                seen.add(value)
+        return conflicts
+
+    def set_related(self, model_id: int, relationship: str, ids: Iterable[int]) -> Union[T_Model, None]:
+        """Replace the related models, touching only association rows that changed."""
+        return self._update_related(model_id, relationship, ids, add=True, remove_others=True)
+
+    def add_related(self, model_id: int, relationship: str, ids: Iterable[int]) -> Union[T_Model, None]:
+        return self._update_related(model_id, relationship, ids, add=True)
+
+    def remove_related(self, model_id: int, relationship: str, ids: Iterable[int]) -> Union[T_Model, None]:
+        return self._update_related(model_id, relationship, ids, add=False)
+
+    def _update_related(self, model_id: int, relationship: str, ids: Iterable[int],
+                        add: bool, remove_others: bool = False) -> Union[T_Model, None]:
+        model = self.get(model_id)
+        if model is None:
+            return None
+
+        association = Association(model=self.model, relationship=relationship)
+        ids = set(ids)
+        if add:
+            ids = association.get_existing_targets(self.db, ids)
+            if remove_others:
+                current = association.get_ids(self.db, model_id)
+                added, removed = ids - current, current - ids
+            else:
+                added, removed = ids - association.get_ids(self.db, model_id, among=ids), set()
+        else:
+            added, removed = set(), association.get_ids(self.db, model_id, among=ids)
+
+        association.remove(self.db, model_id, removed)
+        association.add(self.db, model_id, added)
+        # The loaded collection, if any, doesn't know about the statements above
+        self.db.expire(model, [relationship])
+        if (added or removed) and hasattr(self.model, "updated_at"):
+            # New version for conditional requests, the model row itself didn't change
+            model.updated_at = datetime.utcnow()
+        return self.save(model=model)
+
+    @property
+    def in_unit_of_work(self) -> bool:
+        return self.db.info.get(UNIT_OF_WORK, False)
+
+    def commit(self):
+        """Commit, or only flush when the request commits its transaction once it succeeds."""
+        if self.in_unit_of_work:
+            self.db.flush()
+        else:
+            self.db.commit()
+
+    def save(self, model: T_Model, refresh: bool = False) -> T_Model:
+        """Save model, column defaults are set on it by the flush.
+
+        Refresh reloads it from the database, e.g. for server side defaults. Without
+        a unit of work the commit expires the model, so it's always refreshed.
+        """
         self.db.add(model)
-        self.db.commit()
-        self.db.refresh(model)
+        self.commit()
+        if refresh or not self.in_unit_of_work:
+            self.db.refresh(model)
+        # Load while the session is usable, async sessions can't lazy load on serialization
+        for relationship in self.eager_relationships:
+            getattr(model, relationship)
         return model
 
 
@@ -48,10 +499,22 @@ class UserQueryset(ModelQueryset['models.User', 'schema.UserCreate']):
     """User model queryset allow to extend ModelQueryset with
         methods that only relevant to User model.
     """
+
+    load_plans = {
+        schema.User: ("favorite_boards",),
+    }
     
-    # This method is temporary until we add real authentication method
-    def authentication(self, email: str, password: str) -> UserOrNone:
-        return self.filter_by(email=email, hashed_password=password).one_or_none()
+    def get_credentials(self, email: str) -> Union[Tuple[int, str, bool], None]:
+        """Id, password hash and active flag of the user with the email, checked by `auth`."""
+        return self.db.execute(
+            select(self.model.id, self.model.hashed_password, self.model.is_active).where(self.model.email == email)
+        ).first()
+
+    def set_password_hash(self, user_id: int, hashed_password: str):
+        self.db.execute(
+            self.model.__table__.update().where(self.model.id == user_id).values(hashed_password=hashed_password)
+        )
+        self.commit()
 
     def set_main_board(self, user_id: int, board_id) -> UserOrNone:
         user = self.get(user_id)
@@ -61,48 +524,226 @@ class UserQueryset(ModelQueryset['models.User', 'schema.UserCreate']):
         user.main_board_id = board_id
         return self.save(model=user)
     
-    def set_favorite_boards(self, user_id: int, boards: List['models.Board']) -> UserOrNone:
-        user = self.get(user_id)
-        if user is None:
-            return None
-        
-        user.favorite_boards.clear()
-        user.favorite_boards.extend(boards)
-        return self.save(model=user)
+    def set_favorite_boards(self, user_id: int, boards_ids: List[int]) -> UserOrNone:
+        return self.set_related(model_id=user_id, relationship="favorite_boards", ids=boards_ids)
+
+    def add_favorite_boards(self, user_id: int, boards_ids: List[int]) -> UserOrNone:
+        return self.add_related(model_id=user_id, relationship="favorite_boards", ids=boards_ids)
+
+    def remove_favorite_boards(self, user_id: int, boards_ids: List[int]) -> UserOrNone:
+        return self.remove_related(model_id=user_id, relationship="favorite_boards", ids=boards_ids)
+
+    def get_home(self, user_id: int) -> Union[str, None]:
+        """User home as JSON: the user, the main board and the favorite boards with their counts.
+
+        Built with three queries whatever the number of favorites and cached per user. The
+        entry depends on the boards it shows, so changes to them or to the user invalidate it.
+        """
+        def load():
+            user_rows = self.serialized_query(schema.User).filter(self.model.id == user_id).all()
+            if not user_rows:
+                return None
+            [user] = self.serialize_rows(user_rows, schema.User)
+
+            boards = self.model.favorite_boards.property.mapper.class_.get_objects_queryset(db=self.db)
+            main_board = None
+            if user["main_board_id"] is not None:
+                main_board_rows = boards.serialized_query(schema.Board).filter(
+                    boards.model.id == user["main_board_id"]
+                ).all()
+                main_board = next(iter(boards.serialize_rows(main_board_rows, schema.Board)), None)
+
+            favorite_boards = Association(model=self.model, relationship="favorite_boards")
+            favorites_rows = boards.serialized_query(schema.BoardSummary).filter(boards.model.id.in_(
+                select(favorite_boards.target_column).where(favorite_boards.owner_column == user_id)
+            )).order_by(boards.model.id).all()
+
+            with timed_serialization():
+                home = schema.UserHome(
+                    user=user,
+                    main_board=main_board,
+                    favorite_boards=[dict(row._mapping) for row in favorites_rows],
+                ).json()
+            depends_on = [(boards.model.__tablename__, board_id) for board_id in user["favorite_boards"]]
+            if main_board is not None:
+                depends_on.append((boards.model.__tablename__, main_board["id"]))
+            return home, depends_on
+
+        return self.get_cached_json(user_id, schema.UserHome.__name__, load)
 
 
 class LabelQueryset(ModelQueryset['models.Label', 'schema.LabelCreate']):
     """Label model queryset allow to extend ModelQueryset with
         methods that only relevant to Label model.
     """
-    pass
+
+    pagination_keys = ("created_at", "id")
+    orderings = {
+        schema.LabelsSort.created_at: pagination_keys,
+        schema.LabelsSort.links_count: ("-links_count", "-id"),
+    }
 
 
 class LinkQueryset(ModelQueryset['models.Link', 'schema.LinkCreate']):
     """Link model queryset allow to extend ModelQueryset with
         methods that only relevant to Link model.
     """
+
+    pagination_keys = ("created_at", "id")
+    load_plans = {
+        schema.Link: ("labels",),
+    }
     
-    def set_labels(self, link_id: int, labels: List['models.Label']) -> LinkOrNone:
-        link = self.get(link_id)
-        if link is None:
-            return None
+    def apply_filters(self, query: Query, labels_ids: List[int] = None, labels_match: str = schema.LabelsMatch.all,
+                      board_id: int = None, status: str = None, **filters) -> Query:
+        """Filter links by labels, board and check status.
+
+        Set based on the association tables reverse indexes: `all` intersects the links
+        of every label and `any` selects the links of any of them, no rows are filtered in Python.
+        """
+        if filters:
+            query = super().apply_filters(query, **filters)
+
+        if board_id is not None:
+            board_links = Association(model=self.model, relationship="boards")
+            query = query.filter(self.model.id.in_(
+                select(board_links.owner_column).where(board_links.target_column == board_id)
+            ))
+
+        if status is not None:
+            query = query.filter(self.model.status == status)
+
+        if labels_ids:
+            labels = Association(model=self.model, relationship="labels")
+            labels_ids = sorted(set(labels_ids))
+            if labels_match == schema.LabelsMatch.all and len(labels_ids) > 1:
+                links_ids = intersect(*(
+                    select(labels.owner_column).where(labels.target_column == label_id) for label_id in labels_ids
+                ))
+            else:
+                links_ids = select(labels.owner_column).where(labels.target_column.in_(labels_ids))
+            query = query.filter(self.model.id.in_(links_ids))
+
+        return query
+
+    def search(self, query: str, limit: int, cursor: str = None) -> Page:
+        """Full text search over description, url and labels names, best matches first.
+
+        Items are `schema.LinkSearchResult`, snippets highlight matches with <mark>.
+        Paginated by (rank, id) so pages stay consistent while the index is used.
+        """
+        statement = f"""
+            SELECT rowid AS id, rank, snippet({LINKS_SEARCH_TABLE}, -1, '<mark>', '</mark>', '…', 12) AS snippet
+            FROM {LINKS_SEARCH_TABLE}
+            WHERE {LINKS_SEARCH_TABLE} MATCH :match {{after_cursor}}
+            ORDER BY rank, rowid
+            LIMIT :limit
+        """
+        params = {"match": to_match_query(query), "limit": limit + 1}
+        after_cursor = ""
+        if cursor is not None:
+            params["rank"], params["id"] = decode_cursor(cursor, 2)
+            after_cursor = "AND (rank > :rank OR (rank = :rank AND rowid > :id))"
+
+        if not params["match"]:
+            return Page(items=[])
+
+        hits = self.db.execute(text(statement.format(after_cursor=after_cursor)), params).all()
+        next_cursor = None
+        if len(hits) > limit:
+            hits = hits[:limit]
+            next_cursor = encode_cursor([hits[-1].rank, hits[-1].id])
+
+        links = {link.id: link for link in self.filter_by_ids([hit.id for hit in hits])}
+        items = [
+            schema.LinkSearchResult(**schema.Link.from_orm(links[hit.id]).dict(), rank=hit.rank, snippet=hit.snippet)
+            for hit in hits if hit.id in links
+        ]
+        return Page(items=items, next_cursor=next_cursor)
 
-        link.labels.clear()
-        link.labels.extend(labels)
-        return self.save(model=link)
+    def set_labels(self, link_id: int, labels_ids: List[int]) -> LinkOrNone:
+        return self.set_related(model_id=link_id, relationship="labels", ids=labels_ids)
+
+    def add_labels(self, link_id: int, labels_ids: List[int]) -> LinkOrNone:
+        return self.add_related(model_id=link_id, relationship="labels", ids=labels_ids)
+
+    def remove_labels(self, link_id: int, labels_ids: List[int]) -> LinkOrNone:
+        return self.remove_related(model_id=link_id, relationship="labels", ids=labels_ids)
+
+    def get_icon_url(self, link_id: int) -> Union[str, None]:
+        return self.db.execute(select(self.model.icon_url).where(self.model.id == link_id)).scalar()
 
 
 class BoardQueryset(ModelQueryset['models.Board', 'schema.BoardCreate']):
     """Board model queryset allow to extend ModelQueryset with
         methods that only relevant to Board model.
     """
+
+    pagination_keys = ("created_at", "id")
+    orderings = {
+        schema.BoardsSort.created_at: pagination_keys,
+        schema.BoardsSort.links_count: ("-links_count", "-id"),
+        schema.BoardsSort.favorites_count: ("-favorites_count", "-id"),
+    }
+    load_plans = {
+        schema.Board: ("links",),
+    }
     
-    def set_links(self, board_id: int, links: List['models.Link']) -> BoardOrNone:
-        board = self.get(board_id)
-        if board is None:
+    def set_links(self, board_id: int, links_ids: List[int]) -> BoardOrNone:
+        return self.set_related(model_id=board_id, relationship="links", ids=links_ids)
+
+    def add_links(self, board_id: int, links_ids: List[int]) -> BoardOrNone:
+        return self.add_related(model_id=board_id, relationship="links", ids=links_ids)
+
+    def remove_links(self, board_id: int, links_ids: List[int]) -> BoardOrNone:
+        return self.remove_related(model_id=board_id, relationship="links", ids=links_ids)
+
+    def get_view(self, board_id: int, fields: Dict[str, Sequence[str]] = None) -> Union[Dict[str, Any], None]:
+        """Board with its links and their labels, in three queries whatever the board size.
+
+        Labels are listed once and links refer to them by id. `fields` selects the fields
+        of the "board", "links" and "labels" sections, a missing section has all of its fields.
+        """
+        fields = fields or {}
+        board_fields = fields.get("board")
+        board_rows = self.serialized_query(schema.Board, board_fields).filter(self.model.id == board_id).all()
+        if not board_rows:
             return None
 
-        board.links.clear()
-        board.links.extend(links)
-        return self.save(model=board)
+        board_links = Association(model=self.model, relationship="links")
+        links = self.model.links.property.mapper.class_.get_objects_queryset(db=self.db)
+        links_fields = fields.get("links")
+        links_rows = links.apply_filters(
+            links.serialized_query(schema.Link, links_fields, extra_columns=links.pagination_keys),
+            board_id=board_id,
+        ).order_by(*(getattr(links.model, key) for key in links.pagination_keys))
+
+        links_labels = Association(model=links.model, relationship="labels")
+        labels = links.model.labels.property.mapper.class_.get_objects_queryset(db=self.db)
+        labels_fields = fields.get("labels")
+        labels_rows = labels.serialized_query(schema.Label, labels_fields).filter(labels.model.id.in_(
+            select(links_labels.target_column).where(links_labels.owner_column.in_(
+                select(board_links.target_column).where(board_links.owner_column == board_id)
+            ))
+        )).order_by(labels.model.id)
+
+        return {
+            "board": self.serialize_rows(board_rows, schema.Board, board_fields)[0],
+            "links": links.serialize_rows(links_rows, schema.Link, links_fields),
+            "labels": labels.serialize_rows(labels_rows, schema.Label, labels_fields),
+        }
+
+
+class ChangeQueryset(ModelQueryset['models.Change', 'schema.BaseModel']):
+    """Change model queryset, the change log is appended by `db.changes`."""
+
+    def get_since(self, since: int, scopes: List[EntityKey] = None, limit: int = None) -> List[Dict[str, Any]]:
+        """Changes after `since`, of the `scopes` entities when given, as dicts oldest first."""
+        return [
+            dict(row._mapping)
+            for row in self.db.execute(changes.select_changes(self.model.__table__, since, scopes, limit))
+        ]
+
+    def get_first_seq(self) -> Union[int, None]:
+        """Sequence number of the oldest change kept, None when the log is empty."""
+        return self.db.execute(select(func.min(self.model.seq))).scalar()
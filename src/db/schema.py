@@ -1,6 +1,43 @@
-from typing import List
+from typing import Any, Dict, Generic, List, Optional, TypeVar
 from datetime import datetime
+from enum import Enum
 from pydantic import BaseModel, validator, HttpUrl, EmailStr
+from pydantic.generics import GenericModel
+
+T_Item = TypeVar("T_Item")
+
+
+class Page(GenericModel, Generic[T_Item]):
+    items: List[T_Item]
+    next_cursor: str = None
+
+    class Config:
+        orm_mode = True
+
+
+class ItemsByIds(GenericModel, Generic[T_Item]):
+    # In the order of the requested ids, once per id
+    items: List[T_Item]
+    missing_ids: List[int] = []
+
+
+class BulkItemErrors(BaseModel):
+    index: int
+    errors: List[Dict[str, Any]]
+
+
+class BulkCreateResult(BaseModel):
+    created: int
+    # Created ids in the same order as the items, null for items that weren't created
+    ids: List[Optional[int]]
+    errors: List[BulkItemErrors] = []
+
+
+class ImportResult(BaseModel):
+    # Rows imported per section of the stream
+    rows: Dict[str, int]
+    # Imported ids are the exported ids plus the offset of their table
+    id_offsets: Dict[str, int]
 
 
 class TeamBase(BaseModel):
@@ -52,16 +89,23 @@ class User(UserBasicInfo):
 
     @validator("favorite_boards", pre=True)
     def favorite_boards_ids(cls, favorite_boards):
-        return (board.id for board in favorite_boards)
+        return (board if isinstance(board, int) else board.id for board in favorite_boards)
 
     class Config:
         orm_mode = True
 
 
+class AccessToken(BaseModel):
+    access_token: str
+    token_type: str = "bearer"
+    # Seconds
+    expires_in: int
+    user: User
+
+
 class LabelBase(BaseModel):
     name: str
     created_at: datetime
-    created_by_user_id: int
 
 
 class LabelCreate(LabelBase):
@@ -72,17 +116,35 @@ class LabelCreate(LabelBase):
 
 class Label(LabelBase):
     id: int
+    created_by_user_id: int
+    links_count: int = 0
 
     class Config:
         orm_mode = True
 
 
+class LabelsSort(str, Enum):
+    created_at = "created_at"
+    # Largest first
+    links_count = "links_count"
+
+
+class LabelsMatch(str, Enum):
+    all = "all"
+    any = "any"
+
+
+class LinkStatus(str, Enum):
+    unchecked = "unchecked"
+    ok = "ok"
+    broken = "broken"
+
+
 class LinkBase(BaseModel):
     icon_url: HttpUrl
     url: HttpUrl
     description: str
     created_at: datetime
-    created_by_user_id: int
 
 
 class LinkCreate(LinkBase):
@@ -93,22 +155,37 @@ class LinkCreate(LinkBase):
 
 class Link(LinkBase):
     id: int
+    created_by_user_id: int
+    updated_at: datetime = None
+    status: LinkStatus = LinkStatus.unchecked
+    checked_at: datetime = None
     labels: List[int] = []
 
     @validator("labels", pre=True)
     def labels_ids(cls, labels):
-        return (label.id for label in labels)
+        return (label if isinstance(label, int) else label.id for label in labels)
 
     class Config:
         orm_mode = True
 
 
+class LinkSearchResult(Link):
+    rank: float
+    snippet: str
+
+
+class BoardsSort(str, Enum):
+    created_at = "created_at"
+    # Largest first
+    links_count = "links_count"
+    favorites_count = "favorites_count"
+
+
 class BoardBase(BaseModel):
     name: str
     description: str
     created_at: datetime
     updated_at: datetime
-    created_by_user_id: int
 
 
 class BoardCreate(BoardBase):
@@ -119,11 +196,63 @@ class BoardCreate(BoardBase):
 
 class Board(BoardBase):
     id: int
+    created_by_user_id: int
+    links_count: int = 0
+    favorites_count: int = 0
     links: List[int] = []
 
     @validator("links", pre=True)
     def links_ids(cls, links):
-        return (link.id for link in links)
+        return (link if isinstance(link, int) else link.id for link in links)
+
+    class Config:
+        orm_mode = True
+
+
+class BoardView(BaseModel):
+    board: Board
+    links: List[Link]
+    # Labels of all the links, once each
+    labels: List[Label]
+
+
+class BoardSummary(BoardBase):
+    id: int
+    created_by_user_id: int
+    links_count: int
+    favorites_count: int = 0
 
     class Config:
         orm_mode = True
+
+
+class UserHome(BaseModel):
+    user: User
+    main_board: Optional[Board] = None
+    favorite_boards: List[BoardSummary] = []
+
+
+class ChangeAction(str, Enum):
+    created = "created"
+    updated = "updated"
+    deleted = "deleted"
+
+
+class Change(BaseModel):
+    # Increasing sequence number, pass the last one seen as `since`
+    seq: int
+    table_name: str
+    entity_id: int
+    action: ChangeAction
+    # Relationship of the entity whose associations changed
+    relationship_name: str = None
+    created_at: datetime
+
+    class Config:
+        orm_mode = True
+
+
+class ChangesPage(BaseModel):
+    items: List[Change]
+    # `since` of the next changes, the last sequence number of the page or the given `since`
+    last_seq: int
@@ -0,0 +1,81 @@
+from typing import List
+from sqlalchemy import DDL, MetaData, event
+
+LINKS_SEARCH_TABLE = "links_fts"
+
+# Search index over links and their labels names, kept in sync by triggers so every
+# writer, including bulk inserts and association statements, updates it.
+LINK_LABELS_TEXT = """
+    (SELECT coalesce(group_concat(labels.name, ' '), '')
+     FROM labels JOIN links_labels_association ON links_labels_association.lable_id = labels.id
+     WHERE links_labels_association.link_id = {link_id})
+"""
+
+CREATE_LINKS_SEARCH_INDEX: List[str] = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {LINKS_SEARCH_TABLE}
+    USING fts5(description, url, labels, tokenize = 'unicode61')
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS links_fts_after_insert AFTER INSERT ON links BEGIN
+        INSERT INTO {LINKS_SEARCH_TABLE} (rowid, description, url, labels)
+        VALUES (new.id, coalesce(new.description, ''), coalesce(new.url, ''), '');
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS links_fts_after_update AFTER UPDATE OF description, url ON links BEGIN
+        UPDATE {LINKS_SEARCH_TABLE}
+        SET description = coalesce(new.description, ''), url = coalesce(new.url, '')
+        WHERE rowid = new.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS links_fts_after_delete AFTER DELETE ON links BEGIN
+        DELETE FROM {LINKS_SEARCH_TABLE} WHERE rowid = old.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS links_fts_after_label_insert AFTER INSERT ON links_labels_association BEGIN
+        UPDATE {LINKS_SEARCH_TABLE} SET labels = {LINK_LABELS_TEXT.format(link_id="new.link_id")}
+        WHERE rowid = new.link_id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS links_fts_after_label_delete AFTER DELETE ON links_labels_association BEGIN
+        UPDATE {LINKS_SEARCH_TABLE} SET labels = {LINK_LABELS_TEXT.format(link_id="old.link_id")}
+        WHERE rowid = old.link_id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS links_fts_after_label_rename AFTER UPDATE OF name ON labels BEGIN
+        UPDATE {LINKS_SEARCH_TABLE} SET labels = {LINK_LABELS_TEXT.format(link_id=f"{LINKS_SEARCH_TABLE}.rowid")}
+        WHERE rowid IN (SELECT link_id FROM links_labels_association WHERE lable_id = new.id);
+    END
+    """,
+]
+
+REBUILD_LINKS_SEARCH_INDEX: List[str] = [
+    f"DELETE FROM {LINKS_SEARCH_TABLE}",
+    f"""
+    INSERT INTO {LINKS_SEARCH_TABLE} (rowid, description, url, labels)
+    SELECT id, coalesce(description, ''), coalesce(url, ''), {LINK_LABELS_TEXT.format(link_id="links.id")}
+    FROM links
+    """,
+]
+
+DROP_LINKS_SEARCH_INDEX = f"DROP TABLE IF EXISTS {LINKS_SEARCH_TABLE}"
+
+
+def to_match_query(text: str) -> str:
+    """Quote the words of user input as FTS5 strings, the last one also matches as a prefix."""
+    terms = ['"{}"'.format(word.replace('"', '""')) for word in text.split()]
+    if terms:
+        terms[-1] += "*"
+    return " ".join(terms)
+
+
+def install_links_search_index(metadata: MetaData):
+    """Create and drop the search index with the models tables, it's only available on SQLite."""
+    for statement in CREATE_LINKS_SEARCH_INDEX:
+        event.listen(metadata, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+    event.listen(metadata, "before_drop", DDL(DROP_LINKS_SEARCH_INDEX).execute_if(dialect="sqlite"))
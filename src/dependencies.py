@@ -1,9 +1,17 @@
-from typing import Union, List
-from contextlib import contextmanager
-from fastapi import Depends
+from typing import Callable, Dict, List, Optional, Type
+from contextlib import asynccontextmanager, contextmanager
+from fastapi import Depends, HTTPException, Query, Request, Response, Security, status
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from pydantic import BaseModel
 from sqlalchemy.orm import Session
+from auth import ADMIN_USER_IDS, verify_access_token
 from db import base
-from db.models import ModelsManager
+from db.async_manager import AsyncModelsManager, AsyncSessionModelsManager, ThreadpoolModelsManager
+from db.engine import session_limiter
+from db.pagination import DEFAULT_PAGE_LIMIT, MAX_PAGE_LIMIT
+from db.schema import LabelsMatch
+from loaders import Loaders
+from metrics import MetricsRoute
 
 
 @contextmanager
@@ -15,10 +23,184 @@ def db_session() -> Session:
         db.close()
 
 
-def get_models_manager() -> ModelsManager:
-    """Get models manager."""
-    with db_session() as db:
-        yield ModelsManager(db=db)
+@asynccontextmanager
+async def open_models_manager(unit_of_work: bool = False) -> AsyncModelsManager:
+    """Open a models manager for the configured database mode.
+
+    Routes which shouldn't hold a session for the whole request, like ones waiting on
+    other services, use it directly instead of `models_manager_dependency`.
+    """
+    if base.DATABASE_MODE == base.ASYNC_MODE:
+        async with base.AsyncSessionLocal() as db:
+            yield AsyncSessionModelsManager(db=db, unit_of_work=unit_of_work)
+    else:
+        async with session_limiter.slot():
+            with db_session() as db:
+                yield ThreadpoolModelsManager(db=db, unit_of_work=unit_of_work)
+
+
+async def get_models_manager(request: Request) -> AsyncModelsManager:
+    """Get models manager for the configured database mode.
+
+    With request transaction the manager is registered on the request so `UnitOfWorkRoute`
+    commits it. Uncommitted changes are rolled back when the session is closed.
+    """
+    unit_of_work = base.REQUEST_TRANSACTION
+    async with open_models_manager(unit_of_work=unit_of_work) as models_manager:
+        if unit_of_work:
+            request.state.models_manager = models_manager
+        yield models_manager
 
 
 models_manager_dependency = Depends(get_models_manager)
+
+
+async def get_loaders(models_manager: AsyncModelsManager = models_manager_dependency) -> Loaders:
+    """Batch loaders of the request, shared by the route and its dependencies."""
+    return Loaders(models_manager)
+
+
+loaders_dependency = Depends(get_loaders)
+
+# Ids of a multi-get request, they're looked up in chunks so this only bounds the response
+MAX_IDS = 1000
+
+bearer_scheme = HTTPBearer(auto_error=False)
+
+
+async def get_current_user_id(credentials: HTTPAuthorizationCredentials = Security(bearer_scheme)) -> int:
+    """Id of the user of the request access token, verified without a database lookup."""
+    claims = verify_access_token(credentials.credentials) if credentials is not None else None
+    if claims is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return claims.user_id
+
+
+current_user_id_dependency = Depends(get_current_user_id)
+
+
+async def get_admin_user_id(current_user_id: int = current_user_id_dependency) -> int:
+    if current_user_id not in ADMIN_USER_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not allowed"
+        )
+    return current_user_id
+
+
+admin_user_id_dependency = Depends(get_admin_user_id)
+
+
+async def check_own_user(user_id: int, current_user_id: int = current_user_id_dependency):
+    """The `user_id` of the path is the current user, users only change their own settings."""
+    if user_id != current_user_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not allowed"
+        )
+
+
+own_user_dependency = Depends(check_own_user)
+
+
+class UnitOfWorkRoute(MetricsRoute):
+    """Route which commits the request transaction once the response is ready.
+
+    Dependencies exit after the response is sent, so the commit can't be left to
+    `get_models_manager`, a failed commit has to fail the response.
+    """
+
+    def get_route_handler(self) -> Callable:
+        route_handler = super().get_route_handler()
+
+        async def handler(request: Request) -> Response:
+            response = await route_handler(request)
+            models_manager = getattr(request.state, "models_manager", None)
+            if models_manager is not None and response.status_code < 400:
+                await models_manager.commit()
+            return response
+
+        return handler
+
+
+class Pagination:
+    """Keyset pagination query params."""
+
+    def __init__(
+        self,
+        limit: int = Query(DEFAULT_PAGE_LIMIT, ge=1, le=MAX_PAGE_LIMIT),
+        cursor: str = Query(None, description="`next_cursor` of the previous page"),
+    ):
+        self.limit = limit
+        self.cursor = cursor
+
+
+pagination_dependency = Depends(Pagination)
+
+
+def parse_ids(value: str, param_name: str) -> List[int]:
+    """Parse comma separated ids query param."""
+    try:
+        return [int(id) for id in value.split(",") if id.strip()]
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"{param_name} must be comma separated ids"
+        )
+
+
+class LabelsFilter:
+    """Filter links by labels query params."""
+
+    def __init__(
+        self,
+        labels: str = Query(None, description="Comma separated labels ids"),
+        mode: LabelsMatch = Query(LabelsMatch.all, description="Links with all the labels or with any of them"),
+    ):
+        self.labels_ids = parse_ids(labels, "labels") if labels else None
+        self.labels_match = mode
+
+
+labels_filter_dependency = Depends(LabelsFilter)
+
+
+def get_ids(ids: str = Query(None, description=f"Comma separated ids, at most {MAX_IDS}, "
+                                               "the items of these ids instead of a page")) -> Optional[List[int]]:
+    if not ids:
+        return None
+    ids = parse_ids(ids, "ids")
+    if len(ids) > MAX_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"ids must be at most {MAX_IDS} ids"
+        )
+    return ids
+
+
+ids_dependency = Depends(get_ids)
+
+
+def parse_fields(value: str, response_model: Type[BaseModel], param_name: str = "fields") -> Dict[str, List[str]]:
+    """Parse comma separated `section.field` query param of a response made of sections.
+
+    Every section of `response_model` is a model field, the selected fields of a section
+    always include its id.
+    """
+    sections = {name: field.type_ for name, field in response_model.__fields__.items()}
+    selected: Dict[str, List[str]] = {}
+    for item in value.split(","):
+        section, _, field = item.strip().partition(".")
+        if section not in sections or field not in sections[section].__fields__:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"{param_name} must be comma separated fields of {', '.join(sections)}, "
+                       f"like {next(iter(sections))}.id, got {item.strip()!r}"
+            )
+        selected.setdefault(section, ["id"])
+        if field not in selected[section]:
+            selected[section].append(field)
+    return selected
@@ -0,0 +1,169 @@
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import time
+from typing import Dict, NamedTuple, Optional
+import httpx
+from starlette.concurrency import run_in_threadpool
+from public_urls import NonPublicURL, create_public_client, stream_public
+
+ICONS_DIR = os.getenv("LINKTIOUS_ICONS_DIR", os.path.join(tempfile.gettempdir(), "linktious-icons"))
+# Icons fetched at the same time, by every request of the process
+ICONS_MAX_FETCHES = int(os.getenv("LINKTIOUS_ICONS_MAX_FETCHES", "8"))
+ICONS_FETCH_TIMEOUT = float(os.getenv("LINKTIOUS_ICONS_FETCH_TIMEOUT", "5"))
+ICONS_MAX_BYTES = int(os.getenv("LINKTIOUS_ICONS_MAX_BYTES", str(512 * 1024)))
+# Seconds a failed fetch is remembered before the icon is fetched again
+ICONS_FAILURE_TTL = float(os.getenv("LINKTIOUS_ICONS_FAILURE_TTL", "3600"))
+# Cache-Control max-age of served icons
+ICONS_MAX_AGE = int(os.getenv("LINKTIOUS_ICONS_MAX_AGE", str(7 * 24 * 3600)))
+
+
+class IconUnavailable(Exception):
+    """The icon couldn't be fetched, now or within the failure TTL."""
+
+
+class Icon(NamedTuple):
+    digest: str
+    content_type: str
+    path: str
+
+    @property
+    def etag(self) -> str:
+        # The content digest, so links sharing an icon share the ETag
+        return f'"{self.digest}"'
+
+
+class IconStore:
+    """Content addressed disk cache of icons fetched from their URL.
+
+    The content of an icon is stored once under its sha256, whatever the URLs it was
+    fetched from, and every URL has an index entry pointing to the content or recording
+    the fetch failure. Concurrent requests of a URL share one fetch, and fetches are
+    limited per process so a board of new links doesn't open a connection per link.
+    Files are written atomically, workers of a host can share the directory.
+
+    Icon URLs are given by users, they're only fetched, redirects included, from public
+    addresses. The HTTP client can be given, e.g. with a mock transport.
+    """
+
+    def __init__(self, directory: str = ICONS_DIR, max_fetches: int = ICONS_MAX_FETCHES,
+                 timeout: float = ICONS_FETCH_TIMEOUT, max_bytes: int = ICONS_MAX_BYTES,
+                 failure_ttl: float = ICONS_FAILURE_TTL, client: httpx.AsyncClient = None):
+        self.directory = directory
+        self.max_fetches = max_fetches
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.failure_ttl = failure_ttl
+        self._fetches: Dict[str, "asyncio.Future[Icon]"] = {}
+        # Bound to the event loop, created by the first fetch
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._client = client
+
+    async def get(self, url: str) -> Icon:
+        """Get the cached icon of the URL, fetching it when missing."""
+        icon = await run_in_threadpool(self._lookup, url)
+        if icon is not None:
+            return icon
+
+        fetch = self._fetches.get(url)
+        if fetch is None:
+            fetch = self._fetches[url] = asyncio.ensure_future(self._fetch(url))
+            fetch.add_done_callback(lambda _: self._fetches.pop(url, None))
+        # A cancelled request doesn't cancel the fetch shared with the others
+        return await asyncio.shield(fetch)
+
+    def read(self, icon: Icon) -> bytes:
+        with open(icon.path, "rb") as file:
+            return file.read()
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _lookup(self, url: str) -> Optional[Icon]:
+        try:
+            with open(self._index_path(url)) as file:
+                entry = json.load(file)
+        except (OSError, ValueError):
+            return None
+
+        if "error" in entry:
+            if time.time() - entry["failed_at"] < self.failure_ttl:
+                raise IconUnavailable(entry["error"])
+            return None
+
+        icon = Icon(digest=entry["digest"], content_type=entry["content_type"], path=self._content_path(entry["digest"]))
+        # The content may have been pruned, it's fetched again
+        return icon if os.path.exists(icon.path) else None
+
+    async def _fetch(self, url: str) -> Icon:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_fetches)
+        async with self._semaphore:
+            try:
+                content, content_type = await self._download(url)
+            except IconUnavailable as error:
+                await run_in_threadpool(self._store_failure, url, str(error))
+                raise
+        return await run_in_threadpool(self._store, url, content, content_type)
+
+    async def _download(self, url: str):
+        if self._client is None:
+            self._client = create_public_client(timeout=self.timeout)
+
+        try:
+            async with stream_public(self._client, "GET", url) as response:
+                if response.status_code != 200:
+                    raise IconUnavailable(f"Fetching {url} returned {response.status_code}")
+                content_type = response.headers.get("content-type", "").split(";")[0].strip().lower()
+                if not content_type.startswith("image/"):
+                    raise IconUnavailable(f"Fetching {url} returned {content_type or 'no content type'}, not an image")
+
+                content = bytearray()
+                async for chunk in response.aiter_bytes():
+                    content.extend(chunk)
+                    if len(content) > self.max_bytes:
+                        raise IconUnavailable(f"Icon {url} is larger than {self.max_bytes} bytes")
+        except NonPublicURL as error:
+            raise IconUnavailable(str(error)) from error
+        except (httpx.HTTPError, httpx.InvalidURL) as error:
+            raise IconUnavailable(f"Fetching {url} failed: {error!r}") from error
+        return bytes(content), content_type
+
+    def _store(self, url: str, content: bytes, content_type: str) -> Icon:
+        digest = hashlib.sha256(content).hexdigest()
+        icon = Icon(digest=digest, content_type=content_type, path=self._content_path(digest))
+        if not os.path.exists(icon.path):
+            self._write(icon.path, content)
+        self._write(self._index_path(url), json.dumps({
+            "digest": digest, "content_type": content_type, "fetched_at": time.time(),
+        }).encode())
+        return icon
+
+    def _store_failure(self, url: str, error: str):
+        self._write(self._index_path(url), json.dumps({"error": error, "failed_at": time.time()}).encode())
+
+    def _content_path(self, digest: str) -> str:
+        return os.path.join(self.directory, "content", digest[:2], digest)
+
+    def _index_path(self, url: str) -> str:
+        key = hashlib.sha256(url.encode()).hexdigest()
+        return os.path.join(self.directory, "urls", key[:2], f"{key}.json")
+
+    def _write(self, path: str, data: bytes):
+        # Written aside and renamed, readers never see a partial file
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        descriptor, temporary_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(descriptor, "wb") as file:
+                file.write(data)
+            os.replace(temporary_path, path)
+        except BaseException:
+            os.unlink(temporary_path)
+            raise
+
+
+icon_store = IconStore()
@@ -0,0 +1,276 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from collections import defaultdict, deque
+from datetime import datetime, timedelta
+from typing import Deque, Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import urlsplit
+import httpx
+from sqlalchemy import bindparam, select
+from sqlalchemy.engine import Engine
+from starlette.concurrency import run_in_threadpool
+
+from db import changes
+from db.cache import model_cache
+from db.models import Change, Link
+from db.schema import ChangeAction, LinkStatus
+from public_urls import NonPublicURL, create_public_client, stream_public
+
+logger = logging.getLogger(__name__)
+
+# Run the checker in the API process, otherwise it runs with `python src/cli.py check-links`
+LINK_CHECKER_ENABLED = os.getenv("LINKTIOUS_LINK_CHECKER", "0") == "1"
+# Seconds between two checks of a working link
+LINK_CHECK_INTERVAL = float(os.getenv("LINKTIOUS_LINK_CHECK_INTERVAL", str(24 * 3600)))
+LINK_CHECK_CONCURRENCY = int(os.getenv("LINKTIOUS_LINK_CHECK_CONCURRENCY", "50"))
+LINK_CHECK_PER_HOST = int(os.getenv("LINKTIOUS_LINK_CHECK_PER_HOST", "2"))
+LINK_CHECK_TIMEOUT = float(os.getenv("LINKTIOUS_LINK_CHECK_TIMEOUT", "10"))
+# Consecutive failed checks before a link is reported broken, a single failure may be transient
+LINK_CHECK_BROKEN_AFTER = int(os.getenv("LINKTIOUS_LINK_CHECK_BROKEN_AFTER", "2"))
+# Delay before checking a failing link again, doubled on every failure up to the max
+LINK_CHECK_RETRY_DELAY = float(os.getenv("LINKTIOUS_LINK_CHECK_RETRY_DELAY", "600"))
+LINK_CHECK_MAX_RETRY_DELAY = float(os.getenv("LINKTIOUS_LINK_CHECK_MAX_RETRY_DELAY", str(7 * 24 * 3600)))
+
+# Links claimed per query, results are saved in batches of the same size
+BATCH_SIZE = 200
+# Claimed links waiting for their host, in batches, before claiming more
+MAX_QUEUED_BATCHES = 10
+# Claimed links aren't due again for this long, another worker won't check them twice and
+# a worker stopped mid check doesn't lose them
+CLAIM_SECONDS = 900
+# Seconds between saves of the results of a slow batch, and between polls when no link is due
+FLUSH_INTERVAL = 5
+POLL_INTERVAL = 30
+# Check intervals are spread by this fraction, links created together aren't checked together
+JITTER = 0.1
+
+# The server answered for the URL, it only refused to answer us
+ALIVE_STATUS_CODES = {401, 403, 429}
+
+
+class DueLink(NamedTuple):
+    id: int
+    url: str
+    status: str
+    check_failures: int
+
+
+class CheckResult(NamedTuple):
+    alive: bool
+    # None when no response was received
+    status_code: Optional[int]
+
+
+def get_host(url: str) -> str:
+    return (urlsplit(url).hostname or "").lower()
+
+
+def is_alive(status_code: int) -> bool:
+    return status_code < 400 or status_code in ALIVE_STATUS_CODES
+
+
+def claim_due_links(engine: Engine, limit: int, now: datetime = None) -> List[DueLink]:
+    """Links due for a check, oldest due first, pushed back by `CLAIM_SECONDS` until checked."""
+    now = now or datetime.utcnow()
+    links = Link.__table__
+    with engine.begin() as connection:
+        rows = connection.execute(
+            select(links.c.id, links.c.url, links.c.status, links.c.check_failures)
+            .where(links.c.next_check_at <= now)
+            .order_by(links.c.next_check_at)
+            .limit(limit)
+        ).all()
+        if rows:
+            connection.execute(
+                links.update()
+                .where(links.c.id.in_([row.id for row in rows]))
+                # Not a new version of the link
+                .values(next_check_at=now + timedelta(seconds=CLAIM_SECONDS), updated_at=links.c.updated_at)
+            )
+    return [DueLink(*row) for row in rows]
+
+
+def get_next_state(link: DueLink, result: CheckResult, now: datetime, interval: float = LINK_CHECK_INTERVAL,
+                   rng: random.Random = random) -> dict:
+    """Link columns after the check, failing links are retried with an exponential backoff."""
+    if result.alive:
+        failures = 0
+        status = LinkStatus.ok.value
+        delay = interval
+    else:
+        failures = link.check_failures + 1
+        status = LinkStatus.broken.value if failures >= LINK_CHECK_BROKEN_AFTER else link.status
+        delay = min(LINK_CHECK_RETRY_DELAY * 2 ** (failures - 1), LINK_CHECK_MAX_RETRY_DELAY)
+    delay *= rng.uniform(1 - JITTER, 1 + JITTER)
+    return {
+        "link_id": link.id,
+        "status": status,
+        "status_code": result.status_code,
+        "checked_at": now,
+        "check_failures": failures,
+        "next_check_at": now + timedelta(seconds=delay),
+    }
+
+
+def save_results(engine: Engine, results: List[Tuple[DueLink, CheckResult]], interval: float = LINK_CHECK_INTERVAL,
+                 now: datetime = None) -> List[int]:
+    """Save the checks results, returns the ids of the links whose status changed.
+
+    A status change is a new version of the link, other checks don't touch `updated_at`
+    so conditional requests and cached links stay valid.
+    """
+    now = now or datetime.utcnow()
+    changed, unchanged = [], []
+    for link, result in results:
+        state = get_next_state(link, result, now, interval)
+        (changed if state["status"] != link.status else unchanged).append(state)
+
+    links = Link.__table__
+    update = links.update().where(links.c.id == bindparam("link_id"))
+    changed_ids = [state["link_id"] for state in changed]
+    with engine.begin() as connection:
+        if changed:
+            connection.execute(update.values(updated_at=now), changed)
+            changes.record(connection, Change.__table__, (
+                (Link.__tablename__, link_id, None, ChangeAction.updated.value) for link_id in changed_ids
+            ), now)
+        if unchanged:
+            connection.execute(update.values(updated_at=links.c.updated_at), unchanged)
+
+    if changed_ids:
+        changes.change_pubsub.publish()
+    if changed_ids and model_cache.enabled:
+        # Caches of other processes expire with their TTL
+        model_cache.invalidate((Link.__tablename__, link_id) for link_id in changed_ids)
+    return changed_ids
+
+
+class LinkChecker:
+    """Revalidates the links URLs when they're due, see `LINK_CHECK_INTERVAL`.
+
+    Checks run as asyncio tasks limited globally and per host. Links of a host already
+    at its limit wait in a queue of their host rather than as tasks, so a host holding
+    many links doesn't fill the checks in flight and the other hosts keep being checked.
+    A HEAD request is tried first, servers which refuse or mishandle it get a GET whose
+    body isn't read. Database work runs in the threadpool, the event loop only waits on
+    sockets, so the checker can share the API process. Like icons, links are only checked,
+    redirects included, on public addresses, others fail their checks.
+
+    The HTTP client can be given, e.g. with a mock transport or pointed to a stub server.
+    """
+
+    def __init__(self, engine: Engine, client: httpx.AsyncClient = None, concurrency: int = LINK_CHECK_CONCURRENCY,
+                 per_host: int = LINK_CHECK_PER_HOST, interval: float = LINK_CHECK_INTERVAL,
+                 batch_size: int = BATCH_SIZE):
+        self.engine = engine
+        self.client = client or create_public_client(
+            timeout=LINK_CHECK_TIMEOUT, headers={"User-Agent": "linktious-link-checker"}
+        )
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.interval = interval
+        self.batch_size = batch_size
+        # Bound to the event loop, created by the first check
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    async def check(self, url: str) -> CheckResult:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        async with self._semaphore:
+            try:
+                try:
+                    status_code = await self.get_status_code("HEAD", url)
+                except httpx.TransportError:
+                    # Some servers drop HEAD requests, GET tells whether the link works
+                    status_code = None
+                if status_code is None or not is_alive(status_code):
+                    status_code = await self.get_status_code("GET", url)
+            except (httpx.HTTPError, httpx.InvalidURL, NonPublicURL):
+                return CheckResult(alive=False, status_code=None)
+        return CheckResult(alive=is_alive(status_code), status_code=status_code)
+
+    async def get_status_code(self, method: str, url: str) -> int:
+        """Status code of the response, its body isn't read."""
+        async with stream_public(self.client, method, url) as response:
+            return response.status_code
+
+    async def run(self, once: bool = False):
+        """Check due links until cancelled, or until no link is due with `once`.
+
+        Due links are claimed again whenever half of the checks in flight are done, so a
+        slow host doesn't hold back a whole batch.
+        """
+        in_flight: Dict["asyncio.Future[CheckResult]", DueLink] = {}
+        # Checks in flight per host, and the claimed links waiting for their host
+        hosts_in_flight: Dict[str, int] = defaultdict(int)
+        hosts_queues: Dict[str, Deque[DueLink]] = defaultdict(deque)
+        queued = 0
+        results: List[Tuple[DueLink, CheckResult]] = []
+        next_claim = next_flush = time.monotonic()
+
+        def start(link: DueLink, host: str):
+            hosts_in_flight[host] += 1
+            in_flight[asyncio.ensure_future(self.check(link.url))] = link
+
+        try:
+            while True:
+                if (len(in_flight) <= self.batch_size // 2 and queued < self.batch_size * MAX_QUEUED_BATCHES
+                        and time.monotonic() >= next_claim):
+                    claimed = await run_in_threadpool(claim_due_links, self.engine, self.batch_size)
+                    for link in claimed:
+                        host = get_host(link.url)
+                        if hosts_in_flight[host] < self.per_host:
+                            start(link, host)
+                        else:
+                            hosts_queues[host].append(link)
+                            queued += 1
+                    if len(claimed) < self.batch_size:
+                        # Nothing more is due for now
+                        next_claim = float("inf") if once else time.monotonic() + POLL_INTERVAL
+
+                if not in_flight:
+                    await self.flush(results)
+                    if once:
+                        return
+                    await asyncio.sleep(max(0, next_claim - time.monotonic()))
+                    continue
+
+                done, _ = await asyncio.wait(in_flight, timeout=FLUSH_INTERVAL, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    link = in_flight.pop(task)
+                    if task.exception() is not None:
+                        # Checked again once the claim expires
+                        logger.error("Checking link %s failed", link.id, exc_info=task.exception())
+                    else:
+                        results.append((link, task.result()))
+
+                    host = get_host(link.url)
+                    hosts_in_flight[host] -= 1
+                    if hosts_queues[host]:
+                        start(hosts_queues[host].popleft(), host)
+                        queued -= 1
+                    if not hosts_in_flight[host]:
+                        del hosts_in_flight[host], hosts_queues[host]
+
+                if len(results) >= self.batch_size or time.monotonic() >= next_flush:
+                    await self.flush(results)
+                    next_flush = time.monotonic() + FLUSH_INTERVAL
+        finally:
+            for task in in_flight:
+                task.cancel()
+            # Checks already done aren't lost when the checker stops, queued links are
+            # checked once their claim expires
+            await self.flush(results)
+
+    async def flush(self, results: List[Tuple[DueLink, CheckResult]]):
+        if not results:
+            return
+        batch = results[:]
+        results.clear()
+        changed = await run_in_threadpool(save_results, self.engine, batch, self.interval)
+        logger.info("Checked %s links, %s changed status", len(batch), len(changed))
+
+    async def close(self):
+        await self.client.aclose()
@@ -0,0 +1,91 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Type
+
+from db.async_manager import AsyncModelsManager
+from db.schema import BaseModel, Board, Label, Link
+
+# Loads the items of a batch of ids, missing ids are left out
+LoadBatch = Callable[[List[int]], Awaitable[Dict[int, Any]]]
+
+
+class BatchLoader:
+    """Loads items by id for a request, one query for the loads of an event loop iteration.
+
+    Loads are queued and run together once the coroutines which are ready have run, so
+    concurrent lookups of the same table, e.g. gathered nested lookups, collapse into a
+    single `load_batch` call. Every id is loaded once per request, later loads reuse it.
+    """
+
+    def __init__(self, load_batch: LoadBatch, lock: asyncio.Lock):
+        self.load_batch = load_batch
+        # Shared by the loaders of the request, its session runs a query at a time
+        self.lock = lock
+        self._futures: Dict[int, "asyncio.Future[Optional[Any]]"] = {}
+        self._queue: List[int] = []
+        # The loop only keeps weak references to its tasks, a pending batch could be collected
+        self._tasks: Set["asyncio.Task[None]"] = set()
+
+    def load(self, model_id: int) -> "asyncio.Future[Optional[Any]]":
+        """Future of the item of `model_id`, None when it doesn't exist."""
+        future = self._futures.get(model_id)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = self._futures[model_id] = loop.create_future()
+            if not self._queue:
+                loop.call_soon(self._schedule_dispatch)
+            self._queue.append(model_id)
+        return future
+
+    async def load_many(self, ids: Iterable[int]) -> Dict[int, Any]:
+        """Items of `ids` by id, missing ids are left out."""
+        ids = list(ids)
+        items = await asyncio.gather(*(self.load(model_id) for model_id in ids))
+        return {model_id: item for model_id, item in zip(ids, items) if item is not None}
+
+    def _schedule_dispatch(self):
+        task = asyncio.ensure_future(self._dispatch())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _dispatch(self):
+        ids, self._queue = self._queue, []
+        try:
+            async with self.lock:
+                items = await self.load_batch(ids)
+        except BaseException as e:
+            # Cancelled batches included, no load waits forever
+            for model_id in ids:
+                # Failed loads aren't cached, they can be retried
+                future = self._futures.pop(model_id)
+                if future.done():
+                    continue
+                if isinstance(e, asyncio.CancelledError):
+                    future.cancel()
+                else:
+                    future.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
+            return
+        for model_id in ids:
+            future = self._futures[model_id]
+            if not future.done():
+                future.set_result(items.get(model_id))
+
+
+class Loaders:
+    """Batch loaders of a request, items are serialized by the routes response models."""
+
+    def __init__(self, models_manager: AsyncModelsManager):
+        self.models_manager = models_manager
+        self.lock = asyncio.Lock()
+        self.links = self.create_loader("links", Link)
+        self.boards = self.create_loader("boards", Board)
+        self.labels = self.create_loader("labels", Label)
+
+    def create_loader(self, table_name: str, response_model: Type[BaseModel]) -> BatchLoader:
+        queryset = getattr(self.models_manager, table_name)
+
+        async def load_batch(ids: List[int]) -> Dict[int, Any]:
+            return await queryset.get_serialized_by_ids(ids, response_model)
+
+        return BatchLoader(load_batch, self.lock)
@@ -0,0 +1,294 @@
+import asyncio
+import functools
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from fastapi import Request, Response
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Add a Server-Timing header with the request SQL and serialization times
+SERVER_TIMING = os.getenv("LINKTIOUS_SERVER_TIMING", "0") == "1"
+# Statements slower than this many milliseconds are logged, 0 disables the log
+SLOW_QUERY_MS = float(os.getenv("LINKTIOUS_SLOW_QUERY_MS", "200"))
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERIES_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Prometheus histogram with labels, kept in process."""
+
+    def __init__(self, name: str, documentation: str, buckets: Iterable[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        # Labels to cumulative buckets counts, sum and count
+        self._series: Dict[Labels, Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = ([0] * len(self.buckets), [0.0, 0])
+            counts, totals = series
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+            totals[0] += value
+            totals[1] += 1
+
+    def expose(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(labels, list(counts), list(totals)) for labels, (counts, totals) in self._series.items()]
+        for labels, counts, (total, count) in series:
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f"{self.name}_bucket{format_labels(labels + (('le', format_value(bound)),))} {bucket_count}")
+            lines.append(f"{self.name}_bucket{format_labels(labels + (('le', '+Inf'),))} {count}")
+            lines.append(f"{self.name}_sum{format_labels(labels)} {format_value(total)}")
+            lines.append(f"{self.name}_count{format_labels(labels)} {count}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def expose(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = list(self._values.items())
+        lines.extend(f"{self.name}{format_labels(labels)} {format_value(value)}" for labels, value in values)
+        return lines
+
+
+def format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        (name, value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')) for name, value in labels
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+request_duration = Histogram("linktious_request_duration_seconds", "Request latency until the response is sent.")
+request_sql_duration = Histogram("linktious_request_sql_duration_seconds", "Time spent executing SQL per request.")
+request_serialization_duration = Histogram(
+    "linktious_request_serialization_duration_seconds",
+    "Time spent validating and encoding the response per request.",
+)
+request_queries = Histogram("linktious_request_queries", "SQL statements executed per request.", QUERIES_BUCKETS)
+slow_queries = Counter("linktious_slow_queries_total", "SQL statements slower than the slow query threshold.")
+
+METRICS = (request_duration, request_sql_duration, request_serialization_duration, request_queries, slow_queries)
+
+
+class RequestMetrics:
+    """Measurements of the current request, shared with the threads it runs queries on."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.route: Optional[str] = None
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.endpoint_finished: Optional[float] = None
+        self.serialization_seconds = 0.0
+        # Depth of nested `timed_serialization` blocks, only the outermost one counts
+        self.serializing = 0
+
+
+current_request: ContextVar[Optional[RequestMetrics]] = ContextVar("current_request", default=None)
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    metrics = current_request.get()
+    if metrics is not None:
+        metrics.queries += 1
+        metrics.sql_seconds += elapsed
+
+    if SLOW_QUERY_MS and elapsed * 1000 >= SLOW_QUERY_MS:
+        route = metrics.route if metrics is not None else None
+        slow_queries.inc(route=route or "")
+        logger.warning("Slow query %.1fms on %s: %s", elapsed * 1000, route, " ".join(statement.split())[:1000])
+
+
+def handle_error(exception_context):
+    # A failed statement doesn't reach after_cursor_execute
+    started = exception_context.connection.info.get("query_started") if exception_context.connection else None
+    if started:
+        started.pop()
+
+
+def install_sql_hooks(engine: Engine):
+    """Time every statement of the engine, `engine` is the sync engine."""
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+    event.listen(engine, "handle_error", handle_error)
+
+
+def timed_endpoint(endpoint: Callable[..., Any]) -> Callable[..., Any]:
+    """Mark when the endpoint returns, what follows until the response is validation and encoding.
+
+    Sync endpoints get a sync wrapper, FastAPI still runs them in the threadpool.
+    """
+    def mark_finished():
+        metrics = current_request.get()
+        if metrics is not None:
+            metrics.endpoint_finished = time.perf_counter()
+
+    if not asyncio.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        def call_sync(*args, **kwargs):
+            try:
+                return endpoint(*args, **kwargs)
+            finally:
+                mark_finished()
+        return call_sync
+
+    @functools.wraps(endpoint)
+    async def call(*args, **kwargs):
+        try:
+            return await endpoint(*args, **kwargs)
+        finally:
+            mark_finished()
+    return call
+
+
+@contextmanager
+def timed_serialization() -> Iterator[None]:
+    """Count the block as serialization of the current request.
+
+    For serialization done by the endpoint itself, like the `paginate_serialized` rows
+    and the responses encoded with orjson, which `mark_response_ready` can't see.
+    """
+    metrics = current_request.get()
+    if metrics is None:
+        yield
+        return
+
+    metrics.serializing += 1
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.serializing -= 1
+        if not metrics.serializing:
+            metrics.serialization_seconds += time.perf_counter() - started
+
+
+def set_route(route: str):
+    """Called by routes when they start handling the request, to label its metrics and logs."""
+    metrics = current_request.get()
+    if metrics is not None:
+        metrics.route = route
+
+
+def mark_response_ready():
+    """Called by routes once the response is built from the endpoint result."""
+    metrics = current_request.get()
+    if metrics is not None and metrics.endpoint_finished is not None:
+        metrics.serialization_seconds += time.perf_counter() - metrics.endpoint_finished
+
+
+class MetricsRoute(APIRoute):
+    """Route which labels the request metrics with its path and times the response model
+    validation and encoding, what follows the endpoint until the response is ready.
+    """
+
+    def get_route_handler(self) -> Callable:
+        self.dependant.call = timed_endpoint(self.dependant.call)
+        route_handler = super().get_route_handler()
+
+        async def handler(request: Request) -> Response:
+            set_route(self.path)
+            response = await route_handler(request)
+            mark_response_ready()
+            return response
+
+        return handler
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording the request metrics once the response is sent."""
+
+    def __init__(self, app, server_timing: bool = SERVER_TIMING):
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        metrics = RequestMetrics()
+        token = current_request.set(metrics)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start" and self.server_timing:
+                message = dict(message, headers=list(message.get("headers", [])) + [
+                    (b"server-timing", format_server_timing(metrics).encode("latin-1"))
+                ])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_request.reset(token)
+            labels = {"route": metrics.route or get_route_path(scope), "method": scope["method"]}
+            request_duration.observe(time.perf_counter() - metrics.started, **labels)
+            request_sql_duration.observe(metrics.sql_seconds, **labels)
+            request_serialization_duration.observe(metrics.serialization_seconds, **labels)
+            request_queries.observe(metrics.queries, **labels)
+
+
+def get_route_path(scope) -> str:
+    """Path template of the matched route, raw paths would make a series per id."""
+    endpoint = scope.get("endpoint")
+    app = scope.get("app")
+    if endpoint is None or app is None:
+        return "unmatched"
+    for route in app.routes:
+        if getattr(route, "endpoint", None) is endpoint:
+            return route.path
+    return "unmatched"
+
+
+def format_server_timing(metrics: RequestMetrics) -> str:
+    return ", ".join([
+        f'sql;dur={metrics.sql_seconds * 1000:.2f};desc="{metrics.queries} queries"',
+        f"serialize;dur={metrics.serialization_seconds * 1000:.2f}",
+        f"total;dur={(time.perf_counter() - metrics.started) * 1000:.2f}",
+    ])
+
+
+def expose_metrics() -> str:
+    """All the metrics in the Prometheus text format."""
+    return "\n".join(line for metric in METRICS for line in metric.expose()) + "\n"
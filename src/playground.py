@@ -1,13 +1,14 @@
 from db.base import *
-from db import models
+from auth import hash_password
+from db import migrations, models
 
-models.Base.metadata.create_all(bind=engine)
+migrations.migrate(engine)
 ses = SessionLocal()
 
 
 def generate_db():
-    Base.metadata.drop_all(bind=engine)
-    models.Base.metadata.create_all(bind=engine)
+    migrations.drop_schema(engine)
+    migrations.migrate(engine)
 
     def add(*objs):
         ses.add_all(objs)
@@ -19,7 +20,7 @@ def generate_db():
     team1 = models.Team(name="Team Rocket")
     add(team1)
 
-    user1 = models.User(name="Asaf", email="user@email.com", hashed_password="12345678", team_id=team1.id)
+    user1 = models.User(name="Asaf", email="user@email.com", hashed_password=hash_password("12345678"), team_id=team1.id)
     add(user1)
 
     link1 = models.Link(icon_url="https://upload.wikimedia.org/wikipedia/commons/thumb/0/0a/Python.svg/768px-Python.svg.png", url="https://docs.python.org/3/", description="Python Documentation", created_by_user_id=user1.id)
@@ -0,0 +1,122 @@
+import asyncio
+import ipaddress
+import os
+import socket
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, List, Optional
+import httpcore
+import httpx
+from httpcore.backends.auto import AutoBackend
+from httpcore.backends.base import AsyncNetworkBackend, AsyncNetworkStream
+
+# Redirects followed by the server side fetches, every hop is checked
+MAX_REDIRECTS = int(os.getenv("LINKTIOUS_FETCH_MAX_REDIRECTS", "5"))
+
+
+class NonPublicURL(Exception):
+    """The URL isn't fetched by the server: not HTTP, not resolved or resolved to a private address."""
+
+
+def is_public_address(address: str) -> bool:
+    """Whether the address is reachable on the internet, not a private, loopback,
+    link-local (like the 169.254.169.254 metadata service), reserved or multicast one.
+    """
+    ip = ipaddress.ip_address(address.split("%")[0])
+    if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+async def resolve(host: str, port: int) -> List[str]:
+    loop = asyncio.get_running_loop()
+    try:
+        addresses = await loop.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except (socket.gaierror, UnicodeError) as error:
+        raise NonPublicURL(f"Can't resolve {host}: {error}") from error
+    return [sockaddr[0] for _, _, _, _, sockaddr in addresses]
+
+
+async def check_public_url(url: httpx.URL):
+    """Raise `NonPublicURL` unless every address of the URL host is public.
+
+    The host is resolved before the request and again to connect, the DNS answer may
+    change in between: clients of `create_public_client` check the addresses they
+    connect to as well.
+    """
+    if url.scheme not in ("http", "https"):
+        raise NonPublicURL(f"Unsupported URL {url}")
+    if not url.host:
+        raise NonPublicURL(f"No host in URL {url}")
+    for address in await resolve(url.host, url.port or (443 if url.scheme == "https" else 80)):
+        if not is_public_address(address):
+            raise NonPublicURL(f"{url.host} resolves to the non public address {address}")
+
+
+class PublicNetworkBackend(AsyncNetworkBackend):
+    """Network backend connecting to public addresses only.
+
+    The host is resolved here and the connection opened to a vetted address, a DNS
+    answer changed since `check_public_url` (DNS rebinding) can't point the request to
+    a private address. TLS still verifies the certificate of the host name, which is
+    also sent as SNI, and the Host header is the URL's.
+    """
+
+    def __init__(self, backend: Optional[AsyncNetworkBackend] = None):
+        self.backend = backend or AutoBackend()
+
+    async def connect_tcp(self, host: str, port: int, timeout: Optional[float] = None,
+                          local_address: Optional[str] = None) -> AsyncNetworkStream:
+        addresses = await resolve(host, port)
+        for address in addresses:
+            if not is_public_address(address):
+                raise NonPublicURL(f"{host} resolves to the non public address {address}")
+        error = None
+        for address in dict.fromkeys(addresses):
+            try:
+                return await self.backend.connect_tcp(address, port, timeout=timeout, local_address=local_address)
+            except httpcore.ConnectError as connect_error:
+                error = connect_error
+        raise error or httpcore.ConnectError(f"No address for {host}")
+
+    async def connect_unix_socket(self, path: str, timeout: Optional[float] = None) -> AsyncNetworkStream:
+        raise NonPublicURL(f"Unix socket {path}")
+
+    async def sleep(self, seconds: float):
+        await self.backend.sleep(seconds)
+
+
+def create_public_client(**kwargs: Any) -> httpx.AsyncClient:
+    """`httpx.AsyncClient` for the URLs given by users, its connections go to public addresses only."""
+    transport = httpx.AsyncHTTPTransport()
+    # httpx 0.23 doesn't take a network backend, its connection pool does
+    transport._pool._network_backend = PublicNetworkBackend(transport._pool._network_backend)
+    return httpx.AsyncClient(transport=transport, **kwargs)
+
+
+@asynccontextmanager
+async def stream_public(client: httpx.AsyncClient, method: str, url: str,
+                        max_redirects: int = MAX_REDIRECTS) -> AsyncIterator[httpx.Response]:
+    """`client.stream` for a URL given by users, following its redirects to public URLs only.
+
+    The client's own redirects aren't used, the URL of every hop is checked before its
+    request is sent. The client is one of `create_public_client`, unless its transport
+    never connects like the mocks of the tests.
+    """
+    try:
+        request = client.build_request(method, url)
+    except httpx.InvalidURL as error:
+        raise NonPublicURL(f"Invalid URL {url}: {error}") from error
+    for _ in range(max_redirects + 1):
+        await check_public_url(request.url)
+        response = await client.send(request, stream=True, follow_redirects=False)
+        if response.next_request is None:
+            break
+        await response.aclose()
+        request = response.next_request
+    else:
+        raise httpx.TooManyRedirects(f"More than {max_redirects} redirects fetching {url}", request=request)
+
+    try:
+        yield response
+    finally:
+        await response.aclose()
@@ -0,0 +1,67 @@
+import asyncio
+from typing import Any, Dict, List
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from starlette.types import Receive, Scope, Send
+from db.pagination import Page
+from metrics import timed_serialization
+
+
+def json_response(content: Any) -> ORJSONResponse:
+    """Encode already serialized content as is.
+
+    Returning a response skips the route's response model validation, the route still
+    declares it for the OpenAPI schema. The encoding is timed as the request serialization.
+    """
+    with timed_serialization():
+        return ORJSONResponse(content)
+
+
+def page_response(page: Page) -> ORJSONResponse:
+    """Encode a page of `paginate_serialized` items."""
+    return json_response({"items": page.items, "next_cursor": page.next_cursor})
+
+
+def items_by_ids_response(ids: List[int], found: Dict[int, Any]) -> ORJSONResponse:
+    """Encode the `found` items of `ids` in the order of `ids`, deduplicated, and the missing ids."""
+    items, missing_ids = {}, {}
+    for model_id in ids:
+        if model_id in found:
+            items.setdefault(model_id, found[model_id])
+        else:
+            missing_ids.setdefault(model_id)
+    return json_response({"items": list(items.values()), "missing_ids": list(missing_ids)})
+
+
+class DisconnectingStreamingResponse(StreamingResponse):
+    """Streaming response stopped when the client disconnects."""
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        # Starlette's version passes coroutines to `asyncio.wait`, which Python 3.11 refuses
+        tasks = [
+            asyncio.ensure_future(self.stream_response(send)),
+            asyncio.ensure_future(self.listen_for_disconnect(receive)),
+        ]
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in pending:
+            task.cancel()
+        for task in done:
+            task.result()
+        if self.background is not None:
+            await self.background()
+
+
+class NDJSONStreamingResponse(DisconnectingStreamingResponse):
+    """Stream of newline delimited JSON."""
+
+    media_type = "application/x-ndjson"
+
+
+class EventStreamResponse(DisconnectingStreamingResponse):
+    """Server-sent events stream, proxies must not buffer it."""
+
+    media_type = "text/event-stream"
+
+    def __init__(self, content, **kwargs):
+        super().__init__(content, **kwargs)
+        self.headers.setdefault("cache-control", "no-cache")
+        self.headers.setdefault("x-accel-buffering", "no")
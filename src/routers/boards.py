@@ -1,35 +1,139 @@
-from typing import List
-from fastapi import APIRouter, status
-from dependencies import models_manager_dependency
-from db.models import ModelsManager
+from typing import Any, Dict, List, Optional, Union
+from fastapi import APIRouter, HTTPException, Query, Request, Response, status
+from conditional_requests import is_not_modified, make_etag, not_modified_response, set_validators
+from loaders import Loaders
+from responses import items_by_ids_response, json_response, page_response
+from dependencies import (
+    UnitOfWorkRoute,
+    current_user_id_dependency,
+    models_manager_dependency,
+    ids_dependency,
+    loaders_dependency,
+    pagination_dependency,
+    Pagination,
+    labels_filter_dependency,
+    LabelsFilter,
+    parse_fields,
+)
+from db.async_manager import AsyncModelsManager
 from db.schema import (
+    Page as PageSchema,
+    ItemsByIds as ItemsByIdsSchema,
+    BulkCreateResult as BulkCreateResultSchema,
     Board as BoardSchema,
-    BoardCreate as BoardCreateSchema
+    BoardView as BoardViewSchema,
+    Link as LinkSchema,
+    BoardCreate as BoardCreateSchema,
+    BoardsSort,
 )
 
 
 router = APIRouter(
+    route_class=UnitOfWorkRoute,
     prefix="/boards",
     tags=["boards"],
 )
 
 
-@router.get("/", response_model=List[BoardSchema])
-def get_boards(models_manager: ModelsManager = models_manager_dependency):
-    return models_manager.boards.all()
+@router.get("/", response_model=Union[PageSchema[BoardSchema], ItemsByIdsSchema[BoardSchema]])
+async def get_boards(pagination: Pagination = pagination_dependency,
+                     sort: BoardsSort = Query(None, description="Order of the boards, counts are largest first"),
+                     ids: Optional[List[int]] = ids_dependency, loaders: Loaders = loaders_dependency,
+                     models_manager: AsyncModelsManager = models_manager_dependency):
+    if ids is not None:
+        return items_by_ids_response(ids, await loaders.boards.load_many(ids))
+    return page_response(await models_manager.boards.paginate_serialized(
+        BoardSchema, limit=pagination.limit, cursor=pagination.cursor, sort=sort
+    ))
+
+
+@router.get("/{board_id}", response_model=BoardSchema, responses={status.HTTP_304_NOT_MODIFIED: {"description": "Not Modified"}})
+async def get_board(board_id: int, request: Request, response: Response, models_manager: AsyncModelsManager = models_manager_dependency):
+    updated_at = await models_manager.boards.get_version(board_id)
+    if updated_at is not None:
+        etag = make_etag("boards", board_id, updated_at)
+        if is_not_modified(request, etag, updated_at):
+            return not_modified_response(etag, updated_at)
 
+    board = await models_manager.boards.get_serialized(board_id, response_model=BoardSchema)
+    if board is not None:
+        # Validators of the returned version, it may be newer than the one checked above
+        set_validators(response, make_etag("boards", board_id, board["updated_at"]), board["updated_at"])
+    return board
 
-@router.get("/{board_id}", response_model=BoardSchema)
-def get_board(board_id: int, models_manager: ModelsManager = models_manager_dependency):
-    return models_manager.boards.get(board_id)
+
+@router.get("/{board_id}/view", response_model=BoardViewSchema)
+async def get_board_view(
+    board_id: int,
+    fields: str = Query(None, description="Comma separated fields to return, like `board.name,links.url,labels.name`. "
+                                          "Sections without selected fields are returned whole"),
+    models_manager: AsyncModelsManager = models_manager_dependency,
+):
+    selected_fields = parse_fields(fields, BoardViewSchema) if fields else None
+    view = await models_manager.boards.get_view(board_id=board_id, fields=selected_fields)
+    if view is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Not found"
+        )
+    # Selected fields don't validate against the response model, it only documents the full view
+    return json_response(view)
 
 
 @router.post("/", response_model=BoardSchema, status_code=status.HTTP_201_CREATED)
-def create_board(board: BoardCreateSchema, models_manager: ModelsManager = models_manager_dependency):
-    return models_manager.boards.create(model_schema=board)
+async def create_board(board: BoardCreateSchema, current_user_id: int = current_user_id_dependency,
+                       models_manager: AsyncModelsManager = models_manager_dependency):
+    return await models_manager.boards.with_load_plan(BoardSchema).create(model_schema=board, created_by_user_id=current_user_id)
+
+
+@router.post("/bulk", response_model=BulkCreateResultSchema)
+async def bulk_create_boards(boards: List[Dict[str, Any]], current_user_id: int = current_user_id_dependency,
+                             models_manager: AsyncModelsManager = models_manager_dependency):
+    return await models_manager.boards.bulk_create(items=boards, model_schema=BoardCreateSchema,
+                                                   created_by_user_id=current_user_id)
+
+
+@router.post("/{board_id}/set_links", response_model=BoardSchema, dependencies=[current_user_id_dependency])
+async def set_board_links(board_id: int, links_ids: List[int], models_manager: AsyncModelsManager = models_manager_dependency):
+    return await models_manager.boards.with_load_plan(BoardSchema).set_links(board_id=board_id, links_ids=links_ids)
+
+
+@router.post("/{board_id}/links/add", response_model=BoardSchema, dependencies=[current_user_id_dependency])
+async def add_board_links(board_id: int, links_ids: List[int], models_manager: AsyncModelsManager = models_manager_dependency):
+    board = await models_manager.boards.with_load_plan(BoardSchema).add_links(board_id=board_id, links_ids=links_ids)
+    if board is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Not found"
+        )
+    return board
+
+
+@router.post("/{board_id}/links/remove", response_model=BoardSchema, dependencies=[current_user_id_dependency])
+async def remove_board_links(board_id: int, links_ids: List[int], models_manager: AsyncModelsManager = models_manager_dependency):
+    board = await models_manager.boards.with_load_plan(BoardSchema).remove_links(board_id=board_id, links_ids=links_ids)
+    if board is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Not found"
+        )
+    return board
 
 
-@router.post("/{board_id}/set_links", response_model=BoardSchema)
-def set_board_links(board_id: int, links_ids: List[int], models_manager: ModelsManager = models_manager_dependency):
-    links = models_manager.links.filter_by_ids(ids=links_ids)
-    return models_manager.boards.set_links(board_id=board_id, links=links)
+@router.get("/{board_id}/links", response_model=PageSchema[LinkSchema])
+async def get_board_links(board_id: int, pagination: Pagination = pagination_dependency,
+                          labels_filter: LabelsFilter = labels_filter_dependency,
+                          models_manager: AsyncModelsManager = models_manager_dependency):
+    if not await models_manager.boards.exists(board_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Not found"
+        )
+    return page_response(await models_manager.links.paginate_serialized(
+        LinkSchema,
+        limit=pagination.limit,
+        cursor=pagination.cursor,
+        board_id=board_id,
+        labels_ids=labels_filter.labels_ids,
+        labels_match=labels_filter.labels_match,
+    ))
@@ -0,0 +1,106 @@
+import asyncio
+from typing import AsyncIterator, List, Optional
+import orjson
+from fastapi import APIRouter, Header, HTTPException, Query, WebSocket, status
+from change_feed import change_hub, iterate_changes
+from dependencies import UnitOfWorkRoute, models_manager_dependency, open_models_manager
+from responses import EventStreamResponse, json_response
+from db.async_manager import AsyncModelsManager
+from db.cache import EntityKey
+from db.changes import get_scopes
+from db.pagination import DEFAULT_PAGE_LIMIT, MAX_PAGE_LIMIT
+from db.schema import ChangesPage as ChangesPageSchema
+
+
+router = APIRouter(
+    route_class=UnitOfWorkRoute,
+    prefix="/changes",
+    tags=["changes"],
+)
+
+# Changes of the associated entities aren't included, see `select_changes`
+scope_description = "Only the changes of this {}, its associations included, not the changes of the associated {}"
+
+
+async def check_since(models_manager: AsyncModelsManager, since: Optional[int]):
+    """Changes after `since` must still be in the log, otherwise the client has to reload."""
+    if since is None:
+        return
+    first_seq = await models_manager.changes.get_first_seq()
+    if first_seq is not None and since < first_seq - 1:
+        raise HTTPException(
+            status_code=status.HTTP_410_GONE,
+            detail="Changes after this sequence number were pruned, reload and follow the changes from now"
+        )
+
+
+@router.get("/", response_model=ChangesPageSchema, responses={status.HTTP_410_GONE: {"description": "Changes pruned"}})
+async def get_changes(since: int = Query(..., ge=0, description="Last sequence number seen, 0 for every change kept"),
+                      board_id: int = Query(None, description=scope_description.format("board", "links")),
+                      user_id: int = Query(None, description=scope_description.format("user", "boards")),
+                      limit: int = Query(DEFAULT_PAGE_LIMIT, ge=1, le=MAX_PAGE_LIMIT),
+                      models_manager: AsyncModelsManager = models_manager_dependency):
+    await check_since(models_manager, since)
+    items = await models_manager.changes.get_since(since, get_scopes(boards=board_id, users=user_id), limit)
+    return json_response({"items": items, "last_seq": items[-1]["seq"] if items else since})
+
+
+async def format_events(changes: AsyncIterator[Optional[dict]]) -> AsyncIterator[bytes]:
+    # The event id is the sequence number, reconnecting clients send it as Last-Event-ID
+    yield b"retry: 3000\n\n"
+    async for change in changes:
+        if change is None:
+            yield b": keep-alive\n\n"
+        else:
+            yield b"id: %d\nevent: change\ndata: %s\n\n" % (change["seq"], orjson.dumps(change))
+
+
+async def open_changes(scopes: Optional[List[EntityKey]], since: Optional[int]) -> AsyncIterator[Optional[dict]]:
+    # No session is held while the stream is open
+    async with open_models_manager() as models_manager:
+        await check_since(models_manager, since)
+    return iterate_changes(change_hub, scopes, since)
+
+
+@router.get("/stream", response_class=EventStreamResponse,
+            responses={status.HTTP_410_GONE: {"description": "Changes pruned"}})
+async def stream_changes(since: int = Query(None, ge=0, description="Also send the changes after this sequence number"),
+                         board_id: int = Query(None, description=scope_description.format("board", "links")),
+                         user_id: int = Query(None, description=scope_description.format("user", "boards")),
+                         last_event_id: int = Header(None, ge=0)):
+    """Server-sent events of the changes as they're committed, a `change` event per change."""
+    since = last_event_id if last_event_id is not None else since
+    changes = await open_changes(get_scopes(boards=board_id, users=user_id), since)
+    return EventStreamResponse(format_events(changes))
+
+
+# The router prefix isn't applied to websocket routes
+@router.websocket(f"{router.prefix}/ws")
+async def changes_websocket(websocket: WebSocket, since: int = Query(None, ge=0), board_id: int = Query(None),
+                            user_id: int = Query(None)):
+    """The changes of `/changes/stream` as JSON messages."""
+    try:
+        changes = await open_changes(get_scopes(boards=board_id, users=user_id), since)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await websocket.accept()
+
+    async def send_changes():
+        async for change in changes:
+            if change is not None:
+                await websocket.send_text(orjson.dumps(change).decode())
+
+    async def wait_disconnect():
+        # Messages from the client are ignored
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+
+    sending, receiving = asyncio.ensure_future(send_changes()), asyncio.ensure_future(wait_disconnect())
+    await asyncio.wait([sending, receiving], return_when=asyncio.FIRST_COMPLETED)
+    receiving.cancel()
+    sending.cancel()
+    if sending.done() and not sending.cancelled():
+        sending.result()
+        # The subscriber fell behind, it reconnects from its last change
+        await websocket.close()
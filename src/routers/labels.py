@@ -1,29 +1,59 @@
-from typing import List
-from fastapi import APIRouter, status
-from dependencies import models_manager_dependency
-from db.models import ModelsManager
+from typing import Any, Dict, List, Optional, Union
+from fastapi import APIRouter, Query, status
+from dependencies import (
+    UnitOfWorkRoute,
+    current_user_id_dependency,
+    models_manager_dependency,
+    ids_dependency,
+    loaders_dependency,
+    pagination_dependency,
+    Pagination,
+)
+from loaders import Loaders
+from responses import items_by_ids_response, page_response
+from db.async_manager import AsyncModelsManager
 from db.schema import (
+    Page as PageSchema,
+    ItemsByIds as ItemsByIdsSchema,
+    BulkCreateResult as BulkCreateResultSchema,
     Label as LabelSchema,
-    LabelCreate as LabelCreateSchema
+    LabelCreate as LabelCreateSchema,
+    LabelsSort,
 )
 
 
 router = APIRouter(
+    route_class=UnitOfWorkRoute,
     prefix="/labels",
     tags=["labels"],
 )
 
 
-@router.get("/", response_model=List[LabelSchema])
-def get_labels(models_manager: ModelsManager = models_manager_dependency):
-    return models_manager.labels.all()
+@router.get("/", response_model=Union[PageSchema[LabelSchema], ItemsByIdsSchema[LabelSchema]])
+async def get_labels(pagination: Pagination = pagination_dependency,
+                     sort: LabelsSort = Query(None, description="Order of the labels, counts are largest first"),
+                     ids: Optional[List[int]] = ids_dependency, loaders: Loaders = loaders_dependency,
+                     models_manager: AsyncModelsManager = models_manager_dependency):
+    if ids is not None:
+        return items_by_ids_response(ids, await loaders.labels.load_many(ids))
+    return page_response(await models_manager.labels.paginate_serialized(
+        LabelSchema, limit=pagination.limit, cursor=pagination.cursor, sort=sort
+    ))
 
 
 @router.get("/{label_id}", response_model=LabelSchema)
-def get_label(label_id: int, models_manager: ModelsManager = models_manager_dependency):
-    return models_manager.labels.get(label_id)
+async def get_label(label_id: int, models_manager: AsyncModelsManager = models_manager_dependency):
+    return await models_manager.labels.get(label_id)
 
 
 @router.post("/", response_model=LabelSchema, status_code=status.HTTP_201_CREATED)
-def create_label(label: LabelCreateSchema, models_manager: ModelsManager = models_manager_dependency):
-    return models_manager.labels.create(model_schema=label)
+async def create_label(label: LabelCreateSchema, current_user_id: int = current_user_id_dependency,
+                       models_manager: AsyncModelsManager = models_manager_dependency):
+    return await models_manager.labels.create(model_schema=label, created_by_user_id=current_user_id)
+
+
+@router.post("/bulk", response_model=BulkCreateResultSchema)
+async def bulk_create_labels(labels: List[Dict[str, Any]], current_user_id: int = current_user_id_dependency,
+                             models_manager: AsyncModelsManager = models_manager_dependency):
+    return await models_manager.labels.bulk_create(items=labels, model_schema=LabelCreateSchema,
+                                                   created_by_user_id=current_user_id)
@@ -1,35 +1,153 @@
-from typing import List
-from fastapi import APIRouter, status
-from dependencies import models_manager_dependency
+from typing import Any, Dict, List, Optional, Union
+from fastapi import APIRouter, HTTPException, Query, Request, Response, status
+from starlette.concurrency import run_in_threadpool
+from conditional_requests import etag_matches, is_not_modified, make_etag, not_modified_response, set_validators
+from icons import ICONS_MAX_AGE, IconUnavailable, icon_store
+from loaders import Loaders
+from responses import items_by_ids_response, page_response
+from dependencies import (
+    UnitOfWorkRoute,
+    current_user_id_dependency,
+    models_manager_dependency,
+    ids_dependency,
+    loaders_dependency,
+    open_models_manager,
+    pagination_dependency,
+    Pagination,
+    labels_filter_dependency,
+    LabelsFilter,
+)
 from db.schema import (
+    Page as PageSchema,
+    ItemsByIds as ItemsByIdsSchema,
+    BulkCreateResult as BulkCreateResultSchema,
     Link as LinkSchema,
-    LinkCreate as LinkCreateSchema
+    LinkSearchResult as LinkSearchResultSchema,
+    LinkCreate as LinkCreateSchema,
+    LinkStatus,
 )
-from db.models import ModelsManager
+from db.async_manager import AsyncModelsManager
 
 
 router = APIRouter(
+    route_class=UnitOfWorkRoute,
     prefix="/links",
     tags=["links"],
 )
 
 
-@router.get("/", response_model=List[LinkSchema])
-def get_links(models_manager: ModelsManager = models_manager_dependency):
-    return models_manager.links.all()
+@router.get("/", response_model=Union[PageSchema[LinkSchema], ItemsByIdsSchema[LinkSchema]])
+async def get_links(pagination: Pagination = pagination_dependency, labels_filter: LabelsFilter = labels_filter_dependency,
+                    link_status: LinkStatus = Query(None, alias="status", description="Links with this check status"),
+                    ids: Optional[List[int]] = ids_dependency, loaders: Loaders = loaders_dependency,
+                    models_manager: AsyncModelsManager = models_manager_dependency):
+    if ids is not None:
+        return items_by_ids_response(ids, await loaders.links.load_many(ids))
+    return page_response(await models_manager.links.paginate_serialized(
+        LinkSchema,
+        limit=pagination.limit,
+        cursor=pagination.cursor,
+        labels_ids=labels_filter.labels_ids,
+        labels_match=labels_filter.labels_match,
+        status=link_status,
+    ))
+
+
+@router.get("/search", response_model=PageSchema[LinkSearchResultSchema])
+async def search_links(q: str = Query(..., min_length=1), pagination: Pagination = pagination_dependency,
+                       models_manager: AsyncModelsManager = models_manager_dependency):
+    return await models_manager.links.with_load_plan(LinkSchema).search(query=q, limit=pagination.limit, cursor=pagination.cursor)
+
 
+@router.get("/{link_id}", response_model=LinkSchema, responses={status.HTTP_304_NOT_MODIFIED: {"description": "Not Modified"}})
+async def get_link(link_id: int, request: Request, response: Response, models_manager: AsyncModelsManager = models_manager_dependency):
+    updated_at = await models_manager.links.get_version(link_id)
+    if updated_at is not None:
+        etag = make_etag("links", link_id, updated_at)
+        if is_not_modified(request, etag, updated_at):
+            return not_modified_response(etag, updated_at)
+
+    link = await models_manager.links.get_serialized(link_id, response_model=LinkSchema)
+    if link is not None:
+        # Validators of the returned version, it may be newer than the one checked above
+        set_validators(response, make_etag("links", link_id, link["updated_at"]), link["updated_at"])
+    return link
+
+
+@router.get(
+    "/{link_id}/icon",
+    response_class=Response,
+    responses={
+        status.HTTP_200_OK: {"content": {"image/*": {}}, "description": "The link icon"},
+        status.HTTP_304_NOT_MODIFIED: {"description": "Not Modified"},
+    },
+)
+async def get_link_icon(link_id: int, request: Request):
+    # The session is released before fetching the icon, which can take seconds
+    async with open_models_manager() as models_manager:
+        icon_url = await models_manager.links.get_icon_url(link_id)
+    if icon_url is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Not found"
+        )
 
-@router.get("/{link_id}", response_model=LinkSchema)
-def get_link(link_id: int, models_manager: ModelsManager = models_manager_dependency):
-    return models_manager.links.get(link_id)
+    try:
+        icon = await icon_store.get(icon_url)
+    except IconUnavailable:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Icon not available"
+        )
+
+    headers = {
+        "ETag": icon.etag,
+        "Cache-Control": f"public, max-age={ICONS_MAX_AGE}",
+        # Icons are third party content, SVGs mustn't run scripts on our origin
+        "Content-Security-Policy": "default-src 'none'; style-src 'unsafe-inline'; sandbox",
+        "X-Content-Type-Options": "nosniff",
+    }
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None and etag_matches(if_none_match, icon.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=await run_in_threadpool(icon_store.read, icon), media_type=icon.content_type, headers=headers)
 
 
 @router.post("/", response_model=LinkSchema, status_code=status.HTTP_201_CREATED)
-def create_link(link: LinkCreateSchema, models_manager: ModelsManager = models_manager_dependency):
-    return models_manager.links.create(model_schema=link)
+async def create_link(link: LinkCreateSchema, current_user_id: int = current_user_id_dependency,
+                      models_manager: AsyncModelsManager = models_manager_dependency):
+    return await models_manager.links.with_load_plan(LinkSchema).create(model_schema=link, created_by_user_id=current_user_id)
+
+
+@router.post("/bulk", response_model=BulkCreateResultSchema)
+async def bulk_create_links(links: List[Dict[str, Any]], current_user_id: int = current_user_id_dependency,
+                            models_manager: AsyncModelsManager = models_manager_dependency):
+    return await models_manager.links.bulk_create(items=links, model_schema=LinkCreateSchema,
+                                                  created_by_user_id=current_user_id)
+
+
+@router.post("/{link_id}/set_labels", response_model=LinkSchema, dependencies=[current_user_id_dependency])
+async def set_link_labels(link_id: int, labels_ids: List[int], models_manager: AsyncModelsManager = models_manager_dependency):
+    return await models_manager.links.with_load_plan(LinkSchema).set_labels(link_id=link_id, labels_ids=labels_ids)
+
+
+@router.post("/{link_id}/labels/add", response_model=LinkSchema, dependencies=[current_user_id_dependency])
+async def add_link_labels(link_id: int, labels_ids: List[int], models_manager: AsyncModelsManager = models_manager_dependency):
+    link = await models_manager.links.with_load_plan(LinkSchema).add_labels(link_id=link_id, labels_ids=labels_ids)
+    if link is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Not found"
+        )
+    return link
 
 
-@router.post("/{link_id}/set_labels", response_model=LinkSchema)
-def set_link_labels(link_id: int, labels_ids: List[int], models_manager: ModelsManager = models_manager_dependency):
-    labels = models_manager.labels.filter_by_ids(ids=labels_ids)
-    return models_manager.links.set_labels(link_id=link_id, labels=labels)
+@router.post("/{link_id}/labels/remove", response_model=LinkSchema, dependencies=[current_user_id_dependency])
+async def remove_link_labels(link_id: int, labels_ids: List[int], models_manager: AsyncModelsManager = models_manager_dependency):
+    link = await models_manager.links.with_load_plan(LinkSchema).remove_labels(link_id=link_id, labels_ids=labels_ids)
+    if link is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Not found"
+        )
+    return link
@@ -1,25 +1,29 @@
-from typing import List
 from fastapi import APIRouter, status
 
-from dependencies import models_manager_dependency
+from dependencies import UnitOfWorkRoute, current_user_id_dependency, models_manager_dependency, pagination_dependency, Pagination
+from responses import page_response
 from db.schema import (
+    Page as PageSchema,
     Team as TeamSchema,
     TeamCreate as TeamCreateSchema
 )
-from db.models import ModelsManager
+from db.async_manager import AsyncModelsManager
 
 
 router = APIRouter(
+    route_class=UnitOfWorkRoute,
     prefix="/teams",
     tags=["teams"],
 )
 
 
-@router.get("/", response_model=List[TeamSchema])
-def get_team(models_manager: ModelsManager = models_manager_dependency):
-    return models_manager.teams.all()
+@router.get("/", response_model=PageSchema[TeamSchema])
+async def get_team(pagination: Pagination = pagination_dependency, models_manager: AsyncModelsManager = models_manager_dependency):
+    return page_response(await models_manager.teams.paginate_serialized(
+        TeamSchema, limit=pagination.limit, cursor=pagination.cursor
+    ))
 
 
-@router.post("/", response_model=TeamSchema, status_code=status.HTTP_201_CREATED)
-def create_team(team: TeamCreateSchema, models_manager: ModelsManager = models_manager_dependency):
-    return models_manager.teams.create(model_schema=team)
+@router.post("/", response_model=TeamSchema, status_code=status.HTTP_201_CREATED, dependencies=[current_user_id_dependency])
+async def create_team(team: TeamCreateSchema, models_manager: AsyncModelsManager = models_manager_dependency):
+    return await models_manager.teams.create(model_schema=team)
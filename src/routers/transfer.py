@@ -0,0 +1,56 @@
+from typing import AsyncIterator, List
+from fastapi import APIRouter, HTTPException, Request, status
+from starlette.concurrency import run_in_threadpool
+from dependencies import UnitOfWorkRoute, admin_user_id_dependency
+from responses import NDJSONStreamingResponse
+from transfer import IMPORT_BATCH_SIZE, ImportConflict, Importer, InvalidImport, export_database
+from db import base, models
+from db.schema import ImportResult as ImportResultSchema
+
+
+router = APIRouter(
+    route_class=UnitOfWorkRoute,
+    tags=["transfer"],
+)
+
+
+async def read_lines(request: Request, batch_size: int) -> AsyncIterator[List[bytes]]:
+    """Lines of the request body as it's received, `batch_size` lines at a time."""
+    pending = b""
+    lines: List[bytes] = []
+    async for chunk in request.stream():
+        *complete, pending = (pending + chunk).split(b"\n")
+        lines.extend(complete)
+        if len(lines) >= batch_size:
+            yield lines
+            lines = []
+    if pending:
+        lines.append(pending)
+    if lines:
+        yield lines
+
+
+@router.get("/export", response_class=NDJSONStreamingResponse)
+async def export(admin_user_id: int = admin_user_id_dependency):
+    """Every team, user, label, link, board and association as NDJSON, streamed from a snapshot."""
+    return NDJSONStreamingResponse(
+        export_database(base.engine, models.Base.metadata),
+        headers={"Content-Disposition": 'attachment; filename="linktious.ndjson"'},
+    )
+
+
+@router.post("/import", response_model=ImportResultSchema,
+             responses={status.HTTP_409_CONFLICT: {"description": "Rows conflict with existing rows"}})
+async def import_(request: Request, admin_user_id: int = admin_user_id_dependency):
+    """Import an `/export` stream as new rows, with new ids. Nothing is imported when a line fails."""
+    importer = Importer(base.engine, models.Base.metadata)
+    try:
+        async for lines in read_lines(request, IMPORT_BATCH_SIZE):
+            await run_in_threadpool(importer.feed, lines)
+        return await run_in_threadpool(importer.commit)
+    except ImportConflict as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    except InvalidImport as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    finally:
+        await run_in_threadpool(importer.close)
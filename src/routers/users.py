@@ -1,35 +1,61 @@
 from typing import List
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, HTTPException, Response, status
 
-from dependencies import models_manager_dependency
+from auth import ACCESS_TOKEN_TTL, create_access_token, hash_password_async, needs_rehash, verify_password_async
+from dependencies import (
+    UnitOfWorkRoute, models_manager_dependency, open_models_manager, own_user_dependency, pagination_dependency, Pagination,
+)
+from responses import page_response
 from db.schema import (
+    Page as PageSchema,
+    AccessToken as AccessTokenSchema,
     User as UserSchema,
     UserLogin as UserLoginSchema,
     UserBasicInfo as UserBasicInfoSchema,
+    UserHome as UserHomeSchema,
 )
-from db.models import ModelsManager
+from db.async_manager import AsyncModelsManager
 
 
 router = APIRouter(
+    route_class=UnitOfWorkRoute,
     prefix="/users",
     tags=["users"],
 )
 
 
-@router.post("/login", response_model=UserSchema, responses={status.HTTP_401_UNAUTHORIZED: {"description": "Bad credentials"}})
-def login(user: UserLoginSchema, models_manager: ModelsManager = models_manager_dependency):
-    user = models_manager.users.authentication(email=user.email, password=user.password)
-    if user is None:
+@router.post("/login", response_model=AccessTokenSchema, responses={status.HTTP_401_UNAUTHORIZED: {"description": "Bad credentials"}})
+async def login(credentials: UserLoginSchema):
+    # No session is held while the password is hashed, it takes tens of milliseconds
+    async with open_models_manager() as models_manager:
+        user = await models_manager.users.get_credentials(email=credentials.email)
+    verified = await verify_password_async(credentials.password, user.hashed_password if user else None)
+    if not verified or not user.is_active:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Bad credentials"
         )
-    return user
+
+    async with open_models_manager() as models_manager:
+        if needs_rehash(user.hashed_password):
+            await models_manager.users.set_password_hash(user.id, await hash_password_async(credentials.password))
+        return {
+            "access_token": create_access_token(user.id),
+            "expires_in": ACCESS_TOKEN_TTL,
+            "user": await models_manager.users.get_serialized(user.id, response_model=UserSchema),
+        }
+
+
+@router.get("/", response_model=PageSchema[UserSchema])
+async def get_users(pagination: Pagination = pagination_dependency, models_manager: AsyncModelsManager = models_manager_dependency):
+    return page_response(await models_manager.users.paginate_serialized(
+        UserSchema, limit=pagination.limit, cursor=pagination.cursor
+    ))
 
 
 @router.get("/{user_id}", response_model=UserBasicInfoSchema)
-def get_user_basic_info_by_id(user_id: int, models_manager: ModelsManager = models_manager_dependency):
-    user = models_manager.users.get(user_id)
+async def get_user_basic_info_by_id(user_id: int, models_manager: AsyncModelsManager = models_manager_dependency):
+    user = await models_manager.users.get_serialized(user_id, response_model=UserBasicInfoSchema)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -38,9 +64,21 @@ def get_user_basic_info_by_id(user_id: int, models_manager: ModelsManager = mode
     return user
 
 
-@router.put("/{user_id}/set_main_board", response_model=UserSchema)
-def set_user_main_board(user_id: int, board_id: int, models_manager: ModelsManager = models_manager_dependency):
-    user = models_manager.users.set_main_board(user_id=user_id, board_id=board_id)
+@router.get("/{user_id}/home", response_model=UserHomeSchema)
+async def get_user_home(user_id: int, models_manager: AsyncModelsManager = models_manager_dependency):
+    home = await models_manager.users.get_home(user_id)
+    if home is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Not found"
+        )
+    # Cached already serialized by the response model
+    return Response(content=home, media_type="application/json")
+
+
+@router.put("/{user_id}/set_main_board", response_model=UserSchema, dependencies=[own_user_dependency])
+async def set_user_main_board(user_id: int, board_id: int, models_manager: AsyncModelsManager = models_manager_dependency):
+    user = await models_manager.users.with_load_plan(UserSchema).set_main_board(user_id=user_id, board_id=board_id)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -49,13 +87,34 @@ def set_user_main_board(user_id: int, board_id: int, models_manager: ModelsManag
     return user
 
 
-@router.put("/{user_id}/set_favorite_boards", response_model=UserSchema)
-def set_user_favorite_boards(user_id: int, boards_ids: List[int], models_manager: ModelsManager = models_manager_dependency):
-    boards = models_manager.boards.filter_by_ids(ids=boards_ids)
-    user = models_manager.users.set_favorite_boards(user_id=user_id, boards=boards)
+@router.put("/{user_id}/set_favorite_boards", response_model=UserSchema, dependencies=[own_user_dependency])
+async def set_user_favorite_boards(user_id: int, boards_ids: List[int], models_manager: AsyncModelsManager = models_manager_dependency):
+    user = await models_manager.users.with_load_plan(UserSchema).set_favorite_boards(user_id=user_id, boards_ids=boards_ids)
     if user is None:
         raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Not found"
         )
     return user
+
+
+@router.post("/{user_id}/favorite_boards/add", response_model=UserSchema, dependencies=[own_user_dependency])
+async def add_user_favorite_boards(user_id: int, boards_ids: List[int], models_manager: AsyncModelsManager = models_manager_dependency):
+    user = await models_manager.users.with_load_plan(UserSchema).add_favorite_boards(user_id=user_id, boards_ids=boards_ids)
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Not found"
+        )
+    return user
+
+
+@router.post("/{user_id}/favorite_boards/remove", response_model=UserSchema, dependencies=[own_user_dependency])
+async def remove_user_favorite_boards(user_id: int, boards_ids: List[int], models_manager: AsyncModelsManager = models_manager_dependency):
+    user = await models_manager.users.with_load_plan(UserSchema).remove_favorite_boards(user_id=user_id, boards_ids=boards_ids)
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Not found"
+        )
+    return user
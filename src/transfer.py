@@ -0,0 +1,231 @@
+import os
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional
+import orjson
+from sqlalchemy import DateTime, MetaData, Table, bindparam, exc, func, select
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.sql import Select
+from db import changes
+from db.schema import ChangeAction
+
+# Rows fetched from the database cursor at a time while exporting
+EXPORT_BATCH_SIZE = int(os.getenv("LINKTIOUS_EXPORT_BATCH_SIZE", "1000"))
+# Rows inserted per statement while importing
+IMPORT_BATCH_SIZE = int(os.getenv("LINKTIOUS_IMPORT_BATCH_SIZE", "1000"))
+
+# Table of the change log, imported rows are logged as created
+CHANGES_TABLE = "changes"
+# Users are exported before the boards their main board refers to, main boards are a
+# section of their own once the boards exist
+USER_MAIN_BOARDS = "user_main_boards"
+
+
+class InvalidImport(Exception):
+    """A line of the import can't be imported, nothing of the import is kept."""
+
+    def __init__(self, line_number: int, message: str):
+        super().__init__(f"Line {line_number}: {message}")
+        self.line_number = line_number
+
+
+class ImportConflict(InvalidImport):
+    """Rows of the import conflict with existing rows, e.g. a label name already taken."""
+
+
+class Section(NamedTuple):
+    """Rows of a table in the stream, every line is `{"table": name, column: value, ...}`."""
+    name: str
+    table: Table
+    columns: List[str]
+    # Rows of the section update existing rows by id rather than inserting new ones
+    update: bool = False
+
+    def get_query(self) -> Select:
+        return select(*(self.table.c[column] for column in self.columns)).order_by(*self.table.primary_key.columns)
+
+
+def get_sections(metadata: MetaData) -> List[Section]:
+    """Exported tables, in the order they're imported: referenced rows come first."""
+    tables = metadata.tables
+
+    def section(name: str, exclude: Iterable[str] = ()) -> Section:
+        return Section(name, tables[name], [column.name for column in tables[name].c if column.name not in exclude])
+
+    users = tables["users"]
+    return [
+        section("teams"),
+        section("users", exclude=["main_board_id"]),
+        section("labels"),
+        section("links"),
+        section("boards"),
+        section("links_labels_association"),
+        section("boards_links_association"),
+        section("users_favorite_boards_association"),
+        Section(USER_MAIN_BOARDS, users, ["id", "main_board_id"], update=True),
+    ]
+
+
+def export_lines(connection: Connection, metadata: MetaData, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[bytes]:
+    """NDJSON of every section, one chunk per batch of rows.
+
+    Rows are streamed from a server side cursor `batch_size` at a time, memory doesn't
+    grow with the tables. Run in a transaction so the sections are a consistent snapshot.
+    """
+    for section in get_sections(metadata):
+        query = section.get_query()
+        if section.name == USER_MAIN_BOARDS:
+            query = query.where(section.table.c.main_board_id.isnot(None))
+        result = connection.execution_options(stream_results=True).execute(query).yield_per(batch_size)
+        for rows in result.partitions():
+            yield b"".join(orjson.dumps({"table": section.name, **row._mapping}) + b"\n" for row in rows)
+
+
+def export_database(engine: Engine, metadata: MetaData, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[bytes]:
+    with engine.connect() as connection:
+        if connection.dialect.name != "sqlite":
+            # Read committed would see the rows committed between two sections
+            connection = connection.execution_options(isolation_level="REPEATABLE READ")
+        with connection.begin():
+            if connection.dialect.name == "sqlite":
+                # pysqlite only begins a transaction before writes, each SELECT would read
+                # the latest commit. The snapshot is taken by the first SELECT, writers go
+                # on meanwhile in WAL mode.
+                connection.exec_driver_sql("BEGIN")
+            yield from export_lines(connection, metadata, batch_size)
+
+
+class Importer:
+    """Inserts NDJSON lines of `export_lines` as new rows, in a single transaction.
+
+    Ids are remapped by an offset per table, the largest id of the table when the import
+    starts: an imported row gets its exported id plus the offset and references are
+    shifted by the offset of the referenced table. Remapping needs no lookup table, memory
+    only holds the current batch however large the import is.
+
+    Consecutive lines of a section are inserted `batch_size` at a time. Nothing is
+    committed before `commit`, a failed import leaves the database untouched. On SQLite
+    the import holds the write lock until then.
+
+    The import bypasses the session, so like `link_checker.save_results` it appends the
+    creation of every imported entity to the change log itself, batch by batch in the
+    import transaction, and notifies the change feed once committed. The model cache
+    needs no invalidation: imported rows are new and only refer to each other, no
+    cached entry was built from them.
+    """
+
+    def __init__(self, engine: Engine, metadata: MetaData, batch_size: int = IMPORT_BATCH_SIZE):
+        self.engine = engine
+        self.sections = {section.name: section for section in get_sections(metadata)}
+        self.changes_table = metadata.tables[CHANGES_TABLE]
+        self.batch_size = batch_size
+        self.id_offsets: Dict[str, int] = {}
+        self.counts: Dict[str, int] = {name: 0 for name in self.sections}
+        self.line_number = 0
+        self._connection: Optional[Connection] = None
+        self._transaction = None
+        self._converters: Dict[str, Dict[str, Callable[[Any], Any]]] = {}
+        self._batch: List[Dict[str, Any]] = []
+        self._batch_section: Optional[Section] = None
+        self._batch_line_number = 0
+
+    def feed(self, lines: Iterable[bytes]):
+        """Import lines, the end of the batch is kept until more lines or `commit`."""
+        if self._connection is None:
+            self._begin()
+        for line in lines:
+            self.line_number += 1
+            if not line.strip():
+                continue
+            try:
+                row = orjson.loads(line)
+            except orjson.JSONDecodeError as e:
+                raise InvalidImport(self.line_number, f"invalid JSON: {e}") from e
+            if not isinstance(row, dict) or row.get("table") not in self.sections:
+                raise InvalidImport(self.line_number, "expected an object with a known `table`")
+            section = self.sections[row.pop("table")]
+
+            if section is not self._batch_section or len(self._batch) >= self.batch_size:
+                self._flush()
+                self._batch_section = section
+                self._batch_line_number = self.line_number
+            self._batch.append(self._convert(section, row))
+
+    def commit(self) -> Dict[str, Any]:
+        """Insert the last batch and commit, returns the rows imported per section and the id offsets."""
+        if self._connection is None:
+            self._begin()
+        self._flush()
+        self._transaction.commit()
+        if any(self.counts.values()):
+            changes.change_pubsub.publish()
+        return {"rows": self.counts, "id_offsets": self.id_offsets}
+
+    def close(self):
+        """Release the connection, rolling back an import that wasn't committed."""
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def _begin(self):
+        self._connection = self.engine.connect()
+        self._transaction = self._connection.begin()
+        for section in self.sections.values():
+            table = section.table
+            if not section.update and "id" in table.c and table.name not in self.id_offsets:
+                self.id_offsets[table.name] = self._connection.execute(
+                    select(func.coalesce(func.max(table.c.id), 0))
+                ).scalar()
+
+    def _convert(self, section: Section, row: Dict[str, Any]) -> Dict[str, Any]:
+        if row.keys() != set(section.columns):
+            missing, unknown = set(section.columns) - row.keys(), row.keys() - set(section.columns)
+            raise InvalidImport(self.line_number, f"{section.name} columns don't match, "
+                                                  f"missing: {sorted(missing)}, unknown: {sorted(unknown)}")
+        converters = self._get_converters(section)
+        try:
+            return {
+                # Bound parameters of the update can't be named like the updated columns
+                f"_{column}" if section.update else column:
+                    converters[column](value) if value is not None and column in converters else value
+                for column, value in row.items()
+            }
+        except (TypeError, ValueError) as e:
+            raise InvalidImport(self.line_number, f"invalid {section.name} value: {e}") from e
+
+    def _get_converters(self, section: Section) -> Dict[str, Callable[[Any], Any]]:
+        converters = self._converters.get(section.name)
+        if converters is None:
+            converters = self._converters[section.name] = {}
+            for column_name in section.columns:
+                column = section.table.c[column_name]
+                referenced = [foreign_key.column.table.name for foreign_key in column.foreign_keys]
+                offset_table = referenced[0] if referenced else section.table.name if column.primary_key else None
+                if offset_table is not None:
+                    offset = self.id_offsets[offset_table]
+                    converters[column_name] = lambda value, offset=offset: int(value) + offset
+                elif isinstance(column.type, DateTime):
+                    converters[column_name] = datetime.fromisoformat
+        return converters
+
+    def _flush(self):
+        section, rows = self._batch_section, self._batch
+        if not rows:
+            return
+        if section.update:
+            table = section.table
+            statement = table.update().where(table.c.id == bindparam("_id")).values({
+                column: bindparam(f"_{column}") for column in section.columns if column != "id"
+            })
+        else:
+            statement = section.table.insert()
+        try:
+            self._connection.execute(statement, rows)
+        except exc.IntegrityError as e:
+            raise ImportConflict(self._batch_line_number, f"{section.name} rows conflict: {e.orig}") from e
+        if not section.update and "id" in section.table.c:
+            # Associations and main boards are of entities created by the import already
+            changes.record(self._connection, self.changes_table, (
+                (section.table.name, row["id"], None, ChangeAction.created.value) for row in rows
+            ))
+        self.counts[section.name] += len(rows)
+        self._batch = []
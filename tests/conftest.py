@@ -0,0 +1,82 @@
+import asyncio
+import os
+import sys
+import tempfile
+
+import httpx
+import pytest
+
+# Settings are read when the modules are imported, the app runs from src/ like in the Docker image
+TEST_DIR = tempfile.mkdtemp(prefix="linktious-tests-")
+os.environ.setdefault("LINKTIOUS_DATABASE_URL", f"sqlite:///{os.path.join(TEST_DIR, 'linktious.db')}")
+os.environ.setdefault("LINKTIOUS_ICONS_DIR", os.path.join(TEST_DIR, "icons"))
+os.environ.setdefault("LINKTIOUS_SECRET_KEY", "tests")
+os.environ["LINKTIOUS_LINK_CHECKER"] = "0"
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from benchmarks.dataset import DatasetSize, generate  # noqa: E402
+from db import base, migrations  # noqa: E402
+
+DATASET_SIZE = DatasetSize(teams=3, users=20, links=120, labels=15, boards=30, labels_per_link=2,
+                           links_per_board=6, favorites_per_user=2)
+
+
+class Client:
+    """Synchronous httpx client of the app, every request runs on the client's event loop."""
+
+    def __init__(self, app):
+        self.loop = asyncio.new_event_loop()
+        self.client = httpx.AsyncClient(app=app, base_url="http://testserver")
+
+    def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        return self.loop.run_until_complete(self.client.request(method, url, **kwargs))
+
+    def get(self, url: str, **kwargs) -> httpx.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> httpx.Response:
+        return self.request("POST", url, **kwargs)
+
+    def put(self, url: str, **kwargs) -> httpx.Response:
+        return self.request("PUT", url, **kwargs)
+
+    def close(self):
+        self.loop.run_until_complete(self.client.aclose())
+        self.loop.run_until_complete(self.loop.shutdown_default_executor())
+        self.loop.close()
+
+
+@pytest.fixture(scope="session")
+def database():
+    """Migrated database with a small generated dataset, shared by the tests which don't change it."""
+    migrations.migrate(base.engine)
+    generate(base.engine, DATASET_SIZE)
+    yield base.engine
+    # Pooled aiosqlite connections run on non daemon threads which would keep pytest alive
+    if base.async_engine is not None:
+        asyncio.run(base.async_engine.dispose())
+    base.engine.dispose()
+
+
+@pytest.fixture(scope="session")
+def app(database):
+    from app import app
+
+    return app
+
+
+@pytest.fixture
+def client(app):
+    client = Client(app)
+    yield client
+    client.close()
+
+
+@pytest.fixture
+def auth_headers():
+    from auth import create_access_token
+
+    def headers(user_id: int = 1):
+        return {"Authorization": f"Bearer {create_access_token(user_id)}"}
+
+    return headers
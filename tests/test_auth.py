@@ -0,0 +1,88 @@
+import pytest
+
+from auth import PASSWORD_HASH_ITERATIONS, hash_password, needs_rehash, verify_password
+from db import base
+from db.models import User
+
+MALFORMED_HASHES = [
+    "pbkdf2_sha256$",
+    "pbkdf2_sha256$260000",
+    "pbkdf2_sha256$not a number$salt$hash",
+    "pbkdf2_sha256$260000$salt$hash$extra",
+    "pbkdf2_sha256$0$salt$hash",
+    "pbkdf2_sha256$1$salt$hàsh",
+]
+
+MUTATIONS = [
+    ("POST", "/teams/", {"name": "team"}),
+    ("POST", "/labels/", {"name": "label"}),
+    ("POST", "/labels/bulk", []),
+    ("POST", "/links/", {"url": "https://example.com", "icon_url": "https://example.com/icon.png", "description": "link"}),
+    ("POST", "/links/bulk", []),
+    ("POST", "/links/1/set_labels", []),
+    ("POST", "/links/1/labels/add", []),
+    ("POST", "/links/1/labels/remove", []),
+    ("POST", "/boards/", {"name": "board"}),
+    ("POST", "/boards/bulk", []),
+    ("POST", "/boards/1/set_links", []),
+    ("POST", "/boards/1/links/add", []),
+    ("POST", "/boards/1/links/remove", []),
+    ("PUT", "/users/1/set_main_board?board_id=1", None),
+    ("PUT", "/users/1/set_favorite_boards", []),
+    ("POST", "/users/1/favorite_boards/add", []),
+    ("POST", "/users/1/favorite_boards/remove", []),
+]
+
+
+def test_password_hash_round_trip():
+    hashed_password = hash_password("secret", iterations=1000)
+    assert verify_password("secret", hashed_password)
+    assert not verify_password("other", hashed_password)
+    assert needs_rehash(hashed_password) == (PASSWORD_HASH_ITERATIONS != 1000)
+
+
+@pytest.mark.parametrize("hashed_password", MALFORMED_HASHES)
+def test_malformed_hash_matches_nothing(hashed_password):
+    assert not verify_password("hash", hashed_password)
+    assert needs_rehash(hashed_password)
+
+
+@pytest.fixture
+def malformed_user(database):
+    with base.SessionLocal() as db:
+        user = User(email="malformed@email.com", hashed_password="pbkdf2_sha256$oops", is_active=True)
+        db.add(user)
+        db.commit()
+        user_id = user.id
+    yield "malformed@email.com"
+    with base.SessionLocal() as db:
+        db.delete(db.get(User, user_id))
+        db.commit()
+
+
+def test_login_with_a_malformed_hash_is_refused(client, malformed_user):
+    response = client.post("/users/login", json={"email": malformed_user, "password": "oops"})
+    assert response.status_code == 401
+    assert response.json() == {"detail": "Bad credentials"}
+
+
+@pytest.mark.parametrize("method, url, body", MUTATIONS)
+def test_mutations_require_a_token(client, method, url, body):
+    response = client.request(method, url, json=body)
+    assert response.status_code == 401
+    assert response.headers["WWW-Authenticate"] == "Bearer"
+
+    response = client.request(method, url, json=body, headers={"Authorization": "Bearer forged.token"})
+    assert response.status_code == 401
+
+
+@pytest.mark.parametrize("method, url, body", [mutation for mutation in MUTATIONS if mutation[1].startswith("/users/")])
+def test_users_only_change_their_own_settings(client, auth_headers, method, url, body):
+    response = client.request(method, url, json=body, headers=auth_headers(user_id=2))
+    assert response.status_code == 403
+
+
+@pytest.mark.parametrize("url", ["/users/1/favorite_boards/add", "/links/1/labels/add", "/boards/1/links/add"])
+def test_authenticated_mutations_are_allowed(client, auth_headers, url):
+    response = client.post(url, json=[], headers=auth_headers(user_id=1))
+    assert response.status_code == 200, response.text
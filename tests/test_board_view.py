@@ -0,0 +1,39 @@
+import pytest
+
+BOARD_ID = 7
+
+
+def get_view(client, **params):
+    response = client.get(f"/boards/{BOARD_ID}/view", params=params)
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_view_is_the_board_its_links_and_their_labels(client):
+    view = get_view(client)
+    board = client.get(f"/boards/{BOARD_ID}").json()
+    links = client.get("/links/", params={"ids": ",".join(map(str, board["links"]))}).json()["items"]
+
+    assert view["board"]["name"] == board["name"]
+    assert sorted(link["id"] for link in view["links"]) == sorted(board["links"])
+    assert sorted(label["id"] for label in view["labels"]) == sorted({id for link in links for id in link["labels"]})
+
+
+def test_view_fields_are_selected_by_section(client):
+    full = get_view(client)
+    view = get_view(client, fields="board.name,links.url,links.url")
+    assert view["board"] == {"id": BOARD_ID, "name": full["board"]["name"]}
+    assert view["links"] == [{"id": link["id"], "url": link["url"]} for link in full["links"]]
+    # Sections without selected fields are whole
+    assert view["labels"] == full["labels"]
+
+
+@pytest.mark.parametrize("fields", ["board.nope", "nope.id", "board", "board.name,", "links.url,labels"])
+def test_unknown_view_fields_are_refused(client, fields):
+    response = client.get(f"/boards/{BOARD_ID}/view", params={"fields": fields})
+    assert response.status_code == 422
+    assert "fields must be comma separated fields of board, links, labels" in response.json()["detail"]
+
+
+def test_missing_board_has_no_view(client):
+    assert client.get("/boards/999999/view").status_code == 404
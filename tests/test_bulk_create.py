@@ -0,0 +1,60 @@
+import pytest
+
+from db import base, schema
+from db.models import Label, ModelsManager
+
+NOW = "2026-01-01T00:00:00"
+
+
+@pytest.fixture
+def label_names(database):
+    names = []
+    yield names
+    with base.SessionLocal() as db:
+        db.query(Label).filter(Label.name.in_(names)).delete(synchronize_session=False)
+        db.commit()
+
+
+def get_names(ids):
+    with base.SessionLocal() as db:
+        names = dict(db.query(Label.id, Label.name).filter(Label.id.in_(ids)))
+    return [names.get(id) for id in ids]
+
+
+def test_ids_and_errors_are_in_the_order_of_the_items(client, auth_headers, label_names):
+    existing_name = client.get("/labels/1").json()["name"]
+    label_names.extend(["bulk a", "bulk b", "bulk c"])
+    items = [
+        {"name": "bulk a", "created_at": NOW},
+        {"created_at": NOW},
+        {"name": "bulk b", "created_at": NOW},
+        {"name": existing_name, "created_at": NOW},
+        {"name": "bulk a", "created_at": NOW},
+        {"name": "bulk c", "created_at": NOW},
+    ]
+    response = client.post("/labels/bulk", json=items, headers=auth_headers())
+    assert response.status_code == 200
+    result = response.json()
+    assert result["created"] == 3
+    assert [id is not None for id in result["ids"]] == [True, False, True, False, False, True]
+    assert [error["index"] for error in result["errors"]] == [1, 3, 4]
+    assert result["errors"][0]["errors"][0]["loc"] == ["name"]
+    assert {error["errors"][0]["type"] for error in result["errors"][1:]} == {"value_error.unique"}
+
+    created_ids = [id for id in result["ids"] if id is not None]
+    assert get_names(created_ids) == ["bulk a", "bulk b", "bulk c"]
+    found = client.get("/labels/", params={"ids": ",".join(map(str, created_ids))}).json()
+    assert [item["name"] for item in found["items"]] == ["bulk a", "bulk b", "bulk c"]
+
+
+def test_ids_of_every_batch_are_returned(label_names):
+    names = [f"batched {index}" for index in range(7)]
+    label_names.extend(names)
+    with base.SessionLocal() as db:
+        result = ModelsManager(db=db).labels.bulk_create(
+            [{"name": name, "created_at": NOW} for name in names], schema.LabelCreate, batch_size=3,
+            created_by_user_id=1,
+        )
+    assert result.created == len(names)
+    assert len(set(result.ids)) == len(names)
+    assert get_names(result.ids) == names
@@ -0,0 +1,159 @@
+import fnmatch
+from typing import Dict, List, Set
+
+import pytest
+
+from db import base, schema
+from db.cache import CacheBackend, RedisCache, model_cache
+from db.models import Board, Link, ModelsManager, User
+
+
+class FakeRedis:
+    """The commands of `RedisCache` on dicts, values are bytes like redis-py returns them."""
+
+    def __init__(self):
+        self.hashes: Dict[bytes, Dict[bytes, bytes]] = {}
+        self.sets: Dict[bytes, Set[bytes]] = {}
+        self.ttls: Dict[bytes, int] = {}
+
+    @staticmethod
+    def _bytes(value) -> bytes:
+        return value if isinstance(value, bytes) else str(value).encode()
+
+    def hget(self, key, field):
+        return self.hashes.get(self._bytes(key), {}).get(self._bytes(field))
+
+    def hset(self, key, field, value):
+        self.hashes.setdefault(self._bytes(key), {})[self._bytes(field)] = self._bytes(value)
+
+    def sadd(self, key, *members):
+        self.sets.setdefault(self._bytes(key), set()).update(self._bytes(member) for member in members)
+
+    def smembers(self, key):
+        return set(self.sets.get(self._bytes(key), set()))
+
+    def expire(self, key, seconds):
+        self.ttls[self._bytes(key)] = seconds
+
+    def delete(self, *keys):
+        for key in map(self._bytes, keys):
+            self.hashes.pop(key, None)
+            self.sets.pop(key, None)
+            self.ttls.pop(key, None)
+
+    def keys(self, pattern="*") -> List[bytes]:
+        return [key for key in [*self.hashes, *self.sets] if fnmatch.fnmatchcase(key.decode(), pattern)]
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, client: FakeRedis):
+        self.client = client
+        self.commands = []
+
+    def __getattr__(self, name):
+        def command(*args):
+            self.commands.append((getattr(self.client, name), args))
+            return self
+        return command
+
+    def execute(self):
+        commands, self.commands = self.commands, []
+        return [command(*args) for command, args in commands]
+
+
+@pytest.fixture
+def redis(monkeypatch, database):
+    client = FakeRedis()
+    monkeypatch.setattr(model_cache, "backend", RedisCache(client=client, ttl=60))
+    return client
+
+
+def test_values_are_hashes_of_the_entity(redis):
+    cache = model_cache.backend
+    cache.set("links:1", "Link", "{}")
+    cache.set("links:1", "LinkSummary", "[]")
+    assert cache.get("links:1", "Link") == "{}"
+    assert cache.get("links:1", "Missing") is None
+    assert redis.ttls[b"linktious:links:1"] == 60
+
+    cache.delete(["links:1"])
+    assert cache.get("links:1", "LinkSummary") is None
+
+
+def test_deleting_a_dependency_deletes_its_dependents(redis):
+    cache = model_cache.backend
+    cache.set("users:1", "UserHome", "{}")
+    cache.add_dependencies("users:1", ["boards:1", "boards:2"])
+    cache.set("users:2", "UserHome", "{}")
+    cache.add_dependencies("users:2", ["boards:2"])
+
+    cache.delete(["boards:1"])
+    assert cache.get("users:1", "UserHome") is None
+    assert cache.get("users:2", "UserHome") == "{}"
+    assert b"linktious:dependents:boards:1" not in redis.sets
+
+
+def test_value_read_before_an_invalidation_isnt_stored(redis):
+    generation = model_cache.generation
+    model_cache.invalidate([("links", 1)])
+    model_cache.set("links", 1, "Link", "stale", generation)
+    assert redis.keys() == []
+
+    model_cache.set("links", 1, "Link", "fresh", model_cache.generation)
+    assert model_cache.get("links", 1, "Link") == "fresh"
+
+
+def test_read_through_and_invalidation_after_commit(redis):
+    with base.SessionLocal() as db:
+        links = ModelsManager(db=db).links
+        link = links.get_serialized(2, response_model=schema.Link)
+        assert redis.hget("linktious:links:2", "Link") is not None
+        assert links.get_serialized(2, response_model=schema.Link) == link
+
+        db.get(Link, 2).description = "changed"
+        db.commit()
+        assert redis.keys() == []
+        assert links.get_serialized(2, response_model=schema.Link)["description"] == "changed"
+
+
+def test_home_is_invalidated_by_its_boards(redis):
+    with base.SessionLocal() as db:
+        users = ModelsManager(db=db).users
+        main_board_id = db.get(User, 1).main_board_id
+        assert users.get_home(1) is not None
+        assert redis.hget("linktious:users:1", "UserHome") is not None
+
+        # Only the board changes, the user row doesn't
+        db.get(Board, main_board_id).name = "renamed main board"
+        db.commit()
+        assert redis.hget("linktious:users:1", "UserHome") is None
+        assert "renamed main board" in users.get_home(1)
+
+
+def test_uncommitted_changes_are_never_stored(redis):
+    with base.SessionLocal() as db:
+        links = ModelsManager(db=db).links
+        # Flushed by the query of the read, after the cache was looked up
+        db.get(Link, 3).description = "uncommitted"
+        assert links.get_serialized(3, response_model=schema.Link)["description"] == "uncommitted"
+
+        db.flush()
+        db.get(Link, 4).description = "uncommitted"
+        assert links.get_serialized(4, response_model=schema.Link)["description"] == "uncommitted"
+        db.rollback()
+
+        assert redis.keys() == []
+        assert links.get_serialized(3, response_model=schema.Link)["description"] != "uncommitted"
+        assert links.get_serialized(4, response_model=schema.Link)["description"] != "uncommitted"
+
+
+def test_backend_must_implement_every_operation():
+    class ReadOnlyCache(CacheBackend):
+        def get(self, key, field):
+            return None
+
+    with pytest.raises(TypeError):
+        ReadOnlyCache()
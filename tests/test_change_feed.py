@@ -0,0 +1,202 @@
+import asyncio
+from datetime import datetime
+
+import orjson
+import pytest
+from sqlalchemy import select
+
+from change_feed import LOOKBACK, ChangeHub
+from db import base, changes
+from db.models import Change
+from db.querysets import ChangeQueryset
+from routers import changes as changes_router
+
+TIMEOUT = 5
+BOARD_ID = 7
+
+
+class ASGISession:
+    """An ASGI connection driven message by message, streams never end by themselves."""
+
+    def __init__(self, app, scope: dict, *messages: dict):
+        self.received: "asyncio.Queue[dict]" = asyncio.Queue()
+        self.sent: "asyncio.Queue[dict]" = asyncio.Queue()
+        for message in messages:
+            self.received.put_nowait(message)
+        self.task = asyncio.ensure_future(app(scope, self.received.get, self.sent.put))
+
+    async def receive(self) -> dict:
+        return await asyncio.wait_for(self.sent.get(), TIMEOUT)
+
+    async def close(self, message: dict):
+        await self.received.put(message)
+        await asyncio.wait_for(self.task, TIMEOUT)
+
+
+def make_scope(type: str, path: str, query_string: bytes = b"", headers=()) -> dict:
+    return {
+        "type": type, "path": path, "raw_path": path.encode(), "root_path": "", "query_string": query_string,
+        "headers": [(name.lower().encode(), value.encode()) for name, value in headers],
+        "scheme": "http" if type == "http" else "ws", "http_version": "1.1", "method": "GET",
+        "server": ("testserver", 80), "client": ("testclient", 50000), "subprotocols": [],
+    }
+
+
+def parse_event(chunk: bytes) -> dict:
+    fields = dict(line.split(": ", 1) for line in chunk.decode().strip().split("\n"))
+    return {**fields, "data": orjson.loads(fields["data"])}
+
+
+@pytest.fixture
+def hub(client, monkeypatch):
+    """Hub of the client's event loop, the app's one is bound to the loop of its first subscriber."""
+    hub = ChangeHub(base.engine, changes.change_pubsub)
+    monkeypatch.setattr(changes_router, "change_hub", hub)
+    yield hub
+    client.loop.run_until_complete(hub.close())
+
+
+@pytest.fixture
+def board_links(client, auth_headers):
+    links = client.get(f"/boards/{BOARD_ID}").json()["links"]
+    yield links
+    client.post(f"/boards/{BOARD_ID}/set_links", json=links, headers=auth_headers())
+
+
+@pytest.fixture
+def inserted_seqs():
+    seqs = []
+    yield seqs
+    table = Change.__table__
+    with base.engine.begin() as connection:
+        connection.execute(table.delete().where(table.c.seq.in_(seqs)))
+
+
+def insert_change(seq: int, entity_id: int):
+    with base.engine.begin() as connection:
+        connection.execute(Change.__table__.insert(), [{
+            "seq": seq, "table_name": "links", "entity_id": entity_id, "relationship_name": None,
+            "action": "updated", "created_at": datetime.utcnow(),
+        }])
+
+
+def get_last_seq() -> int:
+    with base.engine.connect() as connection:
+        return connection.execute(select(Change.seq).order_by(Change.seq.desc()).limit(1)).scalar() or 0
+
+
+def test_stream_sends_the_committed_changes(app, client, auth_headers, hub, board_links):
+    new_link = next(id for id in range(1, 10) if id not in board_links)
+
+    async def scenario():
+        stream = ASGISession(app, make_scope("http", "/changes/stream", f"board_id={BOARD_ID}".encode()),
+                             {"type": "http.request", "body": b"", "more_body": False})
+        start = await stream.receive()
+        assert start["status"] == 200
+        assert dict(start["headers"])[b"content-type"].startswith(b"text/event-stream")
+        assert (await stream.receive())["body"] == b"retry: 3000\n\n"
+
+        # The stream is subscribed once its first event is sent
+        response = await client.client.post(f"/boards/{BOARD_ID}/links/add", json=[new_link], headers=auth_headers())
+        assert response.status_code == 200
+        event = parse_event((await stream.receive())["body"])
+        await stream.close({"type": "http.disconnect"})
+        return event
+
+    event = client.loop.run_until_complete(scenario())
+    assert event["event"] == "change"
+    assert event["data"]["table_name"] == "boards"
+    assert event["data"]["entity_id"] == BOARD_ID
+    assert event["data"]["relationship_name"] == "links"
+    assert int(event["id"]) == event["data"]["seq"]
+
+
+def test_stream_resumes_after_the_last_event_id(app, client, auth_headers, hub, board_links):
+    new_links = [id for id in range(1, 10) if id not in board_links][:2]
+    last_event_id = get_last_seq()
+    for link_id in new_links:
+        assert client.post(f"/boards/{BOARD_ID}/links/add", json=[link_id], headers=auth_headers()).status_code == 200
+
+    async def scenario():
+        stream = ASGISession(app, make_scope("http", "/changes/stream", f"board_id={BOARD_ID}&since=0".encode(),
+                                             [("Last-Event-ID", str(last_event_id))]),
+                             {"type": "http.request", "body": b"", "more_body": False})
+        assert (await stream.receive())["status"] == 200
+        await stream.receive()
+        events = [parse_event((await stream.receive())["body"]) for _ in new_links]
+        await stream.close({"type": "http.disconnect"})
+        return events
+
+    events = client.loop.run_until_complete(scenario())
+    assert [(event["data"]["table_name"], event["data"]["entity_id"]) for event in events] == [("boards", BOARD_ID)] * 2
+    assert all(int(event["id"]) > last_event_id for event in events)
+
+
+@pytest.fixture
+def pruned(monkeypatch):
+    """The log starts at 10, changes after 1 are gone."""
+    monkeypatch.setattr(ChangeQueryset, "get_first_seq", lambda self: 10)
+
+
+def test_stream_refuses_pruned_changes(client, hub, pruned):
+    response = client.get("/changes/stream", params={"since": 1})
+    assert response.status_code == 410
+    assert client.get("/changes/", params={"since": 1}).status_code == 410
+
+
+def test_websocket_sends_the_committed_changes(app, client, auth_headers, hub, board_links):
+    new_link = next(id for id in range(1, 10) if id not in board_links)
+
+    async def scenario():
+        websocket = ASGISession(app, make_scope("websocket", "/changes/ws", f"board_id={BOARD_ID}".encode()),
+                                {"type": "websocket.connect"})
+        assert (await websocket.receive())["type"] == "websocket.accept"
+        response = await client.client.post(f"/boards/{BOARD_ID}/links/add", json=[new_link], headers=auth_headers())
+        assert response.status_code == 200
+        message = await websocket.receive()
+        await websocket.close({"type": "websocket.disconnect", "code": 1000})
+        return message
+
+    message = client.loop.run_until_complete(scenario())
+    assert message["type"] == "websocket.send"
+    change = orjson.loads(message["text"])
+    assert (change["table_name"], change["entity_id"], change["relationship_name"]) == ("boards", BOARD_ID, "links")
+
+
+def test_websocket_refuses_pruned_changes(app, client, hub, pruned):
+    async def scenario():
+        websocket = ASGISession(app, make_scope("websocket", "/changes/ws", b"since=1"), {"type": "websocket.connect"})
+        message = await websocket.receive()
+        await asyncio.wait_for(websocket.task, TIMEOUT)
+        return message
+
+    assert client.loop.run_until_complete(scenario()) == {"type": "websocket.close", "code": 1008}
+
+
+def test_late_commits_within_the_lookback_are_dispatched_once(client, inserted_seqs):
+    hub = ChangeHub(base.engine, changes.LocalPubSub(), poll_interval=3600)
+
+    async def read(subscription, *changes_ids) -> list:
+        for seq, entity_id in changes_ids:
+            inserted_seqs.append(seq)
+            insert_change(seq, entity_id)
+        await hub._read()
+        received = []
+        while not subscription.queue.empty():
+            received.append(subscription.queue.get_nowait()["seq"])
+        return received
+
+    async def scenario():
+        subscription = await hub.subscribe(None)
+        start = subscription.start_seq
+        try:
+            assert await read(subscription, (start + LOOKBACK + 2, 1)) == [start + LOOKBACK + 2]
+            # Sequence numbers taken by transactions which committed later, the first is in the lookback
+            assert await read(subscription, (start + 3, 2)) == [start + 3]
+            assert await read(subscription) == []
+            assert await read(subscription, (start + 1, 3)) == []
+        finally:
+            hub.unsubscribe(subscription)
+            await hub.close()
+
+    client.loop.run_until_complete(scenario())
@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+
+
+@pytest.mark.parametrize("url", ["/links/5", "/boards/7"])
+def test_matching_etag_is_not_modified(client, url):
+    response = client.get(url)
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+
+    for if_none_match in (etag, f"W/{etag}", f'"other", {etag}', "*"):
+        not_modified = client.get(url, headers={"If-None-Match": if_none_match})
+        assert not_modified.status_code == 304
+        assert not_modified.content == b""
+        assert not_modified.headers["ETag"] == etag
+
+    assert client.get(url, headers={"If-None-Match": '"other"'}).status_code == 200
+
+
+@pytest.mark.parametrize("url", ["/links/5", "/boards/7"])
+def test_unmodified_since_is_not_modified(client, url):
+    last_modified = client.get(url).headers["Last-Modified"]
+    assert client.get(url, headers={"If-Modified-Since": last_modified}).status_code == 304
+
+    earlier = format_datetime(datetime(2000, 1, 1, tzinfo=timezone.utc), usegmt=True)
+    assert client.get(url, headers={"If-Modified-Since": earlier}).status_code == 200
+    assert client.get(url, headers={"If-Modified-Since": "not a date"}).status_code == 200
+    # If-None-Match takes precedence
+    assert client.get(url, headers={"If-Modified-Since": last_modified, "If-None-Match": '"other"'}).status_code == 200
+
+
+def test_future_if_modified_since_is_not_modified(client):
+    later = format_datetime(datetime.now(timezone.utc) + timedelta(days=1), usegmt=True)
+    assert client.get("/links/5", headers={"If-Modified-Since": later}).status_code == 304
+
+
+@pytest.mark.parametrize("url, change, undo", [
+    ("/boards/7", "/boards/7/links/add", "/boards/7/links/remove"),
+    ("/links/5", "/links/5/labels/add", "/links/5/labels/remove"),
+])
+def test_association_change_updates_the_etag(client, auth_headers, url, change, undo):
+    etag = client.get(url).headers["ETag"]
+    # Not associated yet in the generated dataset
+    ids = [1] if url.startswith("/boards/") else [15]
+    assert client.post(change, json=ids, headers=auth_headers()).status_code == 200
+    try:
+        response = client.get(url, headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
+        new_etag = response.headers["ETag"]
+        assert client.get(url, headers={"If-None-Match": new_etag}).status_code == 304
+    finally:
+        client.post(undo, json=ids, headers=auth_headers())
@@ -0,0 +1,131 @@
+import pytest
+from sqlalchemy import create_engine
+
+from conftest import DATASET_SIZE
+from benchmarks.dataset import generate
+from db import base, counters, migrations, models
+from db.cache import model_cache
+from transfer import Importer, export_database
+
+BOARD_ID = 7
+NOW = "2026-01-01T00:00:00"
+
+
+def drifted(engine):
+    """Counters which differ from the association rows, the fixes are rolled back."""
+    with engine.connect() as connection:
+        transaction = connection.begin()
+        try:
+            return {name: ids for name, ids in counters.recount(connection, models.Base.metadata).items() if ids}
+        finally:
+            transaction.rollback()
+
+
+@pytest.fixture
+def board_links(client, auth_headers):
+    links = client.get(f"/boards/{BOARD_ID}").json()["links"]
+    yield links
+    client.post(f"/boards/{BOARD_ID}/set_links", json=links, headers=auth_headers())
+
+
+def get_count(client, url, column="links_count"):
+    return client.get(url).json()[column]
+
+
+def test_counters_follow_association_changes(client, auth_headers, board_links):
+    other_links = [id for id in range(1, 6) if id not in board_links]
+    labels_counts = {id: get_count(client, f"/labels/{id}") for id in (14, 15)}
+    link_labels = client.get("/links/5").json()["labels"]
+    new_labels = [id for id in labels_counts if id not in link_labels]
+
+    requests = [
+        (f"/boards/{BOARD_ID}/links/add", other_links, len(board_links) + len(other_links)),
+        (f"/boards/{BOARD_ID}/links/remove", other_links[:2], len(board_links) + len(other_links) - 2),
+        (f"/boards/{BOARD_ID}/set_links", board_links[:1], 1),
+    ]
+    for url, ids, expected in requests:
+        assert client.post(url, json=ids, headers=auth_headers()).status_code == 200
+        assert get_count(client, f"/boards/{BOARD_ID}") == expected
+        assert drifted(base.engine) == {}
+
+    # Counts of many targets of one owner
+    assert client.post("/links/5/labels/add", json=new_labels, headers=auth_headers()).status_code == 200
+    try:
+        assert {id: get_count(client, f"/labels/{id}") for id in labels_counts} == {
+            id: count + (id in new_labels) for id, count in labels_counts.items()
+        }
+        assert drifted(base.engine) == {}
+    finally:
+        client.post("/links/5/labels/remove", json=new_labels, headers=auth_headers())
+    assert {id: get_count(client, f"/labels/{id}") for id in labels_counts} == labels_counts
+
+    favorites_count = get_count(client, f"/boards/{BOARD_ID}", "favorites_count")
+    assert client.post("/users/1/favorite_boards/add", json=[BOARD_ID], headers=auth_headers()).status_code == 200
+    try:
+        assert get_count(client, f"/boards/{BOARD_ID}", "favorites_count") == favorites_count + 1
+    finally:
+        client.post("/users/1/favorite_boards/remove", json=[BOARD_ID], headers=auth_headers())
+    assert drifted(base.engine) == {}
+
+
+@pytest.fixture
+def bulk_boards():
+    names = ["bulk counted 1", "bulk counted 2"]
+    yield names
+    with base.SessionLocal() as db:
+        for board in db.query(models.Board).filter(models.Board.name.in_(names)):
+            db.delete(board)
+        db.commit()
+
+
+def test_bulk_created_boards_are_counted(client, auth_headers, bulk_boards):
+    assert drifted(base.engine) == {}
+    response = client.post("/boards/bulk", json=[
+        {"name": name, "description": name, "created_at": NOW, "updated_at": NOW} for name in bulk_boards
+    ],
+                           headers=auth_headers())
+    assert response.status_code == 200
+    boards_ids = response.json()["ids"]
+    assert client.post(f"/boards/{boards_ids[0]}/links/add", json=[1, 2, 3], headers=auth_headers()).status_code == 200
+    assert [get_count(client, f"/boards/{id}") for id in boards_ids] == [3, 0]
+    assert drifted(base.engine) == {}
+
+
+def test_imported_counters_match(tmp_path):
+    source = create_engine(f"sqlite:///{tmp_path / 'source.db'}")
+    target = create_engine(f"sqlite:///{tmp_path / 'target.db'}")
+    for engine in (source, target):
+        migrations.migrate(engine)
+    generate(source, DATASET_SIZE)
+
+    importer = Importer(target, models.Base.metadata)
+    try:
+        importer.feed(b"".join(export_database(source, models.Base.metadata)).splitlines())
+        importer.commit()
+    finally:
+        importer.close()
+    assert drifted(target) == {}
+    source.dispose()
+    target.dispose()
+
+
+def test_recount_fixes_drift(client, monkeypatch):
+    boards = models.Board.__table__
+    links_count = get_count(client, f"/boards/{BOARD_ID}")
+    with base.engine.begin() as connection:
+        connection.execute(boards.update().where(boards.c.id == BOARD_ID).values(links_count=links_count + 10))
+    assert drifted(base.engine) == {"boards.links_count": [BOARD_ID]}
+
+    invalidated = []
+    invalidate = model_cache.invalidate
+
+    def record_invalidations(entities):
+        invalidated.extend(entities)
+        invalidate(invalidated)
+
+    monkeypatch.setattr(model_cache, "invalidate", record_invalidations)
+    fixed = counters.recount_database(base.engine, models.Base.metadata)
+    assert fixed == {counter.name: int(counter.name == "boards.links_count") for counter in counters.COUNTERS}
+    assert invalidated == ([("boards", BOARD_ID)] if model_cache.enabled else [])
+    assert drifted(base.engine) == {}
+    assert get_count(client, f"/boards/{BOARD_ID}") == links_count
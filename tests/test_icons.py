@@ -0,0 +1,120 @@
+import asyncio
+
+import httpx
+import pytest
+
+from icons import IconStore, IconUnavailable
+from public_urls import is_public_address
+
+# Public addresses, the mock transport never connects to them
+ICON_URL = "http://93.184.216.34/favicon.png"
+PNG = b"\x89PNG\r\n\x1a\n icon"
+
+
+class StubServer:
+    """Icons served by a mock transport, counting the requests by URL."""
+
+    def __init__(self):
+        self.requests = []
+        self.routes = {}
+
+    def route(self, url: str, response: httpx.Response):
+        self.routes[url] = response
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(str(request.url))
+        # Concurrent requests overlap
+        await asyncio.sleep(0.01)
+        response = self.routes.get(str(request.url))
+        if response is None:
+            return httpx.Response(404)
+        return httpx.Response(response.status_code, headers=response.headers, content=response.content)
+
+
+@pytest.fixture
+def server():
+    server = StubServer()
+    server.route(ICON_URL, httpx.Response(200, headers={"Content-Type": "image/png"}, content=PNG))
+    return server
+
+
+@pytest.fixture
+def store(tmp_path, server):
+    return IconStore(directory=str(tmp_path), client=httpx.AsyncClient(transport=httpx.MockTransport(server.handle)))
+
+
+def test_fetched_icon_is_cached(store, server):
+    icon = asyncio.run(store.get(ICON_URL))
+    assert store.read(icon) == PNG
+    assert icon.content_type == "image/png"
+
+    assert asyncio.run(store.get(ICON_URL)) == icon
+    # Another process sharing the directory
+    assert asyncio.run(IconStore(directory=store.directory, client=store._client).get(ICON_URL)) == icon
+    assert server.requests == [ICON_URL]
+
+
+def test_failed_fetch_is_cached(store, server):
+    url = "http://93.184.216.34/missing.png"
+    for _ in range(2):
+        with pytest.raises(IconUnavailable, match="404"):
+            asyncio.run(store.get(url))
+    assert server.requests == [url]
+
+    store.failure_ttl = 0
+    with pytest.raises(IconUnavailable):
+        asyncio.run(store.get(url))
+    assert server.requests == [url, url]
+
+
+def test_concurrent_requests_share_one_fetch(store, server):
+    async def get_many():
+        return await asyncio.gather(*(store.get(ICON_URL) for _ in range(10)))
+
+    icons = asyncio.run(get_many())
+    assert len(set(icons)) == 1
+    assert server.requests == [ICON_URL]
+
+
+@pytest.mark.parametrize("url", [
+    "http://127.0.0.1/favicon.png",
+    "http://localhost:8000/favicon.png",
+    "http://169.254.169.254/latest/meta-data/",
+    "http://10.0.0.1/favicon.png",
+    "http://[::1]/favicon.png",
+    "http://[::ffff:192.168.0.1]/favicon.png",
+    "file:///etc/passwd",
+])
+def test_non_public_urls_arent_fetched(store, server, url):
+    with pytest.raises(IconUnavailable):
+        asyncio.run(store.get(url))
+    assert server.requests == []
+
+
+def test_redirects_to_non_public_urls_arent_followed(store, server):
+    url = "http://93.184.216.34/redirect.png"
+    server.route(url, httpx.Response(302, headers={"Location": "http://169.254.169.254/latest/meta-data/"}))
+    with pytest.raises(IconUnavailable, match="169.254.169.254"):
+        asyncio.run(store.get(url))
+    assert server.requests == [url]
+
+
+def test_redirects_to_public_urls_are_followed(store, server):
+    url = "http://93.184.216.34/redirect.png"
+    server.route(url, httpx.Response(301, headers={"Location": ICON_URL}))
+    assert store.read(asyncio.run(store.get(url))) == PNG
+    assert server.requests == [url, ICON_URL]
+
+
+@pytest.mark.parametrize("address, public", [
+    ("93.184.216.34", True),
+    ("2606:2800:220:1:248:1893:25c8:1946", True),
+    ("192.168.1.1", False),
+    ("100.64.0.1", False),
+    ("0.0.0.0", False),
+    ("224.0.0.1", False),
+    ("fe80::1%eth0", False),
+    ("fc00::1", False),
+])
+def test_public_addresses(address, public):
+    assert is_public_address(address) == public
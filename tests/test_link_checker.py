@@ -0,0 +1,164 @@
+import asyncio
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+from sqlalchemy import create_engine, select
+
+from db import migrations, models
+from db.schema import LinkStatus
+from link_checker import (
+    LINK_CHECK_BROKEN_AFTER, LINK_CHECK_MAX_RETRY_DELAY, LINK_CHECK_RETRY_DELAY, CheckResult, DueLink, LinkChecker,
+    get_next_state, save_results,
+)
+
+# Public addresses, the mock transport never connects to them
+HOSTS = ["93.184.216.34", "93.184.216.35"]
+NOW = datetime(2021, 1, 1)
+
+
+class NoJitter:
+    @staticmethod
+    def uniform(low, high):
+        return 1
+
+
+class StubServer:
+    """Answers the checks, recording the requests and the most concurrent ones per host."""
+
+    def __init__(self, head_status: int = 200, get_status: int = 200, head_error: Exception = None):
+        self.head_status = head_status
+        self.head_error = head_error
+        self.get_status = get_status
+        self.requests = []
+        self.in_flight = defaultdict(int)
+        self.max_in_flight = defaultdict(int)
+        self.max_total_in_flight = 0
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        self.requests.append((request.method, str(request.url)))
+        self.in_flight[host] += 1
+        self.max_in_flight[host] = max(self.max_in_flight[host], self.in_flight[host])
+        self.max_total_in_flight = max(self.max_total_in_flight, sum(self.in_flight.values()))
+        try:
+            await asyncio.sleep(0.01)
+        finally:
+            self.in_flight[host] -= 1
+        if request.method == "HEAD" and self.head_error is not None:
+            raise self.head_error
+        if request.url.path.startswith("/redirect"):
+            return httpx.Response(302, headers={"Location": request.url.params["to"]})
+        return httpx.Response(self.head_status if request.method == "HEAD" else self.get_status)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    """A database of its own, the checks change the links."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'links.db'}")
+    migrations.migrate(engine)
+    with engine.begin() as connection:
+        connection.execute(models.User.__table__.insert(), [{"id": 1, "name": "checker", "email": "checker@email.com"}])
+    yield engine
+    engine.dispose()
+
+
+def insert_links(engine, urls):
+    with engine.begin() as connection:
+        connection.execute(models.Link.__table__.insert(), [
+            {"id": link_id, "description": f"link {link_id}", "created_by_user_id": 1, "url": url,
+             "next_check_at": NOW}
+            for link_id, url in enumerate(urls, 1)
+        ])
+
+
+def get_checker(engine, server: StubServer, **kwargs) -> LinkChecker:
+    return LinkChecker(engine, client=httpx.AsyncClient(transport=httpx.MockTransport(server.handle)), **kwargs)
+
+
+def check(server: StubServer, url: str) -> CheckResult:
+    return asyncio.run(get_checker(None, server).check(url))
+
+
+def test_head_is_enough_for_working_links():
+    server = StubServer()
+    assert check(server, f"http://{HOSTS[0]}/page") == CheckResult(alive=True, status_code=200)
+    assert [method for method, _ in server.requests] == ["HEAD"]
+
+
+@pytest.mark.parametrize("head_status", [405, 404, 500])
+def test_refused_head_falls_back_to_get(head_status):
+    server = StubServer(head_status=head_status)
+    assert check(server, f"http://{HOSTS[0]}/page") == CheckResult(alive=True, status_code=200)
+    assert [method for method, _ in server.requests] == ["HEAD", "GET"]
+
+
+@pytest.mark.parametrize("error", [httpx.RemoteProtocolError("Server disconnected"), httpx.ReadTimeout("Timed out")])
+def test_dropped_head_falls_back_to_get(error):
+    server = StubServer(head_error=error)
+    assert check(server, f"http://{HOSTS[0]}/page") == CheckResult(alive=True, status_code=200)
+    assert [method for method, _ in server.requests] == ["HEAD", "GET"]
+
+
+def test_link_is_broken_when_get_fails_too():
+    server = StubServer(head_status=404, get_status=404)
+    assert check(server, f"http://{HOSTS[0]}/page") == CheckResult(alive=False, status_code=404)
+
+
+@pytest.mark.parametrize("url", [
+    "http://127.0.0.1/page",
+    "http://169.254.169.254/latest/meta-data/",
+    f"http://{HOSTS[0]}/redirect?to=http://10.0.0.1/page",
+])
+def test_non_public_urls_arent_checked(url):
+    server = StubServer()
+    assert check(server, url) == CheckResult(alive=False, status_code=None)
+    assert all(request_url.startswith(f"http://{HOSTS[0]}/") for _, request_url in server.requests)
+
+
+def test_checks_are_limited_per_host(engine):
+    insert_links(engine, [f"http://{host}/page/{index}" for index in range(6) for host in HOSTS])
+    server = StubServer()
+    asyncio.run(get_checker(engine, server, per_host=1, concurrency=10).run(once=True))
+
+    assert len(server.requests) == 12
+    assert dict(server.max_in_flight) == {host: 1 for host in HOSTS}
+    # The hosts are checked side by side
+    assert server.max_total_in_flight == 2
+
+
+def test_failing_links_are_retried_with_backoff():
+    link = DueLink(id=1, url=f"http://{HOSTS[0]}/page", status=LinkStatus.ok.value, check_failures=0)
+    failed = CheckResult(alive=False, status_code=None)
+    delays = []
+    for _ in range(12):
+        state = get_next_state(link, failed, NOW, rng=NoJitter)
+        delays.append((state["next_check_at"] - NOW).total_seconds())
+        link = link._replace(status=state["status"], check_failures=state["check_failures"])
+
+    assert delays[:3] == [LINK_CHECK_RETRY_DELAY, LINK_CHECK_RETRY_DELAY * 2, LINK_CHECK_RETRY_DELAY * 4]
+    assert delays[-1] == LINK_CHECK_MAX_RETRY_DELAY
+    assert link.status == LinkStatus.broken.value
+    assert link.check_failures == 12
+
+    state = get_next_state(link, CheckResult(alive=True, status_code=200), NOW, interval=3600, rng=NoJitter)
+    assert state["status"] == LinkStatus.ok.value
+    assert state["check_failures"] == 0
+    assert state["next_check_at"] == NOW + timedelta(seconds=3600)
+
+
+def test_link_is_broken_after_consecutive_failures(engine):
+    insert_links(engine, [f"http://{HOSTS[0]}/page"])
+    links = models.Link.__table__
+    link = DueLink(id=1, url=f"http://{HOSTS[0]}/page", status=LinkStatus.unchecked.value, check_failures=0)
+    for failures in range(1, LINK_CHECK_BROKEN_AFTER + 1):
+        changed = save_results(engine, [(link, CheckResult(alive=False, status_code=500))], now=NOW)
+        with engine.connect() as connection:
+            row = connection.execute(select(links).where(links.c.id == 1)).one()
+        link = DueLink(id=1, url=row.url, status=row.status, check_failures=row.check_failures)
+        assert row.check_failures == failures
+        assert row.next_check_at > NOW
+        # Only the change of status is a new version of the link
+        assert changed == ([1] if failures == LINK_CHECK_BROKEN_AFTER else [])
+    assert link.status == LinkStatus.broken.value
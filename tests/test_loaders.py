@@ -0,0 +1,110 @@
+import asyncio
+from typing import Dict, List
+
+import pytest
+
+from loaders import BatchLoader
+
+TIMEOUT = 5
+
+
+class Failure(Exception):
+    pass
+
+
+class FakeLoadBatch:
+    """Items are their id times 10, ids above 100 don't exist."""
+
+    def __init__(self, failure: Exception = None, released: bool = True):
+        # Created in the running loop, asyncio primitives bind to the loop before Python 3.10
+        self.batches: List[List[int]] = []
+        self.failure = failure
+        self.started = asyncio.Event()
+        self.release = asyncio.Event()
+        if released:
+            self.release.set()
+
+    async def __call__(self, ids: List[int]) -> Dict[int, int]:
+        self.batches.append(ids)
+        self.started.set()
+        await self.release.wait()
+        if self.failure is not None:
+            raise self.failure
+        return {model_id: model_id * 10 for model_id in ids if model_id <= 100}
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+def run(loop, scenario):
+    return loop.run_until_complete(asyncio.wait_for(scenario(), TIMEOUT))
+
+
+def test_gathered_loads_are_one_batch(loop):
+    async def scenario():
+        load_batch = FakeLoadBatch()
+        loader = BatchLoader(load_batch, asyncio.Lock())
+        results = await asyncio.gather(loader.load(3), loader.load(1), loader.load_many([1, 2, 101, 3]))
+        assert load_batch.batches == [[3, 1, 2, 101]]
+
+        # Loaded ids are reused
+        assert await loader.load_many([2, 4]) == {2: 20, 4: 40}
+        assert load_batch.batches[1:] == [[4]]
+        return results
+
+    assert run(loop, scenario) == [30, 10, {1: 10, 2: 20, 3: 30}]
+
+
+def test_failed_batch_fails_every_load(loop):
+    async def scenario():
+        load_batch = FakeLoadBatch(failure=Failure())
+        loader = BatchLoader(load_batch, asyncio.Lock())
+        results = await asyncio.gather(loader.load(1), loader.load(2), loader.load_many([2, 3]),
+                                       return_exceptions=True)
+        assert all(isinstance(result, Failure) for result in results)
+
+        # Failed loads aren't kept
+        load_batch.failure = None
+        assert await loader.load_many([1, 2]) == {1: 10, 2: 20}
+        assert load_batch.batches == [[1, 2, 3], [1, 2]]
+
+    run(loop, scenario)
+
+
+def test_cancelled_batch_cancels_every_load(loop):
+    async def scenario():
+        load_batch = FakeLoadBatch(released=False)
+        loader = BatchLoader(load_batch, asyncio.Lock())
+        futures = [loader.load(1), loader.load(2)]
+        await load_batch.started.wait()
+        (task,) = loader._tasks
+        task.cancel()
+        results = await asyncio.gather(*futures, return_exceptions=True)
+        assert all(isinstance(result, asyncio.CancelledError) for result in results)
+        await asyncio.gather(task, return_exceptions=True)
+        assert not loader._tasks
+
+    run(loop, scenario)
+
+
+def test_loaders_of_a_request_share_their_lock(loop):
+    running = []
+
+    async def scenario():
+        load_batch = FakeLoadBatch(released=False)
+        lock = asyncio.Lock()
+        loaders = [BatchLoader(load_batch, lock), BatchLoader(load_batch, lock)]
+        first, second = loaders[0].load(1), loaders[1].load(2)
+        await load_batch.started.wait()
+        await asyncio.sleep(0)
+        # The second batch waits for the first one to end
+        running.append(len(load_batch.batches))
+        load_batch.release.set()
+        return await asyncio.gather(first, second)
+
+    assert run(loop, scenario) == [10, 20]
+    assert running == [1]
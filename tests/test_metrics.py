@@ -0,0 +1,70 @@
+import re
+import threading
+from typing import List
+
+import pytest
+from fastapi import APIRouter, FastAPI
+
+from conftest import Client
+from metrics import MetricsMiddleware, MetricsRoute, RequestMetrics, current_request, timed_serialization
+
+
+@pytest.fixture
+def server_timing(app, monkeypatch):
+    layer = app.middleware_stack
+    while not isinstance(layer, MetricsMiddleware):
+        layer = layer.app
+    monkeypatch.setattr(layer, "server_timing", True)
+
+
+def get_timing(response, name: str) -> float:
+    match = re.search(rf"{name};dur=([0-9.]+)", response.headers["server-timing"])
+    return float(match.group(1))
+
+
+@pytest.mark.parametrize("url", ["/links/?limit=200", "/boards/1/view", "/users/1", "/links/?ids=1,2,3"])
+def test_serialization_done_by_the_endpoint_is_timed(client, server_timing, url):
+    response = client.get(url)
+    assert response.status_code == 200
+    assert get_timing(response, "serialize") > 0
+
+
+def test_nested_serialization_is_counted_once():
+    metrics = RequestMetrics()
+    token = current_request.set(metrics)
+    try:
+        with timed_serialization():
+            with timed_serialization():
+                pass
+            inner = metrics.serialization_seconds
+    finally:
+        current_request.reset(token)
+    assert inner == 0
+    assert metrics.serialization_seconds > 0
+
+
+@pytest.fixture
+def sync_endpoint_client():
+    router = APIRouter(route_class=MetricsRoute)
+    threads = []
+
+    @router.get("/numbers", response_model=List[int])
+    def get_numbers():
+        threads.append(threading.get_ident())
+        return list(range(1000))
+
+    app = FastAPI()
+    app.include_router(router)
+    client = Client(MetricsMiddleware(app, server_timing=True))
+    yield client, threads
+    client.close()
+
+
+def test_sync_endpoints_run_in_the_threadpool(sync_endpoint_client):
+    client, threads = sync_endpoint_client
+    response = client.get("/numbers")
+    assert response.status_code == 200
+    assert response.json() == list(range(1000))
+    assert threads != [threading.get_ident()]
+    # The response model validation follows the endpoint
+    assert get_timing(response, "serialize") > 0
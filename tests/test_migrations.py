@@ -0,0 +1,165 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import (
+    Boolean, Column, DateTime, ForeignKey, Integer, MetaData, String, Table, create_engine, inspect, select,
+)
+
+from db import migrations, search
+from db.models import Base
+from db.migrations import SCHEMA_VERSION, SchemaVersionError
+
+CREATED_AT = datetime(2021, 1, 1)
+
+# Tables as `create_all` made them before schema versions existed
+baseline_metadata = MetaData()
+Table(
+    "teams", baseline_metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("name", String, unique=True, index=True),
+)
+Table(
+    "users", baseline_metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("name", String, index=True),
+    Column("email", String, unique=True, index=True),
+    Column("hashed_password", String),
+    Column("is_active", Boolean),
+    Column("team_id", Integer, ForeignKey("teams.id")),
+    Column("main_board_id", Integer),
+)
+Table(
+    "links", baseline_metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("icon_url", String),
+    Column("url", String),
+    Column("description", String),
+    Column("created_at", DateTime),
+    Column("created_by_user_id", Integer, ForeignKey("users.id")),
+)
+Table(
+    "labels", baseline_metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("name", String, unique=True, index=True),
+    Column("created_at", DateTime),
+    Column("created_by_user_id", Integer, ForeignKey("users.id")),
+)
+Table(
+    "links_labels_association", baseline_metadata,
+    Column("link_id", Integer, ForeignKey("links.id"), primary_key=True),
+    Column("lable_id", Integer, ForeignKey("labels.id"), primary_key=True),
+)
+Table(
+    "boards", baseline_metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("name", String, unique=True, index=True),
+    Column("description", String),
+    Column("created_at", DateTime),
+    Column("updated_at", DateTime),
+    Column("created_by_user_id", Integer, ForeignKey("users.id")),
+)
+Table(
+    "users_favorite_boards_association", baseline_metadata,
+    Column("user_id", Integer, ForeignKey("users.id"), primary_key=True),
+    Column("board_id", Integer, ForeignKey("boards.id"), primary_key=True),
+)
+Table(
+    "boards_links_association", baseline_metadata,
+    Column("board_id", Integer, ForeignKey("boards.id"), primary_key=True),
+    Column("link_id", Integer, ForeignKey("links.id"), primary_key=True),
+)
+
+
+@pytest.fixture
+def baseline_engine(tmp_path):
+    """A database with the baseline schema and a few rows."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'baseline.db'}")
+    baseline_metadata.create_all(bind=engine)
+    tables = baseline_metadata.tables
+    with engine.begin() as connection:
+        connection.execute(tables["users"].insert(), [{"id": 1, "name": "user", "email": "user@email.com"}])
+        connection.execute(tables["links"].insert(), [
+            {"id": link_id, "url": f"https://example.com/{link_id}", "description": f"link {link_id}",
+             "created_at": CREATED_AT, "created_by_user_id": 1}
+            for link_id in (1, 2)
+        ])
+        connection.execute(tables["labels"].insert(), [
+            {"id": 1, "name": "python", "created_at": CREATED_AT, "created_by_user_id": 1},
+        ])
+        connection.execute(tables["boards"].insert(), [
+            {"id": 1, "name": "board", "created_at": CREATED_AT, "updated_at": CREATED_AT, "created_by_user_id": 1},
+        ])
+        connection.execute(tables["links_labels_association"].insert(), [{"link_id": 1, "lable_id": 1}])
+        connection.execute(tables["boards_links_association"].insert(), [
+            {"board_id": 1, "link_id": 1}, {"board_id": 1, "link_id": 2},
+        ])
+        connection.execute(tables["users_favorite_boards_association"].insert(), [{"user_id": 1, "board_id": 1}])
+    yield engine
+    engine.dispose()
+
+
+def get_versions(engine):
+    with engine.connect() as connection:
+        return connection.execute(select(migrations.schema_version_table.c.version)).scalars().all()
+
+
+def test_baseline_schema_is_upgraded(baseline_engine):
+    messages = []
+    assert migrations.migrate(baseline_engine, log=messages.append) == SCHEMA_VERSION
+    assert get_versions(baseline_engine) == [migration.version for migration in migrations.MIGRATIONS]
+    assert messages[0] == "Stamped existing schema as version 1"
+    assert len(messages) == SCHEMA_VERSION
+
+    inspector = inspect(baseline_engine)
+    for table in Base.metadata.sorted_tables:
+        columns = {column["name"] for column in inspector.get_columns(table.name)}
+        assert columns == set(table.columns.keys()), table.name
+    assert "ix_boards_links_count_id" in {index["name"] for index in inspector.get_indexes("boards")}
+
+    links, labels, boards = (Base.metadata.tables[name] for name in ("links", "labels", "boards"))
+    with baseline_engine.connect() as connection:
+        link = connection.execute(select(links).where(links.c.id == 1)).one()
+        assert link.updated_at == link.next_check_at == CREATED_AT
+        assert (link.status, link.check_failures) == ("unchecked", 0)
+        assert connection.execute(select(labels.c.links_count)).scalar() == 1
+        board = connection.execute(select(boards)).one()
+        assert (board.links_count, board.favorites_count) == (2, 1)
+        # The search index covers the existing links
+        assert connection.exec_driver_sql(
+            f"SELECT rowid FROM {search.LINKS_SEARCH_TABLE} WHERE {search.LINKS_SEARCH_TABLE} MATCH 'python'"
+        ).scalars().all() == [1]
+
+
+def test_migrating_again_changes_nothing(baseline_engine):
+    migrations.migrate(baseline_engine)
+    messages = []
+    assert migrations.migrate(baseline_engine, log=messages.append) == SCHEMA_VERSION
+    assert messages == []
+    assert get_versions(baseline_engine) == [migration.version for migration in migrations.MIGRATIONS]
+
+
+def test_outdated_schema_is_refused(baseline_engine):
+    with pytest.raises(SchemaVersionError, match="version is None"):
+        migrations.check_schema_version(baseline_engine)
+
+    with baseline_engine.begin() as connection:
+        migrations.version_metadata.create_all(bind=connection)
+        for migration in migrations.MIGRATIONS[:3]:
+            migration.upgrade(connection)
+            migrations.stamp(connection, migration)
+    with pytest.raises(SchemaVersionError, match=f"version is 3, expected {SCHEMA_VERSION}"):
+        migrations.check_schema_version(baseline_engine)
+
+    # The remaining migrations are applied from the stored version
+    messages = []
+    assert migrations.migrate(baseline_engine, log=messages.append) == SCHEMA_VERSION
+    assert messages[0] == f"Migrated to version 4: {migrations.MIGRATIONS[3].description}"
+    migrations.check_schema_version(baseline_engine)
+
+
+def test_fresh_database_is_created_at_the_latest_version(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'fresh.db'}")
+    assert migrations.migrate(engine) == SCHEMA_VERSION
+    migrations.check_schema_version(engine)
+    assert set(Base.metadata.tables) <= set(inspect(engine).get_table_names())
+    engine.dispose()
@@ -0,0 +1,29 @@
+import pytest
+
+from conftest import DATASET_SIZE
+from db.querysets import IN_CLAUSE_CHUNK_SIZE
+from test_query_count import count_queries
+
+
+@pytest.mark.parametrize("url", ["/links/", "/boards/", "/labels/"])
+def test_items_are_in_the_order_of_the_ids(client, url):
+    response = client.get(url, params={"ids": "3,1,2,1,999999,3,999998,999999"})
+    assert response.status_code == 200
+    page = response.json()
+    assert [item["id"] for item in page["items"]] == [3, 1, 2]
+    assert page["missing_ids"] == [999999, 999998]
+
+
+def test_ids_are_looked_up_in_chunks(client):
+    ids = list(range(IN_CLAUSE_CHUNK_SIZE * 2, 0, -1))
+    with count_queries() as statements:
+        response = client.get("/links/", params={"ids": ",".join(map(str, ids))})
+    assert response.status_code == 200
+    page = response.json()
+    assert [item["id"] for item in page["items"]] == list(range(DATASET_SIZE.links, 0, -1))
+    assert page["missing_ids"] == ids[:-DATASET_SIZE.links]
+    assert len(statements) == 2
+
+
+def test_ids_are_bounded(client):
+    assert client.get("/links/", params={"ids": ",".join(map(str, range(1, 1002)))}).status_code == 422
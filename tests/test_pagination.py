@@ -0,0 +1,105 @@
+import pytest
+
+from db.pagination import InvalidCursor, decode_cursor, encode_cursor
+
+LIST_ENDPOINTS = ["/links/", "/boards/", "/labels/", "/teams/"]
+
+
+def get_all_pages(client, url: str, limit: int, **params):
+    items, cursor = [], None
+    while True:
+        response = client.get(url, params={"limit": limit, **params, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200, response.text
+        page = response.json()
+        assert len(page["items"]) <= limit
+        items.extend(page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return items
+
+
+@pytest.mark.parametrize("url", LIST_ENDPOINTS)
+def test_pages_cover_every_row_once_in_order(client, url):
+    items = get_all_pages(client, url, limit=7)
+    ids = [item["id"] for item in items]
+    assert len(ids) == len(set(ids))
+    # A single page of everything has the same order as the pages
+    assert [item["id"] for item in get_all_pages(client, url, limit=500)] == ids
+
+
+@pytest.mark.parametrize("url", ["/links/", "/boards/", "/labels/"])
+def test_pages_are_ordered_by_created_at_and_id(client, url):
+    items = get_all_pages(client, url, limit=9)
+    keys = [(item["created_at"], item["id"]) for item in items]
+    assert keys == sorted(keys)
+
+
+@pytest.mark.parametrize("sort", ["links_count", "favorites_count"])
+def test_sorted_pages_are_stable(client, sort):
+    items = get_all_pages(client, "/boards/", limit=4, sort=sort)
+    # Largest first, ties by the newest id
+    keys = [(item[sort], item["id"]) for item in items]
+    assert keys == sorted(keys, reverse=True)
+    assert len({item["id"] for item in items}) == len(items)
+
+
+def test_last_page_has_no_cursor(client):
+    page = client.get("/teams/", params={"limit": 500}).json()
+    assert page["next_cursor"] is None
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor(["2021-01-02T03:04:05", 42])
+    assert decode_cursor(cursor, 2) == ["2021-01-02T03:04:05", 42]
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor, 1)
+
+
+@pytest.mark.parametrize("cursor", [
+    "not a cursor",
+    "e30",  # {} instead of a list
+    encode_cursor([1]),  # id only, links are paginated on (created_at, id)
+    encode_cursor([{"dt": "yesterday"}, 1]),
+])
+def test_invalid_cursor_is_a_bad_request(client, cursor):
+    response = client.get("/links/", params={"cursor": cursor})
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Invalid cursor"}
+
+
+@pytest.mark.parametrize("limit", [0, 501])
+def test_limit_is_bounded(client, limit):
+    assert client.get("/links/", params={"limit": limit}).status_code == 422
+
+
+def get_labels_reference(client):
+    links = get_all_pages(client, "/links/", limit=500)
+    pairs = {}
+    for link in links:
+        for first in link["labels"]:
+            for second in link["labels"]:
+                if first < second:
+                    pairs[first, second] = pairs.get((first, second), 0) + 1
+    # Labels which share links, and a third one which makes `all` match nothing more
+    shared = max(pairs, key=pairs.get)
+    return links, [*shared, next(label for label in range(1, 100) if label not in shared)]
+
+
+@pytest.mark.parametrize("mode", ["all", "any"])
+@pytest.mark.parametrize("labels_count", [1, 2, 3])
+def test_labels_filter_pages(client, mode, labels_count):
+    links, labels = get_labels_reference(client)
+    labels = labels[:labels_count]
+    match = all if mode == "all" else any
+    expected = [link["id"] for link in links if match(label in link["labels"] for label in labels)]
+    assert expected or (mode == "all" and labels_count == 3)
+
+    items = get_all_pages(client, "/links/", limit=3, labels=",".join(map(str, labels)), mode=mode)
+    assert [item["id"] for item in items] == expected
+
+
+def test_labels_filter_defaults_to_all(client):
+    _, labels = get_labels_reference(client)
+    params = {"limit": 500, "labels": f"{labels[0]},{labels[1]}"}
+    assert client.get("/links/", params=params).json() == client.get("/links/", params={**params, "mode": "all"}).json()
+    assert client.get("/links/", params={**params, "mode": "none"}).status_code == 422
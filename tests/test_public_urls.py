@@ -0,0 +1,120 @@
+import asyncio
+from typing import List, Tuple
+
+import httpcore
+import pytest
+
+import public_urls
+from public_urls import NonPublicURL, PublicNetworkBackend, create_public_client, stream_public
+
+# Stands for a public address, the server of the tests listens on it
+PUBLIC = "127.0.0.1"
+PRIVATE = "127.0.0.2"
+
+
+class FakeResolver:
+    """Answers the given addresses, the last ones again once they run out."""
+
+    def __init__(self, *answers: List[str]):
+        self.answers = list(answers)
+        self.hosts = []
+
+    async def __call__(self, host: str, port: int) -> List[str]:
+        self.hosts.append(host)
+        return self.answers.pop(0) if len(self.answers) > 1 else self.answers[0]
+
+
+class RecordingBackend:
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.connected = []
+
+    async def connect_tcp(self, host, port, timeout=None, local_address=None):
+        self.connected.append(host)
+        if host in self.failing:
+            raise httpcore.ConnectError(f"Can't connect to {host}")
+        return host
+
+
+@pytest.fixture(autouse=True)
+def public_loopback(monkeypatch):
+    monkeypatch.setattr(public_urls, "is_public_address", lambda address: address == PUBLIC)
+
+
+def use_resolver(monkeypatch, *answers: List[str]) -> FakeResolver:
+    resolver = FakeResolver(*answers)
+    monkeypatch.setattr(public_urls, "resolve", resolver)
+    return resolver
+
+
+def test_backend_connects_to_the_addresses_it_vetted(monkeypatch):
+    resolver = use_resolver(monkeypatch, [PUBLIC, PUBLIC, "::1"])
+    monkeypatch.setattr(public_urls, "is_public_address", lambda address: address in (PUBLIC, "::1"))
+    backend = RecordingBackend(failing=[PUBLIC])
+    assert asyncio.run(PublicNetworkBackend(backend).connect_tcp("example.test", 443)) == "::1"
+    assert resolver.hosts == ["example.test"]
+    assert backend.connected == [PUBLIC, "::1"]
+
+
+def test_backend_refuses_private_addresses(monkeypatch):
+    use_resolver(monkeypatch, [PUBLIC, PRIVATE])
+    backend = RecordingBackend()
+    with pytest.raises(NonPublicURL):
+        asyncio.run(PublicNetworkBackend(backend).connect_tcp("example.test", 443))
+    assert backend.connected == []
+
+
+class Server:
+    """HTTP server answering 200 to any request, recording their Host headers."""
+
+    def __init__(self):
+        self.hosts = []
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        head = await reader.readuntil(b"\r\n\r\n")
+        self.hosts.extend(line.split(b":", 1)[1].strip().decode() for line in head.split(b"\r\n")
+                          if line.lower().startswith(b"host:"))
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\nConnection: close\r\n\r\nok")
+        await writer.drain()
+        writer.close()
+
+
+async def fetch(url: str) -> int:
+    client = create_public_client(timeout=5)
+    try:
+        async with stream_public(client, "GET", url) as response:
+            return response.status_code
+    finally:
+        await client.aclose()
+
+
+def serve_and_fetch(host: str) -> Tuple[Server, int, int]:
+    """Server, status code and port of a request to `host`, the server listens on `PUBLIC`."""
+    server = Server()
+
+    async def scenario():
+        listener = await asyncio.start_server(server.handle, PUBLIC, 0)
+        port = listener.sockets[0].getsockname()[1]
+        try:
+            return await fetch(f"http://{host}:{port}/"), port
+        finally:
+            listener.close()
+            await listener.wait_closed()
+
+    status_code, port = asyncio.run(scenario())
+    return server, status_code, port
+
+
+def test_request_keeps_the_host_name(monkeypatch):
+    use_resolver(monkeypatch, [PUBLIC])
+    server, status_code, port = serve_and_fetch("linktious.test")
+    assert status_code == 200
+    assert server.hosts == [f"linktious.test:{port}"]
+
+
+def test_rebound_host_isnt_connected(monkeypatch):
+    # Public when checked, private when the client connects
+    resolver = use_resolver(monkeypatch, [PUBLIC], [PRIVATE])
+    with pytest.raises(NonPublicURL):
+        serve_and_fetch("linktious.test")
+    assert resolver.hosts == ["linktious.test", "linktious.test"]
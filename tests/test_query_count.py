@@ -0,0 +1,85 @@
+from contextlib import contextmanager
+from typing import List
+
+import pytest
+from sqlalchemy import event
+
+from db import base, querysets, schema
+from db.cache import model_cache
+from db.models import ModelsManager
+
+
+@contextmanager
+def count_queries() -> List[str]:
+    statements = []
+
+    def before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    # Routes use the async engine in async mode
+    engines = [base.engine] + ([base.async_engine.sync_engine] if base.async_engine is not None else [])
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        for engine in engines:
+            event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+@pytest.mark.parametrize("url", ["/links/", "/boards/", "/users/"])
+def test_list_query_count_doesnt_grow_with_the_page(client, url):
+    counts = []
+    for limit in (2, 20):
+        with count_queries() as statements:
+            response = client.get(url, params={"limit": limit})
+        assert response.status_code == 200
+        assert len(response.json()["items"]) == limit
+        counts.append(len(statements))
+    assert counts[0] == counts[1]
+    assert counts[0] <= 2
+
+
+@pytest.mark.parametrize("table_name, response_model", [
+    ("links", schema.Link),
+    ("boards", schema.Board),
+    ("users", schema.User),
+])
+def test_load_plan_query_count_doesnt_grow_with_the_page(database, table_name, response_model):
+    # Models serialized by the response model, their relationships are loaded by the load plan
+    counts = []
+    with base.SessionLocal() as db:
+        for limit in (2, 20):
+            db.expunge_all()
+            with count_queries() as statements:
+                queryset = getattr(ModelsManager(db=db), table_name).with_load_plan(response_model)
+                page = queryset.paginate(limit=limit)
+                items = [response_model.from_orm(model) for model in page.items]
+            assert len(items) == limit
+            counts.append(len(statements))
+    assert counts[0] == counts[1]
+    # The rows and one SELECT ... IN per relationship of the plan
+    assert counts[0] == 2
+
+
+def sort_ids(value):
+    """Related ids come in no particular order."""
+    if isinstance(value, dict):
+        return {key: sort_ids(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return sorted(value) if all(isinstance(item, int) for item in value) else [sort_ids(item) for item in value]
+    return value
+
+
+@pytest.mark.parametrize("url", ["/links/?limit=50", "/boards/?limit=50", "/boards/?ids=1,2,3", "/boards/1/view"])
+def test_related_ids_are_looked_up_without_group_concat(client, monkeypatch, url):
+    # Every response is queried
+    monkeypatch.setattr(model_cache, "backend", None)
+    expected = client.get(url).json()
+    monkeypatch.setattr(querysets, "GROUP_CONCAT_DIALECTS", set())
+    with count_queries() as aggregated_in_python:
+        response = client.get(url)
+    assert response.status_code == 200
+    assert sort_ids(response.json()) == sort_ids(expected)
+    assert not any("group_concat" in statement for statement in aggregated_in_python)
+    assert any("IN (" in statement for statement in aggregated_in_python)
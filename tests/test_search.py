@@ -0,0 +1,90 @@
+import pytest
+
+from db import base
+from db.models import Label, Link
+from db.pagination import decode_cursor, encode_cursor
+from test_pagination import get_all_pages
+
+TIED_LINKS = 7
+
+
+def search_ids(client, query: str):
+    response = client.get("/links/search", params={"q": query, "limit": 100})
+    assert response.status_code == 200
+    return [item["id"] for item in response.json()["items"]]
+
+
+@pytest.fixture
+def db(database):
+    with base.SessionLocal() as db:
+        yield db
+
+
+@pytest.fixture
+def tied_links(db):
+    """Links with the same text, every one has the same rank."""
+    links = [Link(url=f"https://example.com/tied/{index}", icon_url="https://example.com/icon.png",
+                  description="quokka", created_by_user_id=1) for index in range(TIED_LINKS)]
+    db.add_all(links)
+    db.commit()
+    yield sorted(link.id for link in links)
+    for link in links:
+        db.delete(link)
+    db.commit()
+
+
+def test_index_follows_link_changes(client, db):
+    link = Link(url="https://example.com/axolotl", icon_url="https://example.com/icon.png",
+                description="axolotl habitat", created_by_user_id=1)
+    db.add(link)
+    db.commit()
+    assert search_ids(client, "axolotl") == [link.id]
+
+    link.description = "capybara habitat"
+    db.commit()
+    assert search_ids(client, "axolotl") == [link.id]  # still in the url
+    link.url = "https://example.com/capybara"
+    db.commit()
+    assert search_ids(client, "axolotl") == []
+    assert search_ids(client, "capybara") == [link.id]
+
+    db.delete(link)
+    db.commit()
+    assert search_ids(client, "capybara") == []
+
+
+def test_index_follows_labels(client, db):
+    link = Link(url="https://example.com/labelled", icon_url="https://example.com/icon.png",
+                description="labelled", created_by_user_id=1)
+    label = Label(name="pangolin", created_by_user_id=1)
+    db.add_all([link, label])
+    db.commit()
+    assert search_ids(client, "pangolin") == []
+
+    link.labels.append(label)
+    db.commit()
+    assert search_ids(client, "pangolin") == [link.id]
+
+    label.name = "okapi"
+    db.commit()
+    assert search_ids(client, "pangolin") == []
+    assert search_ids(client, "okapi") == [link.id]
+
+    link.labels.remove(label)
+    db.commit()
+    assert search_ids(client, "okapi") == []
+
+    db.delete(link)
+    db.delete(label)
+    db.commit()
+
+
+def test_pages_across_tied_ranks(client, tied_links):
+    items = get_all_pages(client, "/links/search", limit=2, q="quokka")
+    assert [item["id"] for item in items] == tied_links
+    assert len({item["rank"] for item in items}) == 1
+
+
+def test_rank_cursor_is_lossless():
+    rank = -1e-06 / 3
+    assert decode_cursor(encode_cursor([rank, 1]), 2) == [rank, 1]
@@ -0,0 +1,110 @@
+import orjson
+import pytest
+from sqlalchemy import create_engine, func, select
+
+from conftest import DATASET_SIZE
+from benchmarks.dataset import generate
+from db import changes, migrations, models
+from db.engine import configure_engine
+from db.schema import ChangeAction
+from transfer import InvalidImport, Importer, export_database
+
+ENTITY_TABLES = ["teams", "users", "labels", "links", "boards"]
+
+
+def create_database(path):
+    engine = create_engine(f"sqlite:///{path}")
+    # WAL like the app's engines, writers don't wait for an export
+    configure_engine(engine)
+    migrations.migrate(engine)
+    return engine
+
+
+@pytest.fixture
+def lines(tmp_path):
+    """Export of a database of its own, names of the generated rows are unique."""
+    engine = create_database(tmp_path / "source.db")
+    generate(engine, DATASET_SIZE)
+    yield b"".join(export_database(engine, models.Base.metadata)).splitlines()
+    engine.dispose()
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_database(tmp_path / "target.db")
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def published(monkeypatch):
+    pubsub = changes.LocalPubSub()
+    notifications = []
+    pubsub.subscribe(lambda: notifications.append(True))
+    monkeypatch.setattr(changes, "change_pubsub", pubsub)
+    return notifications
+
+
+def get_changes(engine):
+    table = models.Change.__table__
+    with engine.connect() as connection:
+        return connection.execute(select(table.c.table_name, table.c.entity_id, table.c.action)).all()
+
+
+def import_lines(engine, lines, batch_size=50):
+    importer = Importer(engine, models.Base.metadata, batch_size=batch_size)
+    try:
+        importer.feed(lines)
+        return importer.commit()
+    finally:
+        importer.close()
+
+
+def test_imported_entities_are_logged_as_created(engine, lines, published):
+    result = import_lines(engine, lines)
+    assert result["rows"]["links"] == DATASET_SIZE.links
+    logged = get_changes(engine)
+    assert {action for _, _, action in logged} == {ChangeAction.created.value}
+    for table_name in ENTITY_TABLES:
+        offset = result["id_offsets"][table_name]
+        ids = sorted(entity_id for name, entity_id, _ in logged if name == table_name)
+        assert ids == list(range(offset + 1, offset + result["rows"][table_name] + 1))
+    # Associations are changes of the entities they relate, created by the import
+    assert {name for name, _, _ in logged} == set(ENTITY_TABLES)
+    assert published == [True]
+
+
+def test_failed_import_logs_nothing(engine, lines, published):
+    with pytest.raises(InvalidImport):
+        import_lines(engine, lines + [b"not json"])
+
+    assert get_changes(engine) == []
+    assert published == []
+    with engine.connect() as connection:
+        assert connection.execute(select(func.count()).select_from(models.Link.__table__)).scalar() == 0
+
+
+def test_export_is_a_snapshot(tmp_path):
+    engine = create_database(tmp_path / "source.db")
+    generate(engine, DATASET_SIZE)
+    board_links = models.Board.links.property.secondary
+    with engine.connect() as connection:
+        associations_count = connection.execute(select(func.count()).select_from(board_links)).scalar()
+    chunks = export_database(engine, models.Base.metadata, batch_size=10)
+    exported = [next(chunks)]
+
+    # Committed while the export runs, after the links were exported
+    with engine.begin() as connection:
+        connection.execute(models.Link.__table__.insert(), [
+            {"id": 5000, "url": "https://example.com/new", "description": "new", "created_by_user_id": 1},
+        ])
+        connection.execute(board_links.insert(), [{"board_id": 1, "link_id": 5000}])
+    exported.extend(chunks)
+    engine.dispose()
+
+    rows = [orjson.loads(line) for line in b"".join(exported).splitlines()]
+    ids = {table: {row["id"] for row in rows if row["table"] == table} for table in ENTITY_TABLES}
+    associations = [row for row in rows if row["table"] == "boards_links_association"]
+    assert len(associations) == associations_count
+    assert all(row["link_id"] in ids["links"] and row["board_id"] in ids["boards"] for row in associations)
+    assert 5000 not in ids["links"]
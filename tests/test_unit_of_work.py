@@ -0,0 +1,95 @@
+import pytest
+from fastapi import APIRouter, FastAPI, HTTPException
+from fastapi.responses import JSONResponse
+
+from conftest import Client
+from db import base
+from db.async_manager import AsyncModelsManager
+from db.models import Team
+from db.schema import Team as TeamSchema, TeamCreate
+from dependencies import UnitOfWorkRoute, models_manager_dependency
+
+
+class Failure(Exception):
+    pass
+
+
+def create_app() -> FastAPI:
+    router = APIRouter(route_class=UnitOfWorkRoute)
+
+    @router.post("/teams/{name}", response_model=TeamSchema)
+    async def create_team(name: str, fail: str = None,
+                          models_manager: AsyncModelsManager = models_manager_dependency):
+        # Flushed by the save, the rows are in the transaction
+        team = await models_manager.teams.create(model_schema=TeamCreate(name=name))
+        if fail == "response":
+            return JSONResponse({"detail": "Conflict"}, status_code=409)
+        if fail == "http":
+            raise HTTPException(status_code=400, detail="Bad request")
+        if fail == "exception":
+            raise Failure()
+        return team
+
+    app = FastAPI()
+    app.include_router(router)
+    return app
+
+
+@pytest.fixture
+def uow_client(database):
+    client = Client(create_app())
+    yield client
+    client.close()
+
+
+@pytest.fixture
+def team_names():
+    names = []
+    yield names
+    with base.SessionLocal() as db:
+        db.query(Team).filter(Team.name.in_(names)).delete(synchronize_session=False)
+        db.commit()
+
+
+def team_exists(name: str) -> bool:
+    with base.SessionLocal() as db:
+        return db.query(Team).filter(Team.name == name).count() == 1
+
+
+@pytest.fixture(autouse=True)
+def request_transaction(monkeypatch):
+    monkeypatch.setattr(base, "REQUEST_TRANSACTION", True)
+
+
+def test_successful_request_is_committed(uow_client, team_names):
+    team_names.append("uow committed")
+    response = uow_client.post("/teams/uow committed")
+    assert response.status_code == 200
+    assert response.json()["name"] == "uow committed"
+    assert team_exists("uow committed")
+
+
+@pytest.mark.parametrize("fail, status_code", [("response", 409), ("http", 400)])
+def test_error_response_is_rolled_back(uow_client, team_names, fail, status_code):
+    team_names.append(f"uow {fail}")
+    response = uow_client.post(f"/teams/uow {fail}", params={"fail": fail})
+    assert response.status_code == status_code
+    assert not team_exists(f"uow {fail}")
+
+
+def test_exception_after_a_flush_is_rolled_back(uow_client, team_names):
+    team_names.append("uow exception")
+    with pytest.raises(Failure):
+        uow_client.post("/teams/uow exception", params={"fail": "exception"})
+    assert not team_exists("uow exception")
+
+
+def test_failed_commit_fails_the_response(uow_client, team_names, monkeypatch):
+    async def commit(self):
+        raise Failure()
+
+    monkeypatch.setattr(AsyncModelsManager, "commit", commit)
+    team_names.append("uow failed commit")
+    with pytest.raises(Failure):
+        uow_client.post("/teams/uow failed commit")
+    assert not team_exists("uow failed commit")
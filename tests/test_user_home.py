@@ -0,0 +1,50 @@
+import pytest
+
+from db.cache import model_cache
+
+
+@pytest.fixture
+def home_settings(client, auth_headers):
+    """Settings of user 1, restored after the test."""
+    user = client.get("/users/1/home").json()
+    yield user
+    headers = auth_headers()
+    client.put(f"/users/1/set_main_board?board_id={user['user']['main_board_id']}", headers=headers)
+    client.put("/users/1/set_favorite_boards", json=[board["id"] for board in user["favorite_boards"]], headers=headers)
+
+
+def get_home(client):
+    response = client.get("/users/1/home")
+    assert response.status_code == 200
+    return response.json()
+
+
+def get_favorite(client, board_id):
+    return next(board for board in get_home(client)["favorite_boards"] if board["id"] == board_id)
+
+
+@pytest.mark.skipif(not model_cache.enabled, reason="The home is only cached with a cache backend")
+def test_home_follows_the_settings_and_boards_changes(client, auth_headers, home_settings):
+    headers = auth_headers()
+    favorites = [board["id"] for board in home_settings["favorite_boards"]]
+    main_board_id = home_settings["user"]["main_board_id"]
+    new_board_id = next(id for id in range(1, 30) if id not in favorites and id != main_board_id)
+
+    assert client.post("/users/1/favorite_boards/add", json=[new_board_id], headers=headers).status_code == 200
+    assert [board["id"] for board in get_home(client)["favorite_boards"]] == sorted(favorites + [new_board_id])
+
+    # Counts of a favorite board change with its links
+    links_count = get_favorite(client, new_board_id)["links_count"]
+    board_links = client.get(f"/boards/{new_board_id}").json()["links"]
+    new_link_id = next(id for id in range(1, 100) if id not in board_links)
+    assert client.post(f"/boards/{new_board_id}/links/add", json=[new_link_id], headers=headers).status_code == 200
+    try:
+        assert get_favorite(client, new_board_id)["links_count"] == links_count + 1
+    finally:
+        client.post(f"/boards/{new_board_id}/links/remove", json=[new_link_id], headers=headers)
+
+    assert client.put(f"/users/1/set_main_board?board_id={new_board_id}", headers=headers).status_code == 200
+    assert get_home(client)["main_board"]["id"] == new_board_id
+
+    assert client.post("/users/1/favorite_boards/remove", json=[new_board_id], headers=headers).status_code == 200
+    assert [board["id"] for board in get_home(client)["favorite_boards"]] == sorted(favorites)